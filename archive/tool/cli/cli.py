@@ -1,42 +1,193 @@
 import argparse
+import getpass
+import hashlib
 import requests
 import os
+import time
 import zipfile
 import tempfile
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 logging.basicConfig(level=logging.DEBUG)
 
+# Parts are sent in parallel and each one is retried on its own
+PARALLEL_PARTS = 4
+MAX_PART_RETRIES = 5
+
 def zip_folder(folder_path):
     temp_zip = tempfile.NamedTemporaryFile(delete=False, suffix='.zip')
     with zipfile.ZipFile(temp_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for root, _, files in os.walk(folder_path):
-            for file in files:
+        # Walk in sorted order so an unchanged folder zips to the same bytes,
+        # which is what lets an interrupted upload be resumed
+        for root, dirs, files in os.walk(folder_path):
+            dirs.sort()
+            for file in sorted(files):
                 file_path = os.path.join(root, file)
                 arcname = os.path.relpath(file_path, start=folder_path)
                 logging.debug(f"Adding file to ZIP: {arcname}")
                 zipf.write(file_path, arcname)
     return temp_zip.name
 
-def submit_job(folder_path, job_name, api_url):
-    if not os.path.exists(folder_path):
-        raise FileNotFoundError(f"Folder not found: {folder_path}")
-    
+def put_with_retries(url, read_data, headers, description):
+    """
+    PUTs read_data() to url, retrying network and server errors with
+    exponential backoff. read_data may return bytes or an open file, which
+    is streamed and closed afterwards.
+    """
+    for attempt in range(MAX_PART_RETRIES + 1):
+        try:
+            data = read_data()
+            try:
+                response = requests.put(url, data=data, headers=headers, timeout=120)
+            finally:
+                if hasattr(data, 'close'):
+                    data.close()
+            if response.ok:
+                return
+            # Client errors will not go away by retrying
+            if response.status_code < 500:
+                response.raise_for_status()
+            logging.debug(f"{description} failed with status {response.status_code}")
+            # The server is busy with other uploads; wait as long as it asks
+            retry_after = response.headers.get('Retry-After', '')
+            if response.status_code == 503 and retry_after.isdigit() and attempt < MAX_PART_RETRIES:
+                time.sleep(int(retry_after))
+                continue
+        except requests.ConnectionError as e:
+            logging.debug(f"{description} failed: {e}")
+        except requests.Timeout as e:
+            logging.debug(f"{description} timed out: {e}")
+        if attempt < MAX_PART_RETRIES:
+            time.sleep(0.5 * 2 ** attempt)
+    raise RuntimeError(f"{description} failed after {MAX_PART_RETRIES + 1} attempts")
+
+def upload_part(api_url, session, zip_path, index):
+    with open(zip_path, 'rb') as f:
+        f.seek(index * session['part_size'])
+        data = f.read(session['part_size'])
+    headers = {
+        'Content-Type': 'application/octet-stream',
+        'X-Content-SHA256': hashlib.sha256(data).hexdigest(),
+    }
+    url = f"{api_url}/uploads/{session['upload_id']}/parts/{index}"
+    put_with_retries(url, lambda: data, headers, f"Part {index}")
+
+def hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def build_manifest(folder_path):
+    """
+    Returns ({path, size, sha256} entries, {sha256: local path}) for every
+    file in the folder.
+    """
+    manifest = []
+    local_paths = {}
+    for root, dirs, files in os.walk(folder_path):
+        dirs.sort()
+        for file in sorted(files):
+            file_path = os.path.join(root, file)
+            sha256 = hash_file(file_path)
+            manifest.append({
+                'path': os.path.relpath(file_path, start=folder_path).replace(os.sep, '/'),
+                'size': os.path.getsize(file_path),
+                'sha256': sha256,
+            })
+            local_paths[sha256] = file_path
+    return manifest, local_paths
+
+def upload_blob(api_url, sha256, file_path):
+    # Re-open on every attempt so a retry starts from the beginning
+    headers = {'Content-Type': 'application/octet-stream'}
+    put_with_retries(f"{api_url}/blobs/{sha256}", lambda: open(file_path, 'rb'), headers, f"Blob {sha256[:12]}")
+
+def submit_delta(folder_path, job_name, api_url, base_image=None, user=None, priority=0):
+    """
+    Sends only the files the server does not already have, then commits the
+    folder as a new build context.
+    """
+    logging.debug(f"Hashing folder: {folder_path}")
+    manifest, local_paths = build_manifest(folder_path)
+    context = {'job_name': job_name, 'files': manifest, 'base_image': base_image, 'user': user, 'priority': priority}
+
+    response = requests.post(f"{api_url}/blobs/missing", json=context)
+    response.raise_for_status()
+    missing = response.json()['missing']
+
+    total = sum(entry['size'] for entry in manifest)
+    to_send = sum(os.path.getsize(local_paths[sha256]) for sha256 in missing)
+    print(f"Sending {len(missing)} of {len(manifest)} files ({to_send} of {total} bytes)")
+
+    with ThreadPoolExecutor(max_workers=PARALLEL_PARTS) as executor:
+        futures = [executor.submit(upload_blob, api_url, sha256, local_paths[sha256]) for sha256 in missing]
+        for future in futures:
+            future.result()
+
+    return requests.post(f"{api_url}/contexts/", json=context)
+
+def submit_archive(folder_path, job_name, api_url, resume_upload_id=None, base_image=None, user=None, priority=0):
+    """
+    Zips the folder and sends it through the resumable upload API.
+    """
     logging.debug(f"Zipping folder: {folder_path}")
     zip_path = zip_folder(folder_path)
-    
-    logging.debug(f"Submitting job to: {api_url}")
-    with open(zip_path, 'rb') as zip_file:
-        files = {
-            'folder': ('folder.zip', zip_file, 'application/zip'),
-        }
-        payload = {
-            'job_name': job_name,
-        }
-        response = requests.post(api_url, files=files, data=payload)
-    
-    os.remove(zip_path)
-    
+
+    try:
+        zip_sha256 = hash_file(zip_path)
+        if resume_upload_id:
+            logging.debug(f"Resuming upload: {resume_upload_id}")
+            response = requests.get(f"{api_url}/uploads/{resume_upload_id}")
+            response.raise_for_status()
+            session = response.json()
+            # Parts of a different archive would be stitched together with
+            # the ones already sent
+            if session['total_size'] != os.path.getsize(zip_path) or session.get('sha256') not in (None, zip_sha256):
+                raise RuntimeError("The folder changed since the upload was started; start a new upload instead of resuming.")
+            pending = session['missing_parts']
+        else:
+            logging.debug(f"Starting upload to: {api_url}")
+            payload = {
+                'job_name': job_name,
+                'filename': 'folder.zip',
+                'total_size': os.path.getsize(zip_path),
+                'sha256': zip_sha256,
+                'priority': priority,
+            }
+            if base_image:
+                payload['base_image'] = base_image
+            if user:
+                payload['user'] = user
+            response = requests.post(f"{api_url}/uploads/", data=payload)
+            response.raise_for_status()
+            session = response.json()
+            pending = list(range(session['part_count']))
+
+        print(f"Upload ID: {session['upload_id']} (pass --resume {session['upload_id']} if interrupted)")
+        logging.debug(f"Sending {len(pending)} of {session['part_count']} parts")
+        with ThreadPoolExecutor(max_workers=PARALLEL_PARTS) as executor:
+            futures = [executor.submit(upload_part, api_url, session, zip_path, i) for i in pending]
+            for future in futures:
+                future.result()
+
+        return requests.post(f"{api_url}/uploads/{session['upload_id']}/commit")
+    finally:
+        os.remove(zip_path)
+
+def submit_job(folder_path, job_name, api_url, archive=False, resume_upload_id=None, base_image=None,
+               user=None, priority=0):
+    if not os.path.exists(folder_path):
+        raise FileNotFoundError(f"Folder not found: {folder_path}")
+    api_url = api_url.rstrip('/')
+
+    if archive or resume_upload_id:
+        response = submit_archive(folder_path, job_name, api_url, resume_upload_id, base_image, user, priority)
+    else:
+        response = submit_delta(folder_path, job_name, api_url, base_image, user, priority)
+
     if response.status_code == 200:
         print("Job submitted successfully.")
         print(f"Job details: {response.json()}")
@@ -49,10 +200,16 @@ def main():
     parser = argparse.ArgumentParser(description="Submit a job to the Kubernetes cluster.")
     parser.add_argument("folder", help="Path to the folder containing the script, Dockerfile, and data.")
     parser.add_argument("job_name", help="Name of the Kubernetes job.")
-    parser.add_argument("--api-url", default="http://localhost:5000/submit", help="API URL to submit the job.")
+    parser.add_argument("--api-url", default="http://localhost:30001", help="Base URL of the upload service.")
+    parser.add_argument("--archive", action="store_true", help="Upload the whole folder as a zip instead of only changed files.")
+    parser.add_argument("--resume", metavar="UPLOAD_ID", help="Resume an interrupted archive upload instead of starting over.")
+    parser.add_argument("--base-image", metavar="NAME", help="Build on a prebuilt framework image: 'auto', 'none' or a name from /base_images/.")
+    parser.add_argument("--user", default=getpass.getuser(), help="Name the job is queued under for fair sharing (default: your login).")
+    parser.add_argument("--priority", type=int, default=0, help="Admission priority; higher runs first.")
     args = parser.parse_args()
-    
-    submit_job(args.folder, args.job_name, args.api_url)
+
+    submit_job(args.folder, args.job_name, args.api_url, args.archive, args.resume, args.base_image,
+               args.user, args.priority)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
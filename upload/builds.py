@@ -0,0 +1,959 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+from kubernetes import client
+from starlette.concurrency import run_in_threadpool
+
+from kube import (
+    LOG_CHUNK_SIZE, batch_v1, cached_job_pods, cached_jobs, control_plane_placement,
+    finished_condition, job_informer, k8s_call, log_core_v1
+)
+from storage import UPLOAD_DIRECTORY, read_json, write_json
+
+router = APIRouter()
+
+# Build contexts are identified by a digest of the Dockerfile and the files
+# it can copy, so a resubmission that only differs in job name reuses the
+# image pushed for the first one. The index maps digests to image names.
+IMAGE_CACHE_DIRECTORY = os.path.join(UPLOAD_DIRECTORY, ".cache", "images")
+
+def dockerignore_patterns(upload_path: str) -> list:
+    """
+    Returns the .dockerignore rules of a build context as (regex, exclude)
+    pairs; like Docker, the last matching rule decides.
+    """
+    try:
+        with open(os.path.join(upload_path, ".dockerignore"), encoding="utf-8", errors="replace") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return []
+    rules = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        exclude = not line.startswith("!")
+        pattern = os.path.normpath(line.lstrip("!").strip()).lstrip("/")
+        rules.append((re.compile(glob_regex(pattern) + "(?:/.*)?$"), exclude))
+    return rules
+
+def glob_regex(pattern: str) -> str:
+    """
+    Translates a Dockerfile/.dockerignore path glob into a regex: * and ?
+    stay within one path component, ** spans any number of them.
+    """
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+            if pattern.startswith("/", i):
+                regex = regex[:-2] + "(?:.*/)?"
+                i += 1
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex
+
+def is_dockerignored(path: str, rules: list) -> bool:
+    ignored = False
+    for regex, exclude in rules:
+        if regex.match(path):
+            ignored = exclude
+    return ignored
+
+def dockerfile_sources(text: str) -> Optional[list]:
+    """
+    Returns the context paths COPY and ADD instructions read, or None if the
+    Dockerfile fetches remote sources and so cannot be cached by content.
+    """
+    sources = []
+    text = re.sub(r"\\\r?\n", " ", text)
+    for line in text.splitlines():
+        words = line.split()
+        if not words or words[0].upper() not in ("COPY", "ADD"):
+            continue
+        # Files copied from other build stages are covered by those stages
+        if any(word.startswith("--from") for word in words[1:]):
+            continue
+        args = [word for word in words[1:] if not word.startswith("--")]
+        if args and args[0].startswith("["):
+            try:
+                args = json.loads(line[line.index("["):])
+            except ValueError:
+                return None
+        for source in args[:-1]:
+            if re.match(r"^[a-z]+://", source) or source.startswith("git@"):
+                return None
+            sources.append(os.path.normpath(source).lstrip("/"))
+    return sources
+
+def context_digest(upload_path: str, dockerfile_relpath: str, files: Optional[list]) -> Optional[str]:
+    """
+    Digest of everything that determines the built image: the Dockerfile's
+    path and content and the path and content hash of every context file a
+    COPY or ADD can read, minus .dockerignore'd files. Returns None if the
+    build cannot be cached: no manifest is known, or the Dockerfile
+    downloads remote sources.
+    """
+    if files is None:
+        return None
+    by_path = {entry["path"].replace(os.sep, "/"): entry["sha256"] for entry in files}
+    dockerfile_sha256 = by_path.get(dockerfile_relpath.replace(os.sep, "/"))
+    if dockerfile_sha256 is None:
+        return None
+    with open(os.path.join(upload_path, dockerfile_relpath), encoding="utf-8", errors="replace") as f:
+        sources = dockerfile_sources(f.read())
+    if sources is None:
+        return None
+
+    source_regexes = [re.compile("" if source == "." else glob_regex(source) + "(?:/.*)?$") for source in sources]
+    rules = dockerignore_patterns(upload_path)
+    digest = hashlib.sha256()
+    digest.update(f"dockerfile {dockerfile_relpath} {dockerfile_sha256}\n".encode("utf-8"))
+    for path in sorted(by_path):
+        if is_dockerignored(path, rules) or not any(regex.match(path) for regex in source_regexes):
+            continue
+        digest.update(f"{path} {by_path[path]}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+class ImageCache:
+    """
+    Index of build context digest -> pushed image, one JSON file per digest,
+    with hit/miss counters for the API.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, digest: str) -> Optional[dict]:
+        entry = read_json(self.path(digest))
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            # Registry retention keeps images of recently used entries
+            entry["last_used_at"] = time.time()
+            write_json(self.path(digest), entry)
+        return entry
+
+    def put(self, digest: str, image_name: str, build_job: str, image_digest: Optional[str] = None):
+        write_json(self.path(digest), {
+            "digest": digest,
+            "image_name": image_name,
+            "image_digest": image_digest,
+            "build_job": build_job,
+            "created_at": time.time()
+        })
+
+    def remove(self, digest: str):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def entries(self) -> list:
+        return [read_json(entry.path) for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+
+    def expire(self, max_age: float) -> list:
+        """
+        Removes entries neither created nor used within max_age seconds and
+        returns them.
+        """
+        expired = []
+        for entry in self.entries():
+            if entry and time.time() - entry.get("last_used_at", entry["created_at"]) > max_age:
+                self.remove(entry["digest"])
+                expired.append(entry)
+        return expired
+
+image_cache = ImageCache(IMAGE_CACHE_DIRECTORY)
+
+@router.get("/images/cache")
+async def image_cache_stats():
+    entries = await run_in_threadpool(image_cache.entries)
+    return {
+        "entries": len(entries),
+        "hits": image_cache.hits,
+        "misses": image_cache.misses
+    }
+
+def find_dockerfile(upload_path):
+    for root, dirs, files in os.walk(upload_path):
+        if 'Dockerfile' in files:
+            dockerfile_full_path = os.path.join(root, 'Dockerfile')
+            dockerfile_relpath = os.path.relpath(dockerfile_full_path, upload_path)
+            return dockerfile_relpath
+    return None
+
+REGISTRY = "docker-registry.default.svc.cluster.local:5000"
+
+# Kaniko pushes the layers of every RUN step to KANIKO_CACHE_REPO and reuses
+# them in later builds; base images are read from the KANIKO_CACHE_PVC
+# volume, which the warmer jobs keep filled with the most used ones
+KANIKO_CACHE = os.getenv("KANIKO_CACHE", "true").lower() == "true"
+KANIKO_CACHE_REPO = os.getenv("KANIKO_CACHE_REPO", f"{REGISTRY}/kaniko-cache")
+KANIKO_CACHE_PVC = os.getenv("KANIKO_CACHE_PVC", "kaniko-cache-pvc")
+KANIKO_CACHE_TTL = os.getenv("KANIKO_CACHE_TTL", "168h")
+KANIKO_WARM_IMAGES = [i for i in os.getenv("KANIKO_WARM_IMAGES", "python:3.9-slim").split(",") if i]
+KANIKO_WARM_MAX_IMAGES = int(os.getenv("KANIKO_WARM_MAX_IMAGES", "10"))
+KANIKO_WARM_INTERVAL = int(os.getenv("KANIKO_WARM_INTERVAL", str(6 * 3600)))
+BUILD_CACHE_DIRECTORY = os.path.join(UPLOAD_DIRECTORY, ".cache", "builds")
+
+# Kaniko log lines that tell whether a RUN layer or a base image came from
+# the cache
+KANIKO_LAYER_HIT_RE = re.compile(r"Using caching version of cmd")
+KANIKO_LAYER_MISS_RE = re.compile(r"No cached layer found for cmd")
+KANIKO_BASE_HIT_RE = re.compile(r"Found sha256:\w+ in local cache")
+KANIKO_BASE_MISS_RE = re.compile(r"Error while retrieving image from cache")
+
+def dockerfile_base_images(text: str) -> list:
+    """
+    Returns the registry images a Dockerfile builds FROM, leaving out
+    earlier build stages and images chosen by build arguments.
+    """
+    images = []
+    stages = set()
+    for line in text.splitlines():
+        words = line.split()
+        if len(words) < 2 or words[0].upper() != "FROM":
+            continue
+        args = [word for word in words[1:] if not word.startswith("--")]
+        if not args:
+            continue
+        if len(args) >= 3 and args[1].upper() == "AS":
+            stages.add(args[2].lower())
+        image = args[0]
+        if "$" not in image and image.lower() not in stages and image.lower() != "scratch":
+            images.append(image)
+    return images
+
+class BuildCache:
+    """
+    Tracks the Kaniko cache: which base images builds use, so the warmer
+    can keep the most used ones on the cache volume, and how often layers
+    and base images were served from the cache. State is kept in
+    BUILD_CACHE_DIRECTORY.
+    """
+
+    def __init__(self, directory: str):
+        self.stats_path = os.path.join(directory, "stats.json")
+        self.bases_path = os.path.join(directory, "base-images.json")
+        self.stats = {}
+        self.base_images = {}
+        self.lock = threading.Lock()
+
+    def load(self):
+        self.stats = read_json(self.stats_path, {
+            "builds": 0,
+            "layer_hits": 0,
+            "layer_misses": 0,
+            "base_image_hits": 0,
+            "base_image_misses": 0,
+            "build_seconds": 0.0,
+            "last_warmed_at": None,
+            "recent": []
+        })
+        self.base_images = read_json(self.bases_path, {})
+
+    def record_base_images(self, images: list):
+        with self.lock:
+            for image in images:
+                entry = self.base_images.setdefault(image, {"builds": 0, "last_used_at": None})
+                entry["builds"] += 1
+                entry["last_used_at"] = time.time()
+            write_json(self.bases_path, self.base_images)
+
+    def warm_images(self) -> list:
+        with self.lock:
+            used = sorted(self.base_images, key=lambda image: self.base_images[image]["builds"], reverse=True)
+        # Ready catalogue images are always kept warm
+        prebuilt = [entry["image"] for entry in base_image_catalogue if base_image_ready(entry)]
+        images = list(dict.fromkeys(KANIKO_WARM_IMAGES + prebuilt + used))
+        return images[:max(KANIKO_WARM_MAX_IMAGES, len(KANIKO_WARM_IMAGES) + len(prebuilt))]
+
+    def record_build(self, build_job: str, log_lines, duration: Optional[float]):
+        """
+        Counts the cache hits and misses in a finished build's log.
+        """
+        counts = {"layer_hits": 0, "layer_misses": 0, "base_image_hits": 0, "base_image_misses": 0}
+        for line in log_lines:
+            if KANIKO_LAYER_HIT_RE.search(line):
+                counts["layer_hits"] += 1
+            elif KANIKO_LAYER_MISS_RE.search(line):
+                counts["layer_misses"] += 1
+            elif KANIKO_BASE_HIT_RE.search(line):
+                counts["base_image_hits"] += 1
+            elif KANIKO_BASE_MISS_RE.search(line):
+                counts["base_image_misses"] += 1
+        with self.lock:
+            self.stats["builds"] += 1
+            self.stats["build_seconds"] += duration or 0
+            for key, value in counts.items():
+                self.stats[key] += value
+            self.stats["recent"] = (self.stats["recent"] + [{
+                "build_job": build_job,
+                "duration": duration,
+                **counts
+            }])[-50:]
+            write_json(self.stats_path, self.stats)
+
+    def record_warm(self):
+        with self.lock:
+            self.stats["last_warmed_at"] = time.time()
+            write_json(self.stats_path, self.stats)
+
+    def summary(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+        layers = stats["layer_hits"] + stats["layer_misses"]
+        bases = stats["base_image_hits"] + stats["base_image_misses"]
+        return {
+            **stats,
+            "layer_hit_rate": stats["layer_hits"] / layers if layers else None,
+            "base_image_hit_rate": stats["base_image_hits"] / bases if bases else None,
+            "average_build_seconds": stats["build_seconds"] / stats["builds"] if stats["builds"] else None,
+            "warm_images": self.warm_images()
+        }
+
+build_cache = BuildCache(BUILD_CACHE_DIRECTORY)
+
+async def record_build_cache_usage(build_job):
+    """
+    Reads the log of a finished Kaniko job and adds its cache hits and
+    misses to the build cache stats.
+    """
+    pods = (await cached_job_pods(build_job.metadata.name)).get(build_job.metadata.name, [])
+    if not pods:
+        return
+    pod = max(pods, key=lambda pod: pod.metadata.creation_timestamp)
+    duration = None
+    if build_job.status.start_time and build_job.status.completion_time:
+        duration = (build_job.status.completion_time - build_job.status.start_time).total_seconds()
+    try:
+        response = await k8s_call(log_core_v1.read_namespaced_pod_log, name=pod.metadata.name,
+                                  namespace="default", _preload_content=False)
+    except client.exceptions.ApiException as e:
+        logging.error(f"Could not read the log of build '{build_job.metadata.name}': {e}")
+        return
+
+    def lines():
+        partial = b""
+        for data in response.stream(LOG_CHUNK_SIZE, decode_content=True):
+            *complete_lines, partial = (partial + data).split(b"\n")
+            for line in complete_lines:
+                yield line.decode("utf-8", errors="replace")
+        yield partial.decode("utf-8", errors="replace")
+
+    def scan():
+        try:
+            build_cache.record_build(build_job.metadata.name, lines(), duration)
+        finally:
+            response.close()
+            response.release_conn()
+
+    await run_in_threadpool(scan)
+
+async def create_cache_warmer_job() -> bool:
+    """
+    Starts a Kaniko warmer job that pulls the most used base images into the
+    cache volume, unless one is still running.
+    """
+    running = [job for job in await cached_jobs()
+               if (job.metadata.labels or {}).get("app") == "kaniko-cache-warmer" and finished_condition(job) is None]
+    if running:
+        return False
+
+    job_name = f"kaniko-cache-warmer-{int(time.time())}"
+    warmer_args = ["--cache-dir=/cache", f"--registry-certificate={REGISTRY}=/certs/ca.crt"]
+    warmer_args += [f"--image={image}" for image in build_cache.warm_images()]
+    job_manifest = {
+        "apiVersion": "batch/v1",
+        "kind": "Job",
+        "metadata": {"name": job_name, "labels": {"app": "kaniko-cache-warmer"}},
+        "spec": {
+            "ttlSecondsAfterFinished": 3600,
+            "backoffLimit": 1,
+            "template": {
+                "metadata": {"labels": {"app": "kaniko-cache-warmer"}},
+                "spec": {
+                    **control_plane_placement(),
+                    "restartPolicy": "Never",
+                    "containers": [{
+                        "name": "warmer",
+                        "image": "gcr.io/kaniko-project/warmer:latest",
+                        "args": warmer_args,
+                        "volumeMounts": [
+                            {"name": "kaniko-cache", "mountPath": "/cache"},
+                            {"name": "ca-certificates", "mountPath": "/certs"}
+                        ]
+                    }],
+                    "volumes": [
+                        {"name": "kaniko-cache", "persistentVolumeClaim": {"claimName": KANIKO_CACHE_PVC}},
+                        {"name": "ca-certificates", "configMap": {"name": "ca-cert"}}
+                    ]
+                }
+            }
+        }
+    }
+    try:
+        await k8s_call(batch_v1.create_namespaced_job, namespace="default", body=job_manifest)
+        build_cache.record_warm()
+        logging.info(f"Cache warmer job '{job_name}' created successfully.")
+        return True
+    except client.exceptions.ApiException as e:
+        logging.error(f"Exception when creating cache warmer job: {e}")
+        return False
+
+async def keep_build_cache_warm():
+    await build_missing_base_images()
+    if KANIKO_CACHE:
+        await create_cache_warmer_job()
+
+@router.get("/builds/cache")
+async def build_cache_stats():
+    return build_cache.summary()
+
+@router.post("/builds/cache/warm")
+async def warm_build_cache():
+    if not KANIKO_CACHE:
+        raise HTTPException(status_code=409, detail="The build cache is disabled.")
+    if not await create_cache_warmer_job():
+        raise HTTPException(status_code=409, detail="A cache warmer job is already running.")
+    return {"message": "Cache warmer job started.", "images": build_cache.warm_images()}
+
+# Prebuilt base images with the heavy frameworks already installed. A build
+# whose Dockerfile starts FROM the catalogue entry's python image can be
+# rebased onto the entry's image, so pip finds the frameworks installed
+# instead of downloading and building them again. BASE_IMAGE_POLICY is
+# "rewrite" to rebase matching builds by default, "suggest" to only report
+# the match from /detect_libs/ (submissions opt in with base_image=auto), or
+# "off". BASE_IMAGE_CATALOGUE may name a JSON file replacing the default list.
+BASE_IMAGE_POLICY = os.getenv("BASE_IMAGE_POLICY", "suggest")
+BASE_IMAGE_DIRECTORY = os.path.join(UPLOAD_DIRECTORY, ".base-images")
+DEFAULT_BASE_IMAGE_CATALOGUE = [
+    {"name": "torch", "from": "python:3.9-slim",
+     "packages": {"torch": "torch==2.2.2", "numpy": "numpy==1.26.4"}},
+    {"name": "torch-scientific", "from": "python:3.9-slim",
+     "packages": {"torch": "torch==2.2.2", "numpy": "numpy==1.26.4", "pandas": "pandas==2.2.2",
+                  "sklearn": "scikit-learn==1.4.2"}},
+    {"name": "transformers", "from": "python:3.9-slim",
+     "packages": {"torch": "torch==2.2.2", "transformers": "transformers==4.40.2", "numpy": "numpy==1.26.4"}},
+    {"name": "tensorflow", "from": "python:3.9-slim",
+     "packages": {"tensorflow": "tensorflow==2.15.1", "numpy": "numpy==1.26.4"}},
+    {"name": "tensorflow-scientific", "from": "python:3.9-slim",
+     "packages": {"tensorflow": "tensorflow==2.15.1", "numpy": "numpy==1.26.4", "pandas": "pandas==2.2.2",
+                  "sklearn": "scikit-learn==1.4.2"}},
+]
+HEAVY_FRAMEWORKS = {"torch", "tensorflow", "jax", "transformers"}
+
+def load_base_image_catalogue() -> list:
+    path = os.getenv("BASE_IMAGE_CATALOGUE")
+    catalogue = read_json(path) if path else None
+    if catalogue is None:
+        catalogue = DEFAULT_BASE_IMAGE_CATALOGUE
+    for entry in catalogue:
+        entry["image"] = f"{REGISTRY}/base-images/{entry['name']}:latest"
+    return catalogue
+
+base_image_catalogue = load_base_image_catalogue()
+
+def base_image_ready(entry: dict) -> bool:
+    return os.path.exists(os.path.join(BASE_IMAGE_DIRECTORY, entry["name"], "built.json"))
+
+def match_base_image(analysis: Optional[dict], ready_only: bool = True) -> Optional[dict]:
+    """
+    Picks the catalogue entry for a /detect_libs/ analysis: it must provide
+    every heavy framework detected, at the pinned version if one is pinned
+    with ==. Among those, the entry covering the most detected frameworks
+    with the fewest extras wins.
+    """
+    if not analysis or BASE_IMAGE_POLICY == "off":
+        return None
+    frameworks = set(analysis.get("frameworks", []))
+    if not frameworks & HEAVY_FRAMEWORKS:
+        return None
+    candidates = []
+    for entry in base_image_catalogue:
+        provided = set(entry["packages"])
+        if not frameworks & HEAVY_FRAMEWORKS <= provided or (ready_only and not base_image_ready(entry)):
+            continue
+        versions = analysis.get("versions", {})
+        conflicts = [
+            requirement for framework, requirement in entry["packages"].items()
+            for name in (framework, requirement.split("==")[0])
+            if versions.get(name, "").startswith("==") and versions[name] != requirement[len(requirement.split("==")[0]):]
+        ]
+        if conflicts:
+            continue
+        candidates.append((len(frameworks & provided), -len(provided - frameworks), entry))
+    if not candidates:
+        return None
+    return max(candidates, key=lambda candidate: candidate[:2])[2]
+
+def select_base_image(analysis: Optional[dict], base_image: Optional[str]) -> Optional[dict]:
+    """
+    Resolves a submission's base_image option to a ready catalogue entry, or
+    None to build on the Dockerfile's own base image.
+    """
+    if base_image is None:
+        base_image = "auto" if BASE_IMAGE_POLICY == "rewrite" else "none"
+    if base_image == "none":
+        return None
+    if base_image == "auto":
+        return match_base_image(analysis)
+    entry = next((e for e in base_image_catalogue if e["name"] == base_image), None)
+    if entry is None:
+        raise HTTPException(status_code=400, detail=f"Unknown base image '{base_image}'.")
+    return entry if base_image_ready(entry) else None
+
+def rebase_dockerfile(upload_path: str, dockerfile_relpath: str, entry: dict) -> Optional[str]:
+    """
+    Writes a copy of the Dockerfile that builds FROM the catalogue image next
+    to it and returns its relative path, or None if the Dockerfile is not a
+    single-stage build on the entry's python image. The original is not
+    modified, since context files are hardlinks into the blob store.
+    """
+    with open(os.path.join(upload_path, dockerfile_relpath), encoding="utf-8", errors="replace") as f:
+        lines = f.read().splitlines()
+    from_lines = [i for i, line in enumerate(lines) if line.split()[:1] and line.split()[0].upper() == "FROM"]
+    if len(from_lines) != 1:
+        return None
+    words = lines[from_lines[0]].split()
+    if len(words) != 2 or words[1].split(":")[0] != entry["from"].split(":")[0]:
+        return None
+    # Same Python minor version, e.g. python:3.9 and python:3.9-slim
+    version = entry["from"].split(":")[1].split("-")[0] if ":" in entry["from"] else ""
+    if not words[1].partition(":")[2].startswith(version):
+        return None
+
+    lines[from_lines[0]] = f"FROM {entry['image']}"
+    rebased_relpath = f"{dockerfile_relpath}.{entry['name']}"
+    with open(os.path.join(upload_path, rebased_relpath), "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return rebased_relpath
+
+def base_image_dockerfile(entry: dict) -> str:
+    packages = " ".join(entry["packages"].values())
+    return f"FROM {entry['from']}\nRUN pip install --no-cache-dir {packages}\n"
+
+async def build_base_image(entry: dict) -> Optional[str]:
+    """
+    Queues a Kaniko build of a catalogue image, unless one is already queued
+    or running. Returns the job name.
+    """
+    running = [job for job in await cached_jobs()
+               if (job.metadata.labels or {}).get("base-image") == entry["name"] and finished_condition(job) is None]
+    queued = [queued for queued in build_queue.entries() if queued["labels"].get("base-image") == entry["name"]]
+    if running or queued:
+        return None
+    context_dir = os.path.join(BASE_IMAGE_DIRECTORY, entry["name"])
+    os.makedirs(context_dir, exist_ok=True)
+    with open(os.path.join(context_dir, "Dockerfile"), "w", encoding="utf-8") as f:
+        f.write(base_image_dockerfile(entry))
+    job_name = f"base-image-{entry['name']}-{int(time.time())}"
+    await build_queue.submit(
+        job_name,
+        os.path.relpath(context_dir, UPLOAD_DIRECTORY),
+        "Dockerfile",
+        destination=entry["image"],
+        labels={"base-image": entry["name"]},
+        priority=BUILD_PRIORITY_BACKGROUND
+    )
+    return job_name
+
+def on_base_image_job(event_type: str, job):
+    # Marks a catalogue image as built once its Kaniko job completes
+    if job is None or event_type == "DELETED":
+        return
+    name = (job.metadata.labels or {}).get("base-image")
+    entry = next((e for e in base_image_catalogue if e["name"] == name), None)
+    if entry is not None and finished_condition(job) == "Complete" and not base_image_ready(entry):
+        write_json(os.path.join(BASE_IMAGE_DIRECTORY, name, "built.json"), {
+            "build_job": job.metadata.name,
+            "dockerfile": base_image_dockerfile(entry),
+            "built_at": time.time()
+        })
+        logging.info(f"Base image '{name}' is ready")
+
+async def build_missing_base_images():
+    if BASE_IMAGE_POLICY == "off":
+        return
+    for entry in base_image_catalogue:
+        if not base_image_ready(entry):
+            await build_base_image(entry)
+
+@router.get("/base_images/")
+async def list_base_images():
+    return {
+        "policy": BASE_IMAGE_POLICY,
+        "images": [
+            {
+                "name": entry["name"],
+                "image": entry["image"],
+                "packages": sorted(entry["packages"].values()),
+                "ready": base_image_ready(entry)
+            }
+            for entry in base_image_catalogue
+        ]
+    }
+
+@router.post("/base_images/{name}/build")
+async def rebuild_base_image(name: str):
+    entry = next((e for e in base_image_catalogue if e["name"] == name), None)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Base image '{name}' not found.")
+    job_name = await build_base_image(entry)
+    if job_name is None:
+        raise HTTPException(status_code=409, detail=f"Base image '{name}' is already being built.")
+    return {"message": f"Building base image '{name}'.", "job_name": job_name}
+
+async def create_kaniko_job(job_name: str, upload_id: str, dockerfile_relpath: str,
+                            destination: Optional[str] = None, labels: Optional[dict] = None) -> bool:
+    context_path = f"/workspace/{upload_id}"
+    registry     = REGISTRY
+
+    kaniko_args = [
+        f"--dockerfile={dockerfile_relpath}",
+        f"--context={context_path}",
+        f"--destination={destination or f'{registry}/{job_name}:latest'}",
+        # tell Kaniko which CA cert to trust
+        f"--registry-certificate={registry}=/certs/ca.crt",
+        # executions pull the pushed image by digest
+        f"--digest-file=/workspace/{os.path.relpath(DIGEST_DIRECTORY, UPLOAD_DIRECTORY)}/{job_name}",
+    ]
+
+    if KANIKO_CACHE:
+        kaniko_args += [
+            "--cache=true",
+            f"--cache-repo={KANIKO_CACHE_REPO}",
+            "--cache-dir=/cache",
+            f"--cache-ttl={KANIKO_CACHE_TTL}",
+        ]
+
+    if os.getenv("KANIKO_INSECURE", "false").lower() == "true":
+        kaniko_args += ["--insecure", "--skip-tls-verify"]
+
+    job_manifest = {
+        "apiVersion": "batch/v1",
+        "kind": "Job",
+        "metadata": {"name": job_name, "labels": {**(labels or {}), "app": "kaniko-build"}},
+        "spec": {
+            "template": {
+                "metadata": {"name": job_name, "labels": {"app": "kaniko-build"}},
+                "spec": {
+                    **build_placement(),
+                    "restartPolicy": "Never",
+                    "containers": [{
+                        "name": "kaniko",
+                        "image": "gcr.io/kaniko-project/executor:latest",
+                        "args": kaniko_args,
+                        "resources": build_resources(),
+                        "volumeMounts": [
+                            {
+                                "name": "shared-storage",
+                                "mountPath": "/workspace"
+                            },
+                            {
+                                "name": "ca-certificates",
+                                "mountPath": "/certs"
+                            },
+                            {
+                                "name": "kaniko-cache",
+                                "mountPath": "/cache",
+                                "readOnly": True
+                            }
+                        ]
+                    }],
+                    "volumes": [
+                        {
+                            "name": "shared-storage",
+                            "persistentVolumeClaim": {
+                                "claimName": "shared-pvc"
+                            }
+                        },
+                        {
+                            "name": "ca-certificates",
+                            "configMap": {
+                                "name": "ca-cert"
+                            }
+                        },
+                        {
+                            "name": "kaniko-cache",
+                            "persistentVolumeClaim": {
+                                "claimName": KANIKO_CACHE_PVC
+                            }
+                        } if KANIKO_CACHE else {
+                            "name": "kaniko-cache",
+                            "emptyDir": {}
+                        }
+                    ]
+                }
+            }
+        }
+    }
+
+    try:
+        await k8s_call(batch_v1.create_namespaced_job, namespace="default", body=job_manifest)
+        logging.info(f"Kaniko job '{job_name}' created successfully.")
+        return True
+    except client.exceptions.ApiException as e:
+        logging.error(f"Exception when creating Kaniko job: {e}")
+        return False
+
+# Builds wait in a persistent queue and at most MAX_CONCURRENT_BUILDS Kaniko
+# jobs run at once, highest priority first and FIFO within a priority.
+# BUILD_PLACEMENT is "control-plane" to pin builds to the control-plane node
+# or "spread" to prefer worker nodes and spread builds across them. Builds
+# read their context from shared-pv and the layer cache from kaniko-cache-pv,
+# which the specs define as hostPath volumes on the control-plane node; a
+# build on a worker would see empty directories there. "spread" therefore
+# needs both volumes on storage every node mounts (NFS or similar).
+BUILD_QUEUE_DIRECTORY = os.path.join(UPLOAD_DIRECTORY, ".build-queue")
+MAX_CONCURRENT_BUILDS = int(os.getenv("MAX_CONCURRENT_BUILDS", "2"))
+BUILD_PLACEMENT = os.getenv("BUILD_PLACEMENT", "control-plane")
+KANIKO_CPU_REQUEST = os.getenv("KANIKO_CPU_REQUEST", "1")
+KANIKO_MEMORY_REQUEST = os.getenv("KANIKO_MEMORY_REQUEST", "2Gi")
+KANIKO_CPU_LIMIT = os.getenv("KANIKO_CPU_LIMIT")
+KANIKO_MEMORY_LIMIT = os.getenv("KANIKO_MEMORY_LIMIT")
+# Base image builds only run when no submission is waiting
+BUILD_PRIORITY_DEFAULT = 0
+BUILD_PRIORITY_BACKGROUND = -10
+BUILD_WAIT_SAMPLES = 200
+
+def build_placement() -> dict:
+    if BUILD_PLACEMENT != "spread":
+        return control_plane_placement()
+    # Workers are preferred, the control plane is still a fallback
+    return {
+        "affinity": {
+            "nodeAffinity": {
+                "preferredDuringSchedulingIgnoredDuringExecution": [{
+                    "weight": 100,
+                    "preference": {"matchExpressions": [{
+                        "key": "node-role.kubernetes.io/control-plane",
+                        "operator": "DoesNotExist"
+                    }]}
+                }]
+            }
+        },
+        "topologySpreadConstraints": [{
+            "maxSkew": 1,
+            "topologyKey": "kubernetes.io/hostname",
+            "whenUnsatisfiable": "ScheduleAnyway",
+            "labelSelector": {"matchLabels": {"app": "kaniko-build"}}
+        }],
+        "tolerations": control_plane_placement()["tolerations"]
+    }
+
+def build_resources() -> dict:
+    resources = {"requests": {"cpu": KANIKO_CPU_REQUEST, "memory": KANIKO_MEMORY_REQUEST}}
+    limits = {key: value for key, value in (("cpu", KANIKO_CPU_LIMIT), ("memory", KANIKO_MEMORY_LIMIT)) if value}
+    if limits:
+        resources["limits"] = limits
+    return resources
+
+class BuildQueue:
+    """
+    Persistent queue of Kaniko builds, one JSON file per queued build. Builds
+    are started by dispatch(), which runs after every submission and
+    whenever a job event may have freed a slot.
+    """
+
+    def __init__(self, directory: str, max_running: int):
+        self.directory = directory
+        self.max_running = max_running
+        self.queued = {}
+        self.dispatched = {}
+        self.waits = deque(maxlen=BUILD_WAIT_SAMPLES)
+        self.sequence = 0
+        self.holds = set()
+        self.loop = None
+        self.lock = threading.Lock()
+        self.dispatching = None
+
+    def load(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                entry = read_json(os.path.join(self.directory, name))
+                if entry:
+                    self.queued[entry["job_name"]] = entry
+                    self.sequence = max(self.sequence, entry["sequence"])
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.dispatching = asyncio.Lock()
+
+    def path(self, job_name: str) -> str:
+        return os.path.join(self.directory, f"{job_name}.json")
+
+    async def submit(self, job_name: str, upload_id: str, dockerfile_relpath: str,
+                     destination: Optional[str] = None, labels: Optional[dict] = None,
+                     priority: int = BUILD_PRIORITY_DEFAULT):
+        with self.lock:
+            self.sequence += 1
+            entry = {
+                "job_name": job_name,
+                "upload_id": upload_id,
+                "dockerfile": dockerfile_relpath,
+                "destination": destination,
+                "labels": labels or {},
+                "priority": priority,
+                "sequence": self.sequence,
+                "enqueued_at": time.time()
+            }
+            write_json(self.path(job_name), entry)
+            self.queued[job_name] = entry
+        await self.dispatch()
+
+    def is_queued(self, job_name: str) -> bool:
+        with self.lock:
+            return job_name in self.queued
+
+    def entries(self) -> list:
+        with self.lock:
+            return sorted(self.queued.values(), key=lambda entry: (-entry["priority"], entry["sequence"]))
+
+    def running(self) -> list:
+        """
+        Unfinished Kaniko jobs, including ones just created that the
+        informer has not reported yet.
+        """
+        running = {
+            job.metadata.name for job in job_informer.list()
+            if (job.metadata.labels or {}).get("app") == "kaniko-build" and finished_condition(job) is None
+        }
+        from executions import PIPELINE_GRACE_PERIOD
+        with self.lock:
+            now = time.time()
+            self.dispatched = {
+                name: created_at for name, created_at in self.dispatched.items()
+                if job_informer.get(name) is None and now - created_at < PIPELINE_GRACE_PERIOD
+            }
+            return sorted(running | set(self.dispatched))
+
+    def on_job_event(self, event_type: str, job):
+        # Called on the informer thread; builds are started on the event loop
+        if self.loop is None:
+            return
+        if event_type in ("SYNC", "DELETED") or finished_condition(job) is not None:
+            asyncio.run_coroutine_threadsafe(self.dispatch(), self.loop)
+
+    def hold(self, reason: str):
+        # No new builds start until every hold is released
+        self.holds.add(reason)
+
+    async def release(self, reason: str):
+        self.holds.discard(reason)
+        await self.dispatch()
+
+    async def dispatch(self):
+        if self.dispatching is None or not job_informer.synced.is_set() or self.holds:
+            return
+        async with self.dispatching:
+            while True:
+                entries = self.entries()
+                if not entries or len(self.running()) >= self.max_running:
+                    return
+                await self.start(entries[0])
+
+    async def start(self, entry: dict):
+        job_name = entry["job_name"]
+        created = await create_kaniko_job(
+            job_name, entry["upload_id"], entry["dockerfile"], entry["destination"], entry["labels"]
+        )
+        wait = time.time() - entry["enqueued_at"]
+        with self.lock:
+            self.queued.pop(job_name, None)
+            if created:
+                self.dispatched[job_name] = time.time()
+                self.waits.append(wait)
+        try:
+            os.remove(self.path(job_name))
+        except FileNotFoundError:
+            pass
+        if created:
+            logging.info(f"Build '{job_name}' started after waiting {wait:.1f}s")
+        else:
+            from executions import pipelines
+            pipelines.build_not_started(job_name)
+
+    def summary(self) -> dict:
+        entries = self.entries()
+        now = time.time()
+        with self.lock:
+            waits = sorted(self.waits)
+        return {
+            "max_concurrent_builds": self.max_running,
+            "placement": BUILD_PLACEMENT,
+            "resources": build_resources(),
+            "running": self.running(),
+            "held_by": sorted(self.holds),
+            "depth": len(entries),
+            "queued": [
+                {
+                    "job_name": entry["job_name"],
+                    "position": position,
+                    "priority": entry["priority"],
+                    "enqueued_at": entry["enqueued_at"],
+                    "waiting_seconds": now - entry["enqueued_at"]
+                }
+                for position, entry in enumerate(entries, start=1)
+            ],
+            "wait_seconds": {
+                "samples": len(waits),
+                "average": sum(waits) / len(waits) if waits else None,
+                "p95": waits[min(int(0.95 * len(waits)), len(waits) - 1)] if waits else None,
+                "max": waits[-1] if waits else None
+            }
+        }
+
+build_queue = BuildQueue(BUILD_QUEUE_DIRECTORY, MAX_CONCURRENT_BUILDS)
+
+@router.get("/builds/queue")
+async def build_queue_status():
+    return build_queue.summary()
+
+# Kaniko writes the digest of each pushed image to DIGEST_DIRECTORY/<job>
+DIGEST_DIRECTORY = os.path.join(UPLOAD_DIRECTORY, ".digests")
+
+def read_image_digest(build_job: str) -> Optional[str]:
+    try:
+        with open(os.path.join(DIGEST_DIRECTORY, build_job), encoding="utf-8") as f:
+            digest = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return digest if re.match(r"^sha256:[0-9a-f]{64}$", digest) else None
+
+def setup():
+    for directory in (IMAGE_CACHE_DIRECTORY, BUILD_CACHE_DIRECTORY, BASE_IMAGE_DIRECTORY,
+                      BUILD_QUEUE_DIRECTORY, DIGEST_DIRECTORY):
+        os.makedirs(directory, exist_ok=True)
+    if BUILD_PLACEMENT == "spread":
+        logging.warning("BUILD_PLACEMENT=spread: build contexts and the Kaniko cache must be on storage shared "
+                        "by all nodes, not the hostPath volumes of the default specs")
+    build_cache.load()
+    job_informer.listeners.append(on_base_image_job)
+    build_queue.load()
+    job_informer.listeners.append(build_queue.on_job_event)
@@ -0,0 +1,502 @@
+import io
+import logging
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from builds import match_base_image
+from storage import UPLOAD_DIRECTORY, hash_stream, read_json, write_json
+
+router = APIRouter()
+
+# Frameworks reported by /detect_libs/, keyed by the pip/conda packages and
+# the top-level Python modules that indicate them
+FRAMEWORK_PACKAGES = {
+    "torch": {"torch", "torchvision", "torchaudio", "pytorch"},
+    "tensorflow": {"tensorflow", "tensorflow-gpu", "tensorflow-cpu", "tf-nightly", "keras"},
+    "jax": {"jax", "jaxlib", "flax"},
+    "numpy": {"numpy"},
+    "pandas": {"pandas"},
+    "sklearn": {"scikit-learn", "sklearn"},
+    "transformers": {"transformers"},
+}
+FRAMEWORK_MODULES = {
+    "torch": "torch", "torchvision": "torch", "torchaudio": "torch",
+    "tensorflow": "tensorflow", "keras": "tensorflow",
+    "jax": "jax", "flax": "jax",
+    "numpy": "numpy", "pandas": "pandas", "sklearn": "sklearn",
+    "transformers": "transformers",
+}
+GPU_PACKAGES = {"tensorflow-gpu", "cupy", "jaxlib-cuda", "nvidia-cudnn-cu11", "nvidia-cudnn-cu12"}
+
+# /detect_libs/ only reads small text members; anything bigger is skipped
+MAX_DETECT_MEMBER_SIZE = 1024 * 1024
+MAX_DETECT_SOURCE_FILES = 200
+# Archive bytes a ranged /detect_libs/ request may carry
+MAX_DETECT_RANGE_BYTES = 64 * 1024 * 1024
+# Analysed archives, keyed by archive hash. Spilling writes every entry to
+# the PVC as well, so results survive restarts.
+DETECT_CACHE_ENTRIES = int(os.getenv("DETECT_CACHE_ENTRIES", "256"))
+DETECT_CACHE_SPILL = os.getenv("DETECT_CACHE_SPILL", "false").lower() == "true"
+DETECT_CACHE_DISK_ENTRIES = int(os.getenv("DETECT_CACHE_DISK_ENTRIES", "10000"))
+IGNORED_DIRECTORIES = {"venv", ".venv", "env", "site-packages", "node_modules", "__pycache__", ".git"}
+PIP_VALUE_OPTIONS = {"-r", "--requirement", "-c", "--constraint", "-i", "--index-url",
+                     "--extra-index-url", "-f", "--find-links", "--channel", "-n", "--name"}
+
+REQUIREMENT_RE = re.compile(
+    r"^([A-Za-z0-9][A-Za-z0-9._-]*)(?:\[[^\]]*\])?\s*(?:(===|==|~=|>=|<=|!=|>|<)\s*([A-Za-z0-9.*+!_-]+))?"
+)
+CONDA_SPEC_RE = re.compile(r"^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:(==|>=|<=|=)\s*([A-Za-z0-9.*+!_-]+))?")
+POETRY_DEPENDENCY_RE = re.compile(r'^([A-Za-z0-9][A-Za-z0-9._-]*)\s*=\s*(?:"([^"]*)"|\{.*version\s*=\s*"([^"]*)")')
+IMPORT_RE = re.compile(r"^\s*(?:from\s+([A-Za-z_]\w*)|import\s+([A-Za-z_]\w*(?:\s*,\s*[A-Za-z_]\w*)*))", re.MULTILINE)
+
+class MissingRange(Exception):
+    def __init__(self, offset: int, length: int):
+        super().__init__(f"Bytes {offset}-{offset + length} of the archive were not sent")
+        self.offset = offset
+        self.length = length
+
+class MissingRanges(Exception):
+    def __init__(self, ranges: list):
+        super().__init__(f"{len(ranges)} archive ranges were not sent")
+        self.ranges = ranges
+
+class ArchiveRanges(io.RawIOBase):
+    """
+    Seekable, read-only view over the byte ranges of an archive a client
+    sent to /detect_libs/. Reading anywhere else raises MissingRange, which
+    tells the client which bytes to send next.
+    """
+
+    def __init__(self, size: int, ranges: Dict[int, bytes]):
+        self.size = size
+        self.position = 0
+        # Coalesce overlapping and adjacent ranges
+        self.ranges = []
+        for offset, data in sorted(ranges.items()):
+            if self.ranges:
+                last_offset, last_data = self.ranges[-1]
+                last_end = last_offset + len(last_data)
+                if offset <= last_end:
+                    self.ranges[-1] = (last_offset, last_data + data[last_end - offset:])
+                    continue
+            self.ranges.append((offset, data))
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(0, offset)
+        return self.position
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else min(self.size, self.position + size)
+        if self.position >= end:
+            return b""
+        for offset, data in self.ranges:
+            if offset <= self.position and end <= offset + len(data):
+                chunk = data[self.position - offset:end - offset]
+                self.position = end
+                return chunk
+        raise MissingRange(self.position, end - self.position)
+
+def is_ignored_member(name: str) -> bool:
+    return any(part in IGNORED_DIRECTORIES for part in name.split("/")[:-1])
+
+def select_detect_members(zip_ref: zipfile.ZipFile) -> dict:
+    """
+    Picks the members worth reading from the central directory: the
+    shallowest Dockerfile, dependency manifests and a bounded number of
+    Python sources.
+    """
+    selected = {"dockerfile": None, "requirements": [], "pyproject": [], "environment": [], "sources": []}
+    for info in zip_ref.infolist():
+        if info.is_dir() or is_ignored_member(info.filename) or info.file_size > MAX_DETECT_MEMBER_SIZE:
+            continue
+        base = info.filename.rsplit("/", 1)[-1]
+        if base == "Dockerfile":
+            if (selected["dockerfile"] is None
+                    or info.filename.count("/") < selected["dockerfile"].filename.count("/")):
+                selected["dockerfile"] = info
+        elif base.startswith("requirements") and base.endswith(".txt"):
+            selected["requirements"].append(info)
+        elif base == "pyproject.toml":
+            selected["pyproject"].append(info)
+        elif base in ("environment.yml", "environment.yaml"):
+            selected["environment"].append(info)
+        elif base.endswith(".py"):
+            selected["sources"].append(info)
+
+    # Prefer top-level scripts over deeply nested modules
+    selected["sources"].sort(key=lambda i: (i.filename.count("/"), i.file_size))
+    del selected["sources"][MAX_DETECT_SOURCE_FILES:]
+    return selected
+
+def member_range(info: zipfile.ZipInfo) -> tuple:
+    """
+    Byte range holding a member's local header and data. The local extra
+    field can differ from the central one, so leave some slack.
+    """
+    header_size = 30 + len(info.orig_filename.encode("utf-8")) + len(info.extra) + 1024
+    return info.header_offset, header_size + info.compress_size
+
+def parse_requirement(line: str, pattern=REQUIREMENT_RE):
+    match = pattern.match(line.strip())
+    if not match:
+        return None
+    name, operator, version = match.groups()
+    # Conda pins with a single '='
+    if operator == "=":
+        operator = "=="
+    return name.lower().replace("_", "-"), (operator + version) if operator else None
+
+def analyse_dockerfile(text: str, analysis: dict):
+    # Fold line continuations so multi-line RUN instructions parse as one
+    text = re.sub(r"\\\r?\n", " ", text)
+    for line in text.splitlines():
+        words = line.split()
+        if not words:
+            continue
+        instruction = words[0].upper()
+        if instruction == "FROM" and len(words) > 1:
+            image = words[1].lower()
+            if re.search(r"cuda|nvidia|gpu", image):
+                analysis["gpu_reasons"].append(f"base image '{words[1]}'")
+            for framework, marker in (("torch", "pytorch"), ("tensorflow", "tensorflow")):
+                if marker in image.split(":")[0]:
+                    analysis["frameworks"].add(framework)
+                    tag = image.split(":")[1] if ":" in image else ""
+                    if tag[:1].isdigit():
+                        analysis["versions"].setdefault(framework, "==" + tag.split("-")[0])
+        elif instruction == "RUN":
+            for command in re.split(r"&&|;", line):
+                analyse_install_command(command.split(), analysis)
+
+def analyse_install_command(args: list, analysis: dict):
+    """
+    Records the packages named in a `pip install` / `conda install` command.
+    """
+    if "install" not in args:
+        return
+    installer = args[:args.index("install")]
+    conda = any(a in ("conda", "mamba", "micromamba") for a in installer)
+    if not conda and not any(a in ("pip", "pip3") or a.endswith("/pip") for a in installer):
+        return
+
+    skip_value = False
+    for arg in args[args.index("install") + 1:]:
+        if re.search(r"/cu\d+", arg):
+            analysis["gpu_reasons"].append(f"CUDA package index '{arg}'")
+        if skip_value:
+            skip_value = False
+        elif arg.startswith("-"):
+            # Options that take a separate value, e.g. -r requirements.txt
+            skip_value = arg in PIP_VALUE_OPTIONS
+        else:
+            add_requirement(parse_requirement(arg.strip("'\""), CONDA_SPEC_RE if conda else REQUIREMENT_RE), analysis)
+
+def add_requirement(requirement, analysis: dict):
+    if requirement is None:
+        return
+    name, spec = requirement
+    analysis["packages"].add(name)
+    if spec:
+        analysis["versions"][name] = spec
+    if "+cu" in (spec or ""):
+        analysis["gpu_reasons"].append(f"CUDA build '{name}{spec}'")
+    if name in GPU_PACKAGES or name.startswith("nvidia-"):
+        analysis["gpu_reasons"].append(f"package '{name}'")
+
+def analyse_requirements(text: str, analysis: dict):
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if line.startswith("-"):
+            if re.search(r"/cu\d+", line):
+                analysis["gpu_reasons"].append(f"CUDA package index '{line}'")
+            continue
+        add_requirement(parse_requirement(line), analysis)
+
+def analyse_environment(text: str, analysis: dict):
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line.startswith("- "):
+            continue
+        spec = line[2:].strip().strip("'\"")
+        # Entries may be channel-qualified, e.g. pytorch::pytorch
+        spec = spec.split("::")[-1]
+        add_requirement(parse_requirement(spec, CONDA_SPEC_RE), analysis)
+        if spec.startswith("cudatoolkit") or spec.startswith("pytorch-cuda"):
+            analysis["gpu_reasons"].append(f"conda package '{spec}'")
+
+def analyse_pyproject(text: str, analysis: dict):
+    section = None
+    in_dependencies = False
+    for line in text.splitlines():
+        stripped = line.split("#", 1)[0].strip()
+        if stripped.startswith("["):
+            section = stripped.strip("[]").strip()
+            in_dependencies = False
+            continue
+        if section == "tool.poetry.dependencies":
+            match = POETRY_DEPENDENCY_RE.match(stripped)
+            if match and match.group(1).lower() != "python":
+                version = match.group(2) or match.group(3)
+                add_requirement((match.group(1).lower().replace("_", "-"), version or None), analysis)
+        elif section == "project":
+            if stripped.startswith("dependencies"):
+                in_dependencies = True
+            if in_dependencies:
+                for requirement in re.findall(r'"([^"]+)"|\'([^\']+)\'', stripped):
+                    add_requirement(parse_requirement(requirement[0] or requirement[1]), analysis)
+                if "]" in stripped:
+                    in_dependencies = False
+
+def analyse_source(name: str, text: str, analysis: dict):
+    for match in IMPORT_RE.finditer(text):
+        if match.group(1):
+            analysis["imports"].add(match.group(1))
+        else:
+            analysis["imports"].update(m.strip() for m in match.group(2).split(","))
+    if re.search(r"\.cuda\(|[\"']cuda[\"':]|torch\.cuda|list_physical_devices\([\"']GPU", text):
+        analysis["gpu_reasons"].append(f"CUDA usage in '{name}'")
+
+def scan_archive_libs(zip_ref: zipfile.ZipFile) -> dict:
+    """
+    Works out which ML frameworks (and versions) an archive needs by reading
+    only the Dockerfile, dependency manifests and Python sources straight
+    from the zip, without extracting anything. Raises MissingRanges when
+    reading from an incomplete ArchiveRanges source.
+    """
+    selected = select_detect_members(zip_ref)
+    if selected["dockerfile"] is None:
+        raise HTTPException(status_code=400, detail="Missing required file(s): Dockerfile")
+
+    members = [selected["dockerfile"]]
+    for kind in ("requirements", "pyproject", "environment", "sources"):
+        members.extend(selected[kind])
+
+    # Ask for every missing member at once rather than one per round trip
+    texts = {}
+    missing = []
+    for info in members:
+        try:
+            texts[info.filename] = zip_ref.read(info).decode("utf-8", errors="replace")
+        except MissingRange:
+            missing.append(member_range(info))
+    if missing:
+        raise MissingRanges(missing)
+
+    analysis = {"frameworks": set(), "packages": set(), "imports": set(), "versions": {}, "gpu_reasons": []}
+    analyse_dockerfile(texts[selected["dockerfile"].filename], analysis)
+    for info in selected["requirements"]:
+        analyse_requirements(texts[info.filename], analysis)
+    for info in selected["pyproject"]:
+        analyse_pyproject(texts[info.filename], analysis)
+    for info in selected["environment"]:
+        analyse_environment(texts[info.filename], analysis)
+    for info in selected["sources"]:
+        analyse_source(info.filename, texts[info.filename], analysis)
+
+    for framework, packages in FRAMEWORK_PACKAGES.items():
+        if analysis["packages"] & packages:
+            analysis["frameworks"].add(framework)
+    for module in analysis["imports"]:
+        if module in FRAMEWORK_MODULES:
+            analysis["frameworks"].add(FRAMEWORK_MODULES[module])
+
+    frameworks = sorted(analysis["frameworks"])
+    return {
+        # Kept for clients that read the original Dockerfile-only result
+        "results": {"Dockerfile": {t: t in frameworks for t in ["torch", "numpy", "pandas", "tensorflow"]}},
+        "frameworks": frameworks,
+        "versions": analysis["versions"],
+        "gpu": {"needed": bool(analysis["gpu_reasons"]), "reasons": analysis["gpu_reasons"]},
+        "files": {
+            "dockerfile": selected["dockerfile"].filename,
+            "requirements": [i.filename for i in selected["requirements"]],
+            "pyproject": [i.filename for i in selected["pyproject"]],
+            "environment": [i.filename for i in selected["environment"]],
+            "sources_scanned": len(selected["sources"]),
+        }
+    }
+
+class DetectCache:
+    """
+    Bounded LRU of /detect_libs/ results keyed by archive hash. With a
+    spill_dir, entries are also written there so they survive restarts and
+    memory evictions; the directory is trimmed to max_disk_entries.
+    """
+
+    def __init__(self, max_entries: int, spill_dir: Optional[str] = None, max_disk_entries: int = 0):
+        self.max_entries = max_entries
+        self.spill_dir = spill_dir
+        self.max_disk_entries = max_disk_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+        value = read_json(os.path.join(self.spill_dir, f"{key}.json")) if self.spill_dir else None
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key: str, value: dict):
+        with self.lock:
+            self._remember(key, value)
+        if self.spill_dir:
+            write_json(os.path.join(self.spill_dir, f"{key}.json"), value)
+            self._trim_disk()
+
+    def _remember(self, key: str, value: dict):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _trim_disk(self):
+        files = [e for e in os.scandir(self.spill_dir) if e.name.endswith(".json")]
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=lambda e: e.stat().st_mtime)
+        for entry in files[:len(files) - self.max_disk_entries]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+detect_cache = DetectCache(
+    DETECT_CACHE_ENTRIES,
+    os.path.join(UPLOAD_DIRECTORY, ".cache", "detect") if DETECT_CACHE_SPILL else None,
+    DETECT_CACHE_DISK_ENTRIES
+)
+
+def archive_hash(zip_ref: zipfile.ZipFile, source) -> str:
+    """
+    SHA-256 of the archive's central directory and end records. These hold
+    the name, size and CRC-32 of every member, so the hash identifies the
+    archive's content while only needing the tail of the file, which a
+    ranged /detect_libs/ request has anyway.
+    """
+    source.seek(zip_ref.start_dir)
+    return hash_stream(source)
+
+def detect_archive_libs(source) -> dict:
+    """
+    Cached front for scan_archive_libs. source is a seekable file object;
+    an ArchiveRanges source may raise MissingRange or MissingRanges.
+    """
+    with zipfile.ZipFile(source, 'r') as zip_ref:
+        key = archive_hash(zip_ref, source)
+        result = detect_cache.get(key)
+        if result is None:
+            result = scan_archive_libs(zip_ref)
+            result["archive_hash"] = key
+            detect_cache.put(key, result)
+    return result
+
+def detect_archive_file_libs(file_location: str) -> Optional[dict]:
+    """
+    detect_archive_libs for an archive on disk. Returns None rather than
+    failing if the archive cannot be analysed.
+    """
+    try:
+        with open(file_location, "rb") as f:
+            return detect_archive_libs(f)
+    except (HTTPException, zipfile.BadZipFile) as e:
+        logging.info(f"Could not analyse {file_location}: {e}")
+        return None
+
+@router.post("/detect_libs/")
+async def detect_libs(
+    file: Optional[UploadFile] = File(None),
+    chunks: Optional[List[UploadFile]] = File(None),
+    total_size: Optional[int] = Form(None)
+):
+    """
+    Detects frameworks, pinned versions and whether a GPU is likely needed.
+
+    Either send the whole archive as `file`, or send `total_size` plus
+    `chunks`: slices of the archive whose filenames are their byte offsets.
+    Start with the archive's tail (the central directory); while the reply
+    contains `need_ranges`, resend with those [offset, length] slices added.
+    That way only a few kilobytes of even a multi-GB archive are uploaded.
+    """
+    if file is not None:
+        # Ensure uploaded file is a ZIP
+        if not file.filename.endswith(".zip"):
+            raise HTTPException(status_code=400, detail="File must be a ZIP archive.")
+        source = file.file
+    elif chunks and total_size:
+        ranges = {}
+        received = 0
+        for chunk in chunks:
+            if not (chunk.filename or "").isdigit():
+                raise HTTPException(status_code=400, detail="Chunk filenames must be their byte offsets.")
+            data = await chunk.read()
+            received += len(data)
+            if received > MAX_DETECT_RANGE_BYTES:
+                raise HTTPException(status_code=413, detail=f"Chunks exceed {MAX_DETECT_RANGE_BYTES} bytes.")
+            ranges[int(chunk.filename)] = data
+        source = ArchiveRanges(total_size, ranges)
+    else:
+        raise HTTPException(status_code=400, detail="Send either a file or total_size with chunks.")
+
+    try:
+        analysis = await run_in_threadpool(detect_archive_libs, source)
+    except MissingRange as e:
+        # The central directory itself is incomplete; ask for everything
+        # from the missing offset to the end of the archive
+        return {"need_ranges": [[e.offset, total_size - e.offset]]}
+    except MissingRanges as e:
+        return {"need_ranges": [list(r) for r in e.ranges]}
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Invalid ZIP file.")
+
+    # Added to the reply only, the cached analysis stays independent of
+    # which base images are ready
+    suggestion = match_base_image(analysis)
+    return {
+        **analysis,
+        "base_image": {"name": suggestion["name"], "image": suggestion["image"]} if suggestion else None
+    }
+
+@router.get("/detect_libs/cache")
+async def detect_libs_cache_stats():
+    return {
+        "entries": len(detect_cache.entries),
+        "max_entries": detect_cache.max_entries,
+        "spill": detect_cache.spill_dir is not None,
+        "hits": detect_cache.hits,
+        "misses": detect_cache.misses
+    }
+
+def setup():
+    if detect_cache.spill_dir:
+        os.makedirs(detect_cache.spill_dir, exist_ok=True)
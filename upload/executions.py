@@ -0,0 +1,454 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+from kubernetes import client
+from starlette.concurrency import run_in_threadpool
+
+from builds import (
+    REGISTRY, build_cache, build_queue, context_digest, dockerfile_base_images, find_dockerfile,
+    image_cache, read_image_digest, rebase_dockerfile, record_build_cache_usage, select_base_image
+)
+from kube import apps_v1, batch_v1, finished_condition, job_informer, k8s_call
+from storage import CHECKPOINT_GRACE_SECONDS, UPLOAD_DIRECTORY, checkpoint_subpath, read_json, write_json
+
+router = APIRouter()
+
+async def trigger_build(job_name: str, upload_id: str, upload_path: str, analysis: Optional[dict] = None,
+                        manifest: Optional[list] = None, base_image: Optional[str] = None,
+                        user: Optional[str] = None, priority: int = 0) -> str:
+    """
+    Starts the Kaniko build and execution jobs for a build context that is in
+    place under upload_path. analysis is the /detect_libs/ result for the
+    uploaded archive, if known, and manifest its {path, size, sha256} list.
+    base_image is "auto", "none" or a catalogue name; None follows
+    BASE_IMAGE_POLICY. user and priority place the execution in the
+    admission queue; without a user the job name stands in for one.
+    Returns the execution job name.
+    """
+    # Log the contents of the uploaded folder
+    logging.info("Contents of uploaded folder:")
+    for root, dirs, files in os.walk(upload_path):
+        level = root.replace(upload_path, '').count(os.sep)
+        indent = ' ' * 4 * (level)
+        logging.info(f"{indent}{os.path.basename(root)}/")
+        subindent = ' ' * 4 * (level + 1)
+        for f in files:
+            logging.info(f"{subindent}{f}")
+
+    # Use the Dockerfile the analysis picked, otherwise search for one
+    dockerfile_relpath = analysis["files"]["dockerfile"] if analysis else None
+    if dockerfile_relpath is None or not os.path.isfile(os.path.join(upload_path, dockerfile_relpath)):
+        dockerfile_relpath = find_dockerfile(upload_path)
+    if dockerfile_relpath is None:
+        logging.error("Dockerfile not found in the uploaded files.")
+        raise HTTPException(status_code=400, detail="Dockerfile not found in the uploaded files.")
+
+    kaniko_job_name = f"{job_name}-kaniko-build-{upload_id}"
+    execution_job_name = f"{job_name}-execution-job-{upload_id}"
+
+    # A context identical to an earlier one reuses its image, or waits for
+    # its build if that is still running
+    digest = await run_in_threadpool(context_digest, upload_path, dockerfile_relpath, manifest)
+
+    prebuilt = select_base_image(analysis, base_image)
+    rebased_relpath = rebase_dockerfile(upload_path, dockerfile_relpath, prebuilt) if prebuilt else None
+    if rebased_relpath:
+        logging.info(f"Building '{job_name}' on prebuilt base image '{prebuilt['name']}'")
+        dockerfile_relpath = rebased_relpath
+        if digest:
+            digest = hashlib.sha256(f"{digest} {prebuilt['image']}".encode("utf-8")).hexdigest()
+    cached = image_cache.get(digest) if digest else None
+    if cached:
+        logging.info(f"Build context {digest[:12]} was already built as '{cached['image_name']}'")
+        pipelines.create(execution_job_name, None, cached["image_name"], digest, cached.get("image_digest"),
+                         user or job_name, priority)
+        await pipelines.advance(execution_job_name)
+        return execution_job_name
+    in_flight = pipelines.building(digest) if digest else None
+    if in_flight:
+        logging.info(f"Build context {digest[:12]} is already being built by '{in_flight['build_job']}'")
+        pipelines.create(execution_job_name, in_flight["build_job"], in_flight["image_name"], digest,
+                         user=user or job_name, priority=priority)
+        await pipelines.advance(execution_job_name)
+        return execution_job_name
+
+    # Base images of actual builds are what the cache warmer keeps warm
+    with open(os.path.join(upload_path, dockerfile_relpath), encoding="utf-8", errors="replace") as f:
+        build_cache.record_base_images(dockerfile_base_images(f.read()))
+
+    # Queue the Kaniko build; the pipeline orchestrator creates the job
+    # that executes the image and stores results once the build succeeds
+    pipelines.create(execution_job_name, kaniko_job_name, kaniko_job_name, digest,
+                     user=user or job_name, priority=priority)
+    await build_queue.submit(kaniko_job_name, upload_id, dockerfile_relpath)
+
+    return execution_job_name
+
+# Pipeline state lives in PIPELINE_DIRECTORY so builds still waiting for
+# their execution job are picked up again after a restart. A building
+# pipeline whose build job is not found after PIPELINE_GRACE_PERIOD seconds
+# is marked failed.
+PIPELINE_DIRECTORY = os.path.join(UPLOAD_DIRECTORY, ".pipelines")
+PIPELINE_GRACE_PERIOD = 60
+class PipelineOrchestrator:
+    """
+    Runs each upload's build and execution as a pipeline driven by job
+    events: building -> running once the Kaniko job completes (the
+    execution job is only created then), and succeeded or failed when the
+    job of the current stage finishes.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.pipelines = {}
+        self.by_build_job = {}
+        self.loop = None
+        self.lock = threading.Lock()
+        self.starting = set()
+
+    def load(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                pipeline = read_json(os.path.join(self.directory, name))
+                if pipeline:
+                    self.add(pipeline)
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+
+    def add(self, pipeline: dict):
+        with self.lock:
+            self.pipelines[pipeline["name"]] = pipeline
+            if pipeline["build_job"]:
+                self.by_build_job.setdefault(pipeline["build_job"], set()).add(pipeline["name"])
+
+    def save(self, pipeline: dict):
+        pipeline["updated_at"] = time.time()
+        write_json(os.path.join(self.directory, f"{pipeline['name']}.json"), pipeline)
+
+    def create(self, name: str, build_job: Optional[str], image_name: str,
+               context_digest: Optional[str] = None, image_digest: Optional[str] = None,
+               user: Optional[str] = None, priority: int = 0) -> dict:
+        """
+        Records a pipeline for execution job name that runs image_name once
+        build_job has completed, or straight away if build_job is None.
+        """
+        pipeline = {
+            "name": name,
+            "build_job": build_job,
+            "image_name": image_name,
+            "image_digest": image_digest,
+            "context_digest": context_digest,
+            "user": user or name,
+            "priority": priority,
+            "state": "building",
+            "message": None,
+            "created_at": time.time()
+        }
+        self.save(pipeline)
+        self.add(pipeline)
+        return pipeline
+
+    def update(self, pipeline: dict, state: str, message: Optional[str] = None):
+        pipeline["state"] = state
+        pipeline["message"] = message
+        self.save(pipeline)
+        logging.info(f"Pipeline '{pipeline['name']}' is {state}" + (f": {message}" if message else ""))
+
+    def get(self, name: str) -> Optional[dict]:
+        with self.lock:
+            return self.pipelines.get(name)
+
+    def list(self) -> list:
+        with self.lock:
+            return list(self.pipelines.values())
+
+    def building(self, context_digest: str) -> Optional[dict]:
+        """
+        Returns a pipeline whose build of context_digest is still running.
+        """
+        for pipeline in self.list():
+            if pipeline["state"] == "building" and pipeline["build_job"] and pipeline.get("context_digest") == context_digest:
+                return pipeline
+        return None
+
+    def on_job_event(self, event_type: str, job):
+        # Called on the informer thread; pipelines advance on the event loop
+        if self.loop is None:
+            return
+        if event_type == "SYNC":
+            names = [p["name"] for p in self.list() if p["state"] in ("building", "queued", "running")]
+        else:
+            with self.lock:
+                names = list(self.by_build_job.get(job.metadata.name, ()))
+                if job.metadata.name in self.pipelines:
+                    names.append(job.metadata.name)
+        for name in names:
+            asyncio.run_coroutine_threadsafe(self.advance(name), self.loop)
+
+    async def advance(self, name: str):
+        pipeline = self.get(name)
+        if pipeline is None:
+            return
+        if pipeline["state"] == "building":
+            if pipeline["build_job"] is None:
+                condition = "Complete"
+            else:
+                build_job = job_informer.get(pipeline["build_job"])
+                if build_job is None:
+                    if build_queue.is_queued(pipeline["build_job"]):
+                        return
+                    if job_informer.synced.is_set() and time.time() - pipeline["created_at"] > PIPELINE_GRACE_PERIOD:
+                        self.update(pipeline, "failed", "The build job no longer exists.")
+                    return
+                condition = finished_condition(build_job)
+            if condition == "Failed":
+                self.update(pipeline, "failed", "The image build failed.")
+                self.build_finished(pipeline, build_job, condition)
+            elif condition == "Complete" and name not in self.starting:
+                self.starting.add(name)
+                try:
+                    if pipeline["build_job"] is not None:
+                        pipeline["image_digest"] = read_image_digest(pipeline["build_job"])
+                        self.build_finished(pipeline, build_job, condition)
+                    # Executions are created suspended and started by the
+                    # admission queue; their image is pre-pulled meanwhile
+                    if await create_execution_job(name, pipeline["image_name"], pipeline.get("image_digest"), True):
+                        self.update(pipeline, "queued")
+                        asyncio.create_task(prepuller.refresh())
+                        from scheduling import admission_queue
+                        await admission_queue.submit(name, pipeline["user"], pipeline["priority"])
+                    else:
+                        self.update(pipeline, "failed", "The execution job could not be created.")
+                finally:
+                    self.starting.discard(name)
+        elif pipeline["state"] in ("queued", "running"):
+            execution_job = job_informer.get(name)
+            condition = finished_condition(execution_job) if execution_job is not None else None
+            if condition == "Complete":
+                self.update(pipeline, "succeeded")
+            elif condition == "Failed":
+                self.update(pipeline, "failed", "The execution job failed.")
+            if condition is not None:
+                asyncio.create_task(prepuller.refresh())
+
+    def build_not_started(self, build_job: str):
+        with self.lock:
+            names = list(self.by_build_job.get(build_job, ()))
+        for name in names:
+            pipeline = self.get(name)
+            if pipeline["state"] == "building":
+                self.update(pipeline, "failed", "The build job could not be created.")
+
+    def build_finished(self, pipeline: dict, build_job, condition: str):
+        if condition == "Complete" and pipeline.get("context_digest"):
+            image_cache.put(pipeline["context_digest"], pipeline["image_name"], pipeline["build_job"],
+                            pipeline["image_digest"])
+        # Only the pipeline that started the build counts it
+        if pipeline["build_job"] == pipeline["image_name"]:
+            asyncio.create_task(record_build_cache_usage(build_job))
+
+pipelines = PipelineOrchestrator(PIPELINE_DIRECTORY)
+
+@router.get("/pipelines/")
+async def list_pipelines():
+    return {"pipelines": sorted(pipelines.list(), key=lambda p: p["created_at"], reverse=True)}
+
+@router.get("/pipelines/{name}")
+async def get_pipeline(name: str):
+    pipeline = pipelines.get(name)
+    if pipeline is None:
+        raise HTTPException(status_code=404, detail=f"Pipeline '{name}' not found.")
+    return pipeline
+
+# Once a build completes its image is pulled onto every node executions can
+# land on by the image-prepuller DaemonSet: one container per image of a
+# queued or running execution (newest PREPULL_MAX_IMAGES), next to a pause
+# container. The images need not have a shell: each container sleeps with a
+# static busybox that an init container copies from PREPULL_HELPER_IMAGE
+# into a shared emptyDir, and one image failing to start does not hold up
+# the others. PREPULL_NODE_SELECTOR (JSON) narrows the candidate nodes.
+EXECUTION_PULL_POLICY = os.getenv("EXECUTION_PULL_POLICY", "IfNotPresent")
+PREPULL_ENABLED = os.getenv("PREPULL_ENABLED", "true").lower() == "true"
+PREPULL_DAEMONSET = "image-prepuller"
+PREPULL_MAX_IMAGES = int(os.getenv("PREPULL_MAX_IMAGES", "5"))
+PREPULL_NODE_SELECTOR = json.loads(os.getenv("PREPULL_NODE_SELECTOR", "{}"))
+PREPULL_PAUSE_IMAGE = os.getenv("PREPULL_PAUSE_IMAGE", "registry.k8s.io/pause:3.9")
+PREPULL_HELPER_IMAGE = os.getenv("PREPULL_HELPER_IMAGE", "busybox:1.36-musl")
+
+def image_reference(image_name: str, image_digest: Optional[str] = None) -> str:
+    if image_digest:
+        return f"{REGISTRY}/{image_name}@{image_digest}"
+    return f"{REGISTRY}/{image_name}:latest"
+
+class ImagePrepuller:
+    """
+    Keeps the image-prepuller DaemonSet's containers in line with the
+    images of queued and running executions. The DaemonSet is only
+    replaced when that list changes.
+    """
+
+    def __init__(self):
+        self.images = None
+        self.updating = None
+
+    def wanted_images(self) -> list:
+        active = sorted(
+            (p for p in pipelines.list() if p["state"] in ("queued", "running") and p.get("image_digest")),
+            key=lambda p: p["updated_at"], reverse=True
+        )
+        images = [image_reference(p["image_name"], p["image_digest"]) for p in active]
+        return list(dict.fromkeys(images))[:PREPULL_MAX_IMAGES]
+
+    def manifest(self, images: list) -> dict:
+        labels = {"app": PREPULL_DAEMONSET}
+        return {
+            "apiVersion": "apps/v1",
+            "kind": "DaemonSet",
+            "metadata": {"name": PREPULL_DAEMONSET, "labels": labels},
+            "spec": {
+                "selector": {"matchLabels": labels},
+                # Every node pulls at once rather than one node at a time
+                "updateStrategy": {"type": "RollingUpdate", "rollingUpdate": {"maxUnavailable": "100%"}},
+                "template": {
+                    "metadata": {"labels": labels},
+                    "spec": {
+                        "nodeSelector": PREPULL_NODE_SELECTOR,
+                        "initContainers": [{
+                            "name": "helper",
+                            "image": PREPULL_HELPER_IMAGE,
+                            "command": ["cp", "/bin/busybox", "/prepull/busybox"],
+                            "volumeMounts": [{"name": "prepull", "mountPath": "/prepull"}],
+                            "resources": {"requests": {"cpu": "1m", "memory": "8Mi"}}
+                        }],
+                        "containers": [{
+                            "name": "pause",
+                            "image": PREPULL_PAUSE_IMAGE,
+                            "resources": {"requests": {"cpu": "1m", "memory": "8Mi"}}
+                        }] + [
+                            {
+                                "name": f"prepull-{i}",
+                                "image": image,
+                                "imagePullPolicy": "IfNotPresent",
+                                "command": ["/prepull/busybox", "sleep", "2147483647"],
+                                "volumeMounts": [{"name": "prepull", "mountPath": "/prepull", "readOnly": True}],
+                                "resources": {"requests": {"cpu": "1m", "memory": "8Mi"}}
+                            }
+                            for i, image in enumerate(images)
+                        ],
+                        "volumes": [{"name": "prepull", "emptyDir": {}}]
+                    }
+                }
+            }
+        }
+
+    async def refresh(self):
+        if not PREPULL_ENABLED:
+            return
+        if self.updating is None:
+            self.updating = asyncio.Lock()
+        async with self.updating:
+            images = self.wanted_images()
+            if images == self.images:
+                return
+            body = self.manifest(images)
+            try:
+                # Replaced rather than patched: a merge patch would keep the
+                # containers of images that were dropped
+                try:
+                    await k8s_call(apps_v1.replace_namespaced_daemon_set, name=PREPULL_DAEMONSET,
+                                   namespace="default", body=body)
+                except client.exceptions.ApiException as e:
+                    if e.status != 404:
+                        raise
+                    await k8s_call(apps_v1.create_namespaced_daemon_set, namespace="default", body=body)
+            except client.exceptions.ApiException as e:
+                logging.error(f"Exception when updating the image pre-puller: {e}")
+                return
+            self.images = images
+            logging.info(f"Image pre-puller now pulls {len(images)} image(s)")
+
+prepuller = ImagePrepuller()
+
+@router.get("/images/prepull")
+async def prepull_status():
+    return {"enabled": PREPULL_ENABLED, "images": prepuller.wanted_images()}
+
+# The image exists by the time the execution job is created, so only real
+# failures of the run are retried
+EXECUTION_BACKOFF_LIMIT = int(os.getenv("EXECUTION_BACKOFF_LIMIT", "3"))
+
+async def create_execution_job(job_name, image_name, image_digest: Optional[str] = None,
+                               suspend: bool = False) -> bool:
+    result_path = "/results"
+    image_with_registry = image_reference(image_name, image_digest)
+
+    job_manifest = {
+        "apiVersion": "batch/v1",
+        "kind": "Job",
+        "metadata": {"name": job_name},
+        "spec": {
+            "backoffLimit": EXECUTION_BACKOFF_LIMIT,
+            "suspend": suspend,
+            "template": {
+                "metadata": {"name": job_name},
+                "spec": {
+                    # SIGTERM on suspend is the signal to save state to
+                    # $CHECKPOINT_DIR, which is there again on resume
+                    "terminationGracePeriodSeconds": CHECKPOINT_GRACE_SECONDS,
+                    "containers": [{
+                        "name": "executor",
+                        "image": image_with_registry,
+                        # A digest always names the same image, so a node
+                        # that has it (pre-pulled or from an earlier run or
+                        # retry) does not pull again. Tags can move.
+                        "imagePullPolicy": EXECUTION_PULL_POLICY if image_digest else "Always",
+                        "env": [{"name": "CHECKPOINT_DIR", "value": "/checkpoint"}],
+                        "volumeMounts": [{
+                            "name": "results-storage",
+                            "mountPath": result_path  # Directory in container where results are saved
+                        }, {
+                            "name": "checkpoint",
+                            "mountPath": "/checkpoint",
+                            "subPath": checkpoint_subpath("executions", job_name)
+                        }]
+                    }],
+                    "restartPolicy": "Never",
+                    "volumes": [{
+                        "name": "results-storage",
+                        "persistentVolumeClaim": {
+                            "claimName": "results-pvc"
+                        }
+                    }, {
+                        "name": "checkpoint",
+                        "persistentVolumeClaim": {
+                            "claimName": "shared-pvc"
+                        }
+                    }]
+                }
+            }
+        }
+    }
+
+    try:
+        await k8s_call(batch_v1.create_namespaced_job, namespace="default", body=job_manifest)
+        logging.info(f"Execution job '{job_name}' created successfully.")
+        return True
+    except client.exceptions.ApiException as e:
+        if e.status == 409:
+            # Already created before a restart
+            return True
+        logging.error(f"Exception when creating execution job: {e}")
+        return False
+
+def setup():
+    os.makedirs(PIPELINE_DIRECTORY, exist_ok=True)
+    pipelines.load()
+    job_informer.listeners.append(pipelines.on_job_event)
@@ -13,6 +13,8 @@ import { useParams } from "next/navigation";
 import { cn } from "@/lib/utils";
 import { toast } from "sonner";
 import { Button } from "@/components/ui/button";
+import { subscribeToJobs } from "@/lib/jobEvents";
+import { followJobLogs } from "@/lib/logs";
 
 const statuses = {
   pending: {
@@ -42,6 +44,9 @@ const statuses = {
   },
 };
 
+// Characters of log output kept in the page
+const MAX_LOG_CHARS = 1_000_000;
+
 export default function JobDetailPage() {
   const { jobName } = useParams();
 
@@ -91,26 +96,32 @@ export default function JobDetailPage() {
       }
     }
 
-    async function fetchPodLogs() {
-      try {
-        const response = await fetch(
-          `${process.env.NEXT_PUBLIC_SERVER_URL}/jobs/${jobName}/logs`,
-        );
-        if (!response.ok) {
-          throw new Error(`Failed to fetch pod logs: ${response.statusText}`);
-        }
-        const data = await response.json();
-        setLogs(data.logs);
-      } catch (error) {
-        console.error("Error fetching pod logs:", error);
-        setLogs("Failed to fetch logs.");
-      } finally {
+    fetchJobHistory();
+
+    // Logs are streamed as they are written; only the end is kept on screen
+    const controller = new AbortController();
+    followJobLogs(
+      String(jobName),
+      (text) => {
+        setLogs((previous) => (previous + text).slice(-MAX_LOG_CHARS));
         setIsLogsLoading(false);
-      }
-    }
+      },
+      controller.signal,
+    ).finally(() => setIsLogsLoading(false));
 
-    fetchJobHistory();
-    fetchPodLogs();
+    // Refresh the history whenever the server reports a status change for
+    // this job, rather than on a timer
+    let lastStatus: string | undefined;
+    const unsubscribe = subscribeToJobs((jobs) => {
+      const status = JSON.stringify(jobs[0] ?? null);
+      if (lastStatus !== undefined && status !== lastStatus) fetchJobHistory();
+      lastStatus = status;
+    }, String(jobName));
+
+    return () => {
+      controller.abort();
+      unsubscribe();
+    };
   }, [jobName]);
 
   const handleSshConnect = async () => {
@@ -4,6 +4,7 @@ import Head from "next/head";
 import { useState, useEffect } from "react";
 import { columns } from "@/components/ui/connector-table/columns";
 import { DataTable } from "@/components/ui/connector-table/data-table";
+import { subscribeToJobs } from "@/lib/jobEvents";
 
 export default function Home() {
   const [jobsData, setJobsData] = useState(null);
@@ -24,52 +25,35 @@ export default function Home() {
   }
 
   useEffect(() => {
-    async function fetchJobs() {
-      try {
-        const response = await fetch(
-          process.env.NEXT_PUBLIC_SERVER_URL + "/jobs",
-        );
-        if (!response.ok) {
-          throw new Error(`Error fetching jobs: ${response.statusText}`);
-        }
-        const data = await response.json();
+    // Jobs are pushed by the server as they change instead of being polled
+    return subscribeToJobs((jobs) => {
+      // Map the data to the format expected by DataTable
+      const mappedData = jobs.map((job) => {
+        // Extract title, label, and id from job name
+        const jobNameParts = job.name.split("-");
+        // Assuming the job name format is <title>-<label>-<id>
 
-        // Map the data to the format expected by DataTable
-        const mappedData = data.jobs.map((job) => {
-          // Extract title, label, and id from job name
-          const jobNameParts = job.name.split("-");
-          // Assuming the job name format is <title>-<label>-<id>
+        const title = jobNameParts[0]; // First part is the title
+        const label = jobNameParts.slice(1, -5).join("-"); // Middle parts are the label
+        const id = jobNameParts.slice(-5).join("-"); // Last 5 parts form the UUID
 
-          const title = jobNameParts[0]; // First part is the title
-          const label = jobNameParts.slice(1, -5).join("-"); // Middle parts are the label
-          const id = jobNameParts.slice(-5).join("-"); // Last 5 parts form the UUID
+        // Get the status
+        const status = mapJobStatus(job.status); // e.g., "Unknown", "Completed", etc.
 
-          console.log(job.status);
+        // TTL
+        const ttl = job.ttl;
 
-          // Get the status
-          const status = mapJobStatus(job.status); // e.g., "Unknown", "Completed", etc.
+        return {
+          label,
+          title,
+          id,
+          status,
+          ttl,
+        };
+      });
 
-          // TTL
-          const ttl = job.ttl;
-
-          return {
-            label,
-            title,
-            id,
-            status,
-            ttl,
-          };
-        });
-
-        console.log(mappedData);
-        setJobsData(mappedData);
-      } catch (error) {
-        console.error("Error fetching jobs:", error);
-        setJobsData([]); // Handle the error appropriately
-      }
-    }
-
-    fetchJobs();
+      setJobsData(mappedData);
+    });
   }, []);
 
   return (
@@ -9,6 +9,8 @@ import {
 } from "@/components/ui/form";
 import { Input } from "@/components/ui/input";
 import { Button } from "@/components/ui/button";
+import { Checkbox } from "@/components/ui/checkbox";
+import { detectLibraries } from "@/lib/upload";
 
 import { MinusCircle, PlusCircle, Trash2 } from "lucide-react";
 import { SiPytorch, SiNumpy, SiTensorflow, SiPandas } from "react-icons/si";
@@ -36,30 +38,22 @@ export default function AdvancedForm({ form, codeFile, setCodeFile }) {
   const [detectedLibraries, setDetectedLibraries] = useState<
     Record<string, boolean>
   >({});
+  // Prebuilt image with the detected frameworks already installed
+  const [baseImage, setBaseImage] = useState<{
+    name: string;
+    image: string;
+  } | null>(null);
 
   const handleFileUpload = async (file: File) => {
     try {
-      const formData = new FormData();
-      formData.append("file", file);
-
-      const response = await fetch(
-        `${process.env.NEXT_PUBLIC_SERVER_URL}/detect_libs`,
-        {
-          method: "POST",
-          body: formData,
-        },
-      );
-
-      if (!response.ok) {
-        throw new Error(`Error: ${response.statusText}`);
-      }
-
-      const data = await response.json();
+      const data = await detectLibraries(file);
       console.log("Server response:", data);
 
       // Parse the response and update detected libraries
       const dockerfileResults = data.results?.Dockerfile || {};
       setDetectedLibraries(dockerfileResults);
+      setBaseImage(data.base_image ?? null);
+      form.setValue("baseImage", data.base_image ? "auto" : undefined);
     } catch (error) {
       console.error("File upload failed:", error);
     }
@@ -78,6 +72,8 @@ export default function AdvancedForm({ form, codeFile, setCodeFile }) {
     setCodeFile(null);
     form.setValue("codeFile", undefined);
     setDetectedLibraries({});
+    setBaseImage(null);
+    form.setValue("baseImage", undefined);
   };
 
   return (
@@ -146,6 +142,33 @@ export default function AdvancedForm({ form, codeFile, setCodeFile }) {
         </ul>
       </div>
 
+      {/* Prebuilt Base Image */}
+      {baseImage && (
+        <FormField
+          control={form.control}
+          name="baseImage"
+          render={({ field }) => (
+            <FormItem className="flex items-start space-x-2 space-y-0">
+              <FormControl>
+                <Checkbox
+                  checked={field.value === "auto"}
+                  onCheckedChange={(checked) =>
+                    field.onChange(checked ? "auto" : "none")
+                  }
+                />
+              </FormControl>
+              <div className="space-y-1">
+                <FormLabel>Use prebuilt {baseImage.name} image</FormLabel>
+                <FormDescription>
+                  Builds on an image with these frameworks already installed,
+                  which skips downloading them.
+                </FormDescription>
+              </div>
+            </FormItem>
+          )}
+        />
+      )}
+
       {/* Environment Variables */}
       <FormField
         control={form.control}
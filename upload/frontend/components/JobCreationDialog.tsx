@@ -9,6 +9,7 @@ import { z } from "zod";
 
 import { steps } from "@/constants/steps";
 import { formSchema } from "@/schemas/formSchema";
+import { uploadInParts } from "@/lib/upload";
 import { Form } from "@/components/ui/form";
 import { Button } from "@/components/ui/button";
 
@@ -37,6 +38,7 @@ export default function JobCreationDialog() {
 
   // State for file upload
   const [codeFile, setCodeFile] = useState<File | null>(null);
+  const [uploadProgress, setUploadProgress] = useState<number | null>(null);
 
   const form = useForm<z.infer<typeof formSchema>>({
     resolver: zodResolver(formSchema),
@@ -91,28 +93,19 @@ export default function JobCreationDialog() {
     }
 
     try {
-      // Create FormData
-      const formData = new FormData();
-      formData.append("file", codeFile); // Add the file
-      formData.append("job_name", values.jobShortName); // Add the job name
-
-      // Send the FormData to the backend
-      const response = await fetch(
-        `${process.env.NEXT_PUBLIC_SERVER_URL}/upload/`,
-        {
-          method: "POST",
-          body: formData,
-        },
+      setUploadProgress(0);
+
+      // Send the file in resumable parts; the commit triggers the build
+      const jobSubmissionData = await uploadInParts(
+        codeFile,
+        values.jobShortName,
+        (fraction) => setUploadProgress(Math.round(fraction * 100)),
+        undefined,
+        values.baseImage,
       );
 
-      const jobSubmissionData = await response.json();
-
       console.log(jobSubmissionData);
 
-      if (!response.ok) {
-        throw new Error(`Failed to submit job: ${response.statusText}`);
-      }
-
       // Success notification
       toast("Job Created", {
         description: `Job "${jobSubmissionData.job_name}" has been submitted successfully.`,
@@ -134,6 +127,8 @@ export default function JobCreationDialog() {
     } catch (error) {
       console.error("Error submitting job:", error);
       toast.error("Failed to submit job. Please try again.");
+    } finally {
+      setUploadProgress(null);
     }
   }
 
@@ -205,8 +200,11 @@ export default function JobCreationDialog() {
                         <Button
                           className="bg-blue-500 font-bold hover:bg-blue-600"
                           type="submit"
+                          disabled={uploadProgress !== null}
                         >
-                          Create Job
+                          {uploadProgress !== null
+                            ? `Uploading ${uploadProgress}%`
+                            : "Create Job"}
                         </Button>
                       </DialogFooter>
                     )}
@@ -0,0 +1,44 @@
+const SERVER_URL = process.env.NEXT_PUBLIC_SERVER_URL;
+
+export type JobSummary = {
+  name: string;
+  status: string;
+  pod_statuses: { name: string; status: string }[];
+  ttl: number;
+};
+
+/**
+ * Follows /jobs/events and calls onChange with the full, current list of
+ * jobs whenever it changes. The server sends one snapshot followed by
+ * per-job deltas; EventSource reconnects on its own and sends the last event
+ * id, so only missed deltas are replayed. Returns a function that closes the
+ * stream.
+ */
+export function subscribeToJobs(
+  onChange: (jobs: JobSummary[]) => void,
+  jobName?: string,
+): () => void {
+  const url = new URL(`${SERVER_URL}/jobs/events`);
+  if (jobName) url.searchParams.set("job_name", jobName);
+
+  const jobs = new Map<string, JobSummary>();
+  const source = new EventSource(url.toString());
+  const emit = () => onChange(Array.from(jobs.values()));
+
+  source.addEventListener("snapshot", (event) => {
+    jobs.clear();
+    for (const job of JSON.parse(event.data).jobs) jobs.set(job.name, job);
+    emit();
+  });
+  source.addEventListener("job", (event) => {
+    const job = JSON.parse(event.data);
+    jobs.set(job.name, job);
+    emit();
+  });
+  source.addEventListener("deleted", (event) => {
+    jobs.delete(JSON.parse(event.data).name);
+    emit();
+  });
+
+  return () => source.close();
+}
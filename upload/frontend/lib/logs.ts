@@ -0,0 +1,55 @@
+const SERVER_URL = process.env.NEXT_PUBLIC_SERVER_URL;
+
+// Lines of history fetched when a log view opens, and how long to wait
+// before resuming a dropped stream
+const INITIAL_TAIL_LINES = 1000;
+const RECONNECT_DELAY_MS = 2000;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+/**
+ * Follows a job's logs, calling onText with each piece as it arrives. Only
+ * the last INITIAL_TAIL_LINES lines are fetched at first; when the
+ * connection drops, the stream is resumed from the time the last piece was
+ * received. Runs until signal is aborted or the log ends.
+ */
+export async function followJobLogs(
+  jobName: string,
+  onText: (text: string) => void,
+  signal: AbortSignal,
+  container?: string,
+) {
+  let lastReceived: number | undefined;
+
+  while (!signal.aborted) {
+    const url = new URL(`${SERVER_URL}/jobs/${jobName}/logs/stream`);
+    url.searchParams.set("follow", "true");
+    if (container) url.searchParams.set("container", container);
+    if (lastReceived === undefined) {
+      url.searchParams.set("tail_lines", String(INITIAL_TAIL_LINES));
+    } else {
+      const seconds = Math.ceil((Date.now() - lastReceived) / 1000);
+      url.searchParams.set("since_seconds", String(Math.max(seconds, 1)));
+    }
+
+    try {
+      const response = await fetch(url, { signal });
+      if (!response.ok) {
+        throw new Error(`Failed to fetch pod logs: ${response.statusText}`);
+      }
+      const reader = response.body!.getReader();
+      const decoder = new TextDecoder();
+      lastReceived = Date.now();
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) return;
+        lastReceived = Date.now();
+        onText(decoder.decode(value, { stream: true }));
+      }
+    } catch (error) {
+      if (signal.aborted) return;
+      console.error("Log stream interrupted:", error);
+      await sleep(RECONNECT_DELAY_MS);
+    }
+  }
+}
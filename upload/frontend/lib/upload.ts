@@ -0,0 +1,172 @@
+const SERVER_URL = process.env.NEXT_PUBLIC_SERVER_URL;
+
+// Number of parts sent at the same time, and how often a failed part is retried
+const PARALLEL_PARTS = 4;
+const MAX_PART_RETRIES = 5;
+
+type UploadSession = {
+  upload_id: string;
+  part_size: number;
+  part_count: number;
+  missing_parts?: number[];
+};
+
+export type UploadResult = {
+  message: string;
+  upload_id: string;
+  job_name: string;
+};
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// crypto.subtle only exists in secure contexts (https or localhost); without
+// it parts are sent unchecked and the server skips verification
+async function sha256Hex(data: ArrayBuffer): Promise<string | undefined> {
+  if (!globalThis.crypto?.subtle) return undefined;
+  const digest = await crypto.subtle.digest("SHA-256", data);
+  return Array.from(new Uint8Array(digest))
+    .map((b) => b.toString(16).padStart(2, "0"))
+    .join("");
+}
+
+async function putPart(session: UploadSession, file: File, index: number) {
+  const start = index * session.part_size;
+  const data = await file
+    .slice(start, Math.min(start + session.part_size, file.size))
+    .arrayBuffer();
+  const checksum = await sha256Hex(data);
+
+  for (let attempt = 0; ; attempt++) {
+    let response: Response | undefined;
+    try {
+      response = await fetch(
+        `${SERVER_URL}/uploads/${session.upload_id}/parts/${index}`,
+        {
+          method: "PUT",
+          headers: {
+            "Content-Type": "application/octet-stream",
+            ...(checksum && { "X-Content-SHA256": checksum }),
+          },
+          body: data,
+        },
+      );
+    } catch (error) {
+      // Network errors are retried below
+      if (attempt >= MAX_PART_RETRIES) throw error;
+    }
+    if (response?.ok) return;
+    // Client errors will not go away by retrying
+    if (response && response.status < 500) {
+      throw new Error(`Part ${index} rejected: ${response.statusText}`);
+    }
+    if (attempt >= MAX_PART_RETRIES) {
+      throw new Error(`Part ${index} failed after ${attempt + 1} attempts`);
+    }
+    // Exponential backoff: 0.5s, 1s, 2s, ...
+    await sleep(500 * 2 ** attempt);
+  }
+}
+
+/**
+ * Uploads a zip archive through the resumable upload API: parts are sent in
+ * parallel and retried individually, then the upload is committed, which
+ * triggers the build and execution jobs. baseImage "auto" builds on the
+ * prebuilt framework image /detect_libs/ suggested, "none" never does.
+ *
+ * Passing the upload_id of an interrupted upload resumes it, sending only
+ * the parts the server does not have yet.
+ */
+export async function uploadInParts(
+  file: File,
+  jobName: string,
+  onProgress?: (fraction: number) => void,
+  resumeUploadId?: string,
+  baseImage?: "auto" | "none",
+): Promise<UploadResult> {
+  let session: UploadSession;
+
+  if (resumeUploadId) {
+    const response = await fetch(`${SERVER_URL}/uploads/${resumeUploadId}`);
+    if (!response.ok) {
+      throw new Error(`Failed to resume upload: ${response.statusText}`);
+    }
+    session = await response.json();
+  } else {
+    const formData = new FormData();
+    formData.append("job_name", jobName);
+    formData.append("filename", file.name);
+    formData.append("total_size", String(file.size));
+    if (baseImage) formData.append("base_image", baseImage);
+
+    const response = await fetch(`${SERVER_URL}/uploads/`, {
+      method: "POST",
+      body: formData,
+    });
+    if (!response.ok) {
+      throw new Error(`Failed to start upload: ${response.statusText}`);
+    }
+    session = await response.json();
+  }
+
+  const pending =
+    session.missing_parts ??
+    Array.from({ length: session.part_count }, (_, i) => i);
+  let done = session.part_count - pending.length;
+  onProgress?.(done / session.part_count);
+
+  const worker = async () => {
+    let index: number | undefined;
+    while ((index = pending.shift()) !== undefined) {
+      await putPart(session, file, index);
+      done++;
+      onProgress?.(done / session.part_count);
+    }
+  };
+  await Promise.all(Array.from({ length: PARALLEL_PARTS }, worker));
+
+  const response = await fetch(
+    `${SERVER_URL}/uploads/${session.upload_id}/commit`,
+    { method: "POST" },
+  );
+  if (!response.ok) {
+    throw new Error(`Failed to submit job: ${response.statusText}`);
+  }
+  return response.json();
+}
+
+// The zip central directory lives at the end of the archive; 64 KiB plus the
+// end-of-central-directory record covers it for typical projects
+const DETECT_TAIL_BYTES = 65536 + 22;
+const MAX_DETECT_ROUNDS = 4;
+
+/**
+ * Runs /detect_libs/ on an archive without uploading it: only the archive's
+ * tail and the few members the server asks for (Dockerfile, dependency
+ * manifests, Python sources) are sent as slices.
+ */
+export async function detectLibraries(file: File) {
+  const tailStart = Math.max(0, file.size - DETECT_TAIL_BYTES);
+  const ranges: [number, number][] = [[tailStart, file.size - tailStart]];
+
+  for (let round = 0; round < MAX_DETECT_ROUNDS; round++) {
+    const formData = new FormData();
+    formData.append("total_size", String(file.size));
+    for (const [offset, length] of ranges) {
+      // The slice's filename tells the server where it belongs
+      formData.append("chunks", file.slice(offset, offset + length), String(offset));
+    }
+
+    const response = await fetch(`${SERVER_URL}/detect_libs/`, {
+      method: "POST",
+      body: formData,
+    });
+    if (!response.ok) {
+      throw new Error(`Error: ${response.statusText}`);
+    }
+
+    const data = await response.json();
+    if (!data.need_ranges) return data;
+    ranges.push(...data.need_ranges);
+  }
+  throw new Error("Library detection did not converge");
+}
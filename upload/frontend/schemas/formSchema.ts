@@ -12,6 +12,7 @@ export const formSchema = z
     gpu: z.number().min(0).max(8),
     notificationEmail: z.string().email().optional(),
     codeFile: z.instanceof(File).nullable().optional(),
+    baseImage: z.enum(["auto", "none"]).optional(),
     envVars: z
       .array(
         z.object({
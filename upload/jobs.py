@@ -0,0 +1,289 @@
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from kubernetes import client
+
+from kube import cached_job, cached_job_pods, cached_jobs, core_v1, job_informer, k8s_call, pod_informer
+from scheduling import admission_queue
+
+router = APIRouter()
+
+# Recent job status changes kept for clients resuming a /jobs/events stream,
+# and how many undelivered changes a slow client may have queued before it is
+# disconnected (it then resumes from its last event id)
+JOB_EVENT_BACKLOG = int(os.getenv("JOB_EVENT_BACKLOG", "1000"))
+JOB_EVENT_QUEUE = 256
+JOB_EVENT_HEARTBEAT = 15
+
+class JobEventStream:
+    """
+    Turns informer events into job status deltas for /jobs/events. A delta is
+    published only when a job's summary actually changes, and carries the
+    resourceVersion of the object that changed it as its event id, so a
+    client reconnecting with that id is sent only what it missed.
+    """
+
+    def __init__(self, backlog: int):
+        self.loop = None
+        self.backlog = deque(maxlen=backlog)
+        self.summaries = {}
+        self.subscribers = set()
+        self.last_id = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+
+    def on_job_event(self, event_type: str, job):
+        self.on_event(event_type, job.metadata.name if job is not None else None, job)
+
+    def on_pod_event(self, event_type: str, pod):
+        job_name = (pod.metadata.labels or {}).get("job-name") if pod is not None else None
+        self.on_event("MODIFIED" if pod is not None else event_type, job_name, pod)
+
+    def on_event(self, event_type: str, job_name: Optional[str], obj):
+        # Called on informer threads; all state is touched on the event loop
+        if self.loop is None:
+            return
+        version = obj.metadata.resource_version if obj is not None else None
+        self.loop.call_soon_threadsafe(self.update, event_type, job_name, version)
+
+    def update(self, event_type: str, job_name: Optional[str], version: Optional[str]):
+        if event_type == "SYNC":
+            # A relist may have skipped deltas, so resuming across it is not
+            # possible: start over and send everyone a snapshot
+            self.backlog.clear()
+            self.summaries = {}
+            self.last_id = job_informer.resource_version
+            for queue in list(self.subscribers):
+                self.deliver(queue, {"id": self.last_id, "event": "snapshot"})
+            return
+        if job_name is None:
+            return
+
+        job = job_informer.get(job_name)
+        summary = job_summary(job, pod_informer.by_index(job_name)) if job is not None else None
+        if summary == self.summaries.get(job_name):
+            return
+        if summary is None:
+            self.summaries.pop(job_name, None)
+            event = {"id": version, "event": "deleted", "job_name": job_name, "data": {"name": job_name}}
+        else:
+            self.summaries[job_name] = summary
+            event = {"id": version, "event": "job", "job_name": job_name, "data": summary}
+        self.backlog.append(event)
+        self.last_id = version
+        for queue in list(self.subscribers):
+            self.deliver(queue, event)
+
+    def deliver(self, queue: asyncio.Queue, event: dict):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # End the stream; the client reconnects with its last event id
+            self.subscribers.discard(queue)
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    def events_since(self, last_id: Optional[str]) -> Optional[list]:
+        """
+        Returns the events after last_id, or None if they are no longer
+        known and the client needs a snapshot.
+        """
+        if last_id is None:
+            return None
+        if last_id == self.last_id:
+            return []
+        for i, event in enumerate(self.backlog):
+            if event["id"] == last_id:
+                return list(self.backlog)[i + 1:]
+        return None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=JOB_EVENT_QUEUE)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+job_events = JobEventStream(JOB_EVENT_BACKLOG)
+
+def format_sse(event: str, data, event_id: Optional[str] = None) -> str:
+    message = f"event: {event}\ndata: {json.dumps(data)}\n"
+    if event_id is not None:
+        message = f"id: {event_id}\n" + message
+    return message + "\n"
+
+@router.get("/jobs/")
+async def list_jobs():
+    try:
+        jobs = await cached_jobs()
+        pods_by_job = await cached_job_pods()
+        job_list = [job_summary(job, pods_by_job.get(job.metadata.name, [])) for job in jobs]
+        return {"jobs": job_list}
+    except client.exceptions.ApiException as e:
+        logging.error(f"Exception when listing jobs: {e}")
+        raise HTTPException(status_code=500, detail="Error listing jobs.")
+
+@router.get("/jobs/events")
+async def stream_job_events(
+    job_name: Optional[str] = None,
+    resource_version: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    Server-sent events with job status changes, as sent by /jobs/. The stream
+    starts with a "snapshot" of all jobs (or only job_name) and continues
+    with "job" and "deleted" deltas. Reconnecting with the last event id, as
+    Last-Event-ID or resource_version, replays only the missed deltas when
+    they are still in the backlog, and sends a new snapshot otherwise.
+    """
+    queue = job_events.subscribe()
+    missed = job_events.events_since(last_event_id or resource_version)
+    snapshot_id = job_events.last_id
+
+    async def snapshot(event_id: Optional[str]) -> str:
+        jobs = await cached_jobs()
+        if job_name is not None:
+            jobs = [job for job in jobs if job.metadata.name == job_name]
+        pods_by_job = await cached_job_pods(job_name)
+        summaries = [job_summary(job, pods_by_job.get(job.metadata.name, [])) for job in jobs]
+        return format_sse("snapshot", {"jobs": summaries}, event_id)
+
+    async def stream():
+        try:
+            if missed is None:
+                yield await snapshot(snapshot_id)
+            else:
+                for event in missed:
+                    if job_name is None or event["job_name"] == job_name:
+                        yield format_sse(event["event"], event["data"], event["id"])
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), JOB_EVENT_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    break
+                if event["event"] == "snapshot":
+                    yield await snapshot(event["id"])
+                elif job_name is None or event["job_name"] == job_name:
+                    yield format_sse(event["event"], event["data"], event["id"])
+        finally:
+            job_events.unsubscribe(queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def job_summary(job, pods: list) -> dict:
+    job_status = get_job_status(job, pods)
+    return {
+        "name": job.metadata.name,
+        "status": job_status["job_status"],
+        "pod_statuses": job_status["pod_statuses"],
+        "ttl": job.spec.ttl_seconds_after_finished if job.spec.ttl_seconds_after_finished is not None else -1
+    }
+
+def get_job_status(job, pods: list):
+    """
+    Get the status of a job and its associated pods.
+    """
+    job_status = "Unknown"
+    pod_statuses = []
+
+    # Determine job status from its conditions
+    if job.status.conditions:
+        for condition in job.status.conditions:
+            if condition.type == "Complete" and condition.status == "True":
+                job_status = "Completed"
+            elif condition.type == "Failed" and condition.status == "True":
+                job_status = "Failed"
+    if job.spec.suspend and job_status == "Unknown":
+        job_status = "Queued" if admission_queue.is_queued(job.metadata.name) else "Suspended"
+
+    for pod in pods:
+        pod_status = pod.status.phase
+        if pod.status.container_statuses:
+            for container_status in pod.status.container_statuses:
+                if container_status.state.waiting:
+                    pod_status = container_status.state.waiting.reason
+                elif container_status.state.terminated:
+                    pod_status = container_status.state.terminated.reason
+                elif container_status.state.running:
+                    pod_status = "Running"
+        pod_statuses.append({"name": pod.metadata.name, "status": pod_status})
+
+    # Update job status based on pod statuses
+    if any(pod["status"] == "Running" for pod in pod_statuses):
+        job_status = "Running"
+
+    return {"job_status": job_status, "pod_statuses": pod_statuses}
+
+@router.get("/jobs/{job_name}/history")
+async def get_job_history(job_name: str):
+    namespace = "default"  # Change if your jobs are in a different namespace
+
+    try:
+        # Check if the job exists
+        if await cached_job(job_name) is None:
+            logging.error(f"Job '{job_name}' not found in namespace '{namespace}'.")
+            raise HTTPException(status_code=404, detail=f"Job '{job_name}' not found.")
+
+        # Retrieve events associated with the job
+        field_selector = (
+            f"involvedObject.kind=Job,"
+            f"involvedObject.name={job_name},"
+            f"involvedObject.namespace={namespace}"
+        )
+        events = await k8s_call(core_v1.list_namespaced_event, namespace=namespace, field_selector=field_selector)
+
+        # Process events to extract status transitions
+        status_history = []
+        for event in sorted(events.items, key=lambda e: e.last_timestamp):
+            status = parse_event_message(event.message)
+            if status:
+                status_history.append({
+                    "timestamp": event.last_timestamp.isoformat(),
+                    "status": status,
+                    "message": event.message
+                })
+
+        return {"job_name": job_name, "history": status_history}
+
+    except client.exceptions.ApiException as e:
+        if e.status == 404:
+            logging.error(f"Job '{job_name}' not found in namespace '{namespace}'.")
+            raise HTTPException(status_code=404, detail=f"Job '{job_name}' not found.")
+        else:
+            logging.error(f"Exception when retrieving job history: {e}")
+            raise HTTPException(status_code=500, detail="Error retrieving job history.")
+
+def parse_event_message(message: str) -> str:
+    if "Created pod" in message:
+        return "Created"
+    elif "Started container" in message:
+        return "Running"
+    elif "Successfully pulled image" in message:
+        return "Image Pulled"
+    elif "Pulling image" in message:
+        return "Pulling Image"
+    elif "Job completed" in message or "Completed" in message:
+        return "Complete"
+    elif "Failed" in message or "Error" in message:
+        return "Error"
+    elif "Back-off" in message:
+        return "Back-off"
+    else:
+        return None
+
+def setup():
+    job_informer.listeners.append(job_events.on_job_event)
+    pod_informer.listeners.append(job_events.on_pod_event)
@@ -0,0 +1,283 @@
+import asyncio
+import functools
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import urllib3
+from fastapi import HTTPException
+from kubernetes import client, config, watch
+
+# The kubernetes client is blocking, so every API call runs on this bounded
+# pool instead of the event loop. K8S_TIMEOUT bounds each request.
+K8S_WORKERS = int(os.getenv("K8S_WORKERS", "8"))
+K8S_TIMEOUT = float(os.getenv("K8S_TIMEOUT", "10"))
+k8s_pool = ThreadPoolExecutor(max_workers=K8S_WORKERS, thread_name_prefix="k8s")
+
+# One keep-alive connection pool to the API server shared by every request,
+# with a connection per k8s_pool worker, plus one per informer watch, so
+# calls never wait on each other or re-do the TLS handshake. The API objects
+# exist from import on, so their methods can be bound anywhere; connect()
+# points them at the cluster.
+K8S_WATCHES = 2
+api_client = client.ApiClient()
+batch_v1 = client.BatchV1Api(api_client)
+core_v1 = client.CoreV1Api(api_client)
+networking_v1 = client.NetworkingV1Api(api_client)
+apps_v1 = client.AppsV1Api(api_client)
+custom_objects = client.CustomObjectsApi(api_client)
+
+# Followed log streams can stay open for hours, so they get their own client
+# rather than holding connections of the shared pool
+LOG_CONNECTIONS = int(os.getenv("LOG_CONNECTIONS", "64"))
+log_api_client = client.ApiClient()
+# Reading them blocks, so that happens on a pool of the same size rather
+# than on the threadpool that upload writes use
+log_stream_pool = ThreadPoolExecutor(max_workers=LOG_CONNECTIONS, thread_name_prefix="log-stream")
+log_core_v1 = client.CoreV1Api(log_api_client)
+# Logs are read in chunks of this size, so memory per stream stays flat
+# however much the pod writes
+LOG_CHUNK_SIZE = 64 * 1024
+
+K8S_NAME_RE = re.compile(r"^[a-z0-9]([-a-z0-9.]*[a-z0-9])?$")
+
+def connect():
+    """
+    Loads the cluster config (in-cluster, else ~/.kube/config) and points
+    the API objects at it.
+    """
+    global api_client, log_api_client
+    if os.getenv('KUBERNETES_SERVICE_HOST'):
+        config.load_incluster_config()
+    else:
+        config.load_kube_config()
+
+    k8s_configuration = client.Configuration.get_default_copy()
+    k8s_configuration.connection_pool_maxsize = K8S_WORKERS + K8S_WATCHES
+    api_client = client.ApiClient(k8s_configuration)
+    for api in (batch_v1, core_v1, networking_v1, apps_v1, custom_objects):
+        api.api_client = api_client
+
+    log_configuration = client.Configuration.get_default_copy()
+    log_configuration.connection_pool_maxsize = LOG_CONNECTIONS
+    log_api_client = client.ApiClient(log_configuration)
+    log_core_v1.api_client = log_api_client
+
+def close():
+    api_client.close()
+    log_api_client.close()
+    k8s_pool.shutdown(wait=False)
+    log_stream_pool.shutdown(wait=False)
+
+async def k8s_call(fn, *args, **kwargs):
+    """
+    Runs a blocking kubernetes client method on k8s_pool with a request
+    timeout. An unreachable or slow API server is reported as a 504 rather
+    than hanging the request.
+    """
+    kwargs.setdefault("_request_timeout", K8S_TIMEOUT)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(k8s_pool, functools.partial(fn, *args, **kwargs))
+    except urllib3.exceptions.HTTPError as e:
+        logging.error(f"Kubernetes API request failed: {e}")
+        raise HTTPException(status_code=504, detail="Kubernetes API request timed out.")
+
+# Watches are restarted every INFORMER_WATCH_TIMEOUT seconds so a silently
+# dropped connection is noticed; INFORMER_RETRY_DELAY is the wait after an error
+INFORMER_WATCH_TIMEOUT = int(os.getenv("INFORMER_WATCH_TIMEOUT", "300"))
+INFORMER_RETRY_DELAY = 5
+
+class ResourceInformer:
+    """
+    Keeps an in-memory copy of one kind of namespaced resource up to date:
+    lists it once, then follows a watch from the list's resourceVersion on a
+    background thread, relisting only when the watch has expired (410 Gone).
+    Objects are indexed by the value of index_label. Listeners are called on
+    the informer thread with each watch event type and object, and with
+    ("SYNC", None) after every relist.
+    """
+
+    def __init__(self, list_fn, namespace: str, label_selector: Optional[str] = None,
+                 index_label: Optional[str] = None):
+        self.list_fn = list_fn
+        self.namespace = namespace
+        self.label_selector = label_selector
+        self.index_label = index_label
+        self.items = {}
+        self.index = {}
+        self.resource_version = None
+        self.lock = threading.Lock()
+        self.synced = threading.Event()
+        self.stopped = threading.Event()
+        self.watch = None
+        self.listeners = []
+
+    def start(self):
+        threading.Thread(target=self.run, name=f"informer-{self.list_fn.__name__}", daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.watch:
+            self.watch.stop()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                if self.resource_version is None:
+                    self.relist()
+                self.follow()
+            except client.exceptions.ApiException as e:
+                if e.status == 410:
+                    logging.info(f"Watch on {self.list_fn.__name__} expired, relisting")
+                    self.resource_version = None
+                    continue
+                logging.error(f"Watch on {self.list_fn.__name__} failed: {e}")
+                self.stopped.wait(INFORMER_RETRY_DELAY)
+            except Exception as e:
+                logging.error(f"Watch on {self.list_fn.__name__} failed: {e}")
+                self.stopped.wait(INFORMER_RETRY_DELAY)
+
+    def selector_kwargs(self) -> dict:
+        return {"label_selector": self.label_selector} if self.label_selector else {}
+
+    def relist(self):
+        result = self.list_fn(namespace=self.namespace, _request_timeout=K8S_TIMEOUT, **self.selector_kwargs())
+        with self.lock:
+            self.items = {}
+            self.index = {}
+            for obj in result.items:
+                self.store(obj)
+            self.resource_version = result.metadata.resource_version
+        self.synced.set()
+        self.notify("SYNC", None)
+
+    def follow(self):
+        self.watch = watch.Watch()
+        stream = self.watch.stream(
+            self.list_fn,
+            namespace=self.namespace,
+            resource_version=self.resource_version,
+            allow_watch_bookmarks=True,
+            timeout_seconds=INFORMER_WATCH_TIMEOUT,
+            _request_timeout=(K8S_TIMEOUT, INFORMER_WATCH_TIMEOUT + K8S_TIMEOUT),
+            **self.selector_kwargs()
+        )
+        for event in stream:
+            if self.stopped.is_set():
+                break
+            with self.lock:
+                if event["type"] == "DELETED":
+                    self.remove(event["object"])
+                elif event["type"] != "BOOKMARK":
+                    self.store(event["object"])
+                self.resource_version = self.watch.resource_version
+            if event["type"] != "BOOKMARK":
+                self.notify(event["type"], event["object"])
+
+    def notify(self, event_type: str, obj):
+        for listener in self.listeners:
+            try:
+                listener(event_type, obj)
+            except Exception as e:
+                logging.error(f"Informer listener failed: {e}")
+
+    def index_key(self, obj) -> Optional[str]:
+        if not self.index_label:
+            return None
+        return (obj.metadata.labels or {}).get(self.index_label)
+
+    def store(self, obj):
+        self.remove(obj)
+        self.items[obj.metadata.name] = obj
+        key = self.index_key(obj)
+        if key is not None:
+            self.index.setdefault(key, {})[obj.metadata.name] = obj
+
+    def remove(self, obj):
+        old = self.items.pop(obj.metadata.name, None)
+        key = self.index_key(old) if old is not None else None
+        if key is not None:
+            self.index.get(key, {}).pop(obj.metadata.name, None)
+            if not self.index.get(key):
+                self.index.pop(key, None)
+
+    def get(self, name: str):
+        with self.lock:
+            return self.items.get(name)
+
+    def list(self) -> list:
+        with self.lock:
+            return list(self.items.values())
+
+    def by_index(self, key: str) -> list:
+        with self.lock:
+            return list(self.index.get(key, {}).values())
+
+# Jobs, and the pods they own indexed by the job-name label the Job
+# controller sets, so status endpoints are served from memory instead of
+# listing pods per job
+job_informer = ResourceInformer(batch_v1.list_namespaced_job, "default")
+pod_informer = ResourceInformer(core_v1.list_namespaced_pod, "default",
+                                label_selector="job-name", index_label="job-name")
+
+async def cached_jobs() -> list:
+    if job_informer.synced.is_set():
+        return job_informer.list()
+    jobs = await k8s_call(batch_v1.list_namespaced_job, namespace="default")
+    return jobs.items
+
+async def cached_job(job_name: str):
+    """
+    Returns the job, or None if it does not exist.
+    """
+    if job_informer.synced.is_set():
+        return job_informer.get(job_name)
+    try:
+        return await k8s_call(batch_v1.read_namespaced_job, name=job_name, namespace="default")
+    except client.exceptions.ApiException as e:
+        if e.status == 404:
+            return None
+        raise
+
+async def cached_job_pods(job_name: Optional[str] = None) -> Dict[str, list]:
+    """
+    Returns the pods of job_name, or of every job if None, grouped by job
+    name. Until the informer has synced this costs one list call.
+    """
+    if pod_informer.synced.is_set():
+        if job_name is not None:
+            return {job_name: pod_informer.by_index(job_name)}
+        with pod_informer.lock:
+            return {key: list(pods.values()) for key, pods in pod_informer.index.items()}
+    label_selector = f"job-name={job_name}" if job_name is not None else "job-name"
+    pods = await k8s_call(core_v1.list_namespaced_pod, namespace="default", label_selector=label_selector)
+    grouped = {}
+    for pod in pods.items:
+        grouped.setdefault(pod.metadata.labels["job-name"], []).append(pod)
+    return grouped
+
+def finished_condition(job) -> Optional[str]:
+    """
+    Returns "Complete" or "Failed" once the job has finished, else None.
+    """
+    conditions = job.status.conditions if job.status else None
+    for condition in conditions or []:
+        if condition.type in ("Complete", "Failed") and condition.status == "True":
+            return condition.type
+    return None
+
+def control_plane_placement() -> dict:
+    return {
+        "nodeSelector": {
+            "node-role.kubernetes.io/control-plane": ""
+        },
+        "tolerations": [{
+            "key": "node-role.kubernetes.io/control-plane",
+            "operator": "Exists",
+            "effect": "NoSchedule"
+        }]
+    }
@@ -0,0 +1,712 @@
+import asyncio
+import base64
+import calendar
+import gzip
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import urllib3
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from kubernetes import client
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+
+from executions import pipelines
+from kube import (
+    K8S_NAME_RE, K8S_TIMEOUT, LOG_CHUNK_SIZE, LOG_CONNECTIONS, cached_job, cached_job_pods,
+    core_v1, job_informer, k8s_call, log_core_v1, log_stream_pool, pod_informer
+)
+from storage import UPLOAD_CHUNK_SIZE, UPLOAD_DIRECTORY, read_json, write_json
+
+router = APIRouter()
+
+@router.get("/jobs/{job_name}/logs")
+async def get_job_logs(job_name: str):
+    namespace = "default"  # Replace with your namespace if different
+
+    try:
+        # Get the job to ensure it exists; once it or its pods are gone,
+        # answer from the log archive
+        job = await cached_job(job_name)
+        pods = (await cached_job_pods(job_name)).get(job_name, []) if job is not None else []
+        if not pods:
+            archived = await run_in_threadpool(archived_job_logs, job_name)
+            if archived is not None:
+                return archived
+
+        if job is None:
+            logging.error(f"Job '{job_name}' not found in namespace '{namespace}'.")
+            raise HTTPException(status_code=404, detail=f"Job '{job_name}' not found.")
+
+        if not pods:
+            raise HTTPException(status_code=404, detail=f"No pods found for job '{job_name}'")
+
+        # Sort pods by creation timestamp to get the last created pod
+        last_pod = max(pods, key=lambda pod: pod.metadata.creation_timestamp)
+
+        # Get the logs of the last pod
+        pod_name = last_pod.metadata.name
+        logs = await k8s_call(core_v1.read_namespaced_pod_log, name=pod_name, namespace=namespace)
+
+        return {"job_name": job_name, "pod_name": pod_name, "logs": logs}
+
+    except client.exceptions.ApiException as e:
+        if e.status == 404:
+            logging.error(f"Job '{job_name}' not found in namespace '{namespace}'.")
+            raise HTTPException(status_code=404, detail=f"Job '{job_name}' not found.")
+        else:
+            logging.error(f"Exception when retrieving logs for job '{job_name}': {e}")
+            raise HTTPException(status_code=500, detail="Error retrieving pod logs.")
+
+# A followed log stream with no output for LOG_FOLLOW_IDLE_TIMEOUT seconds
+# is closed; clients resume it with offset. At most LOG_CONNECTIONS streams
+# are open at once.
+LOG_FOLLOW_IDLE_TIMEOUT = int(os.getenv("LOG_FOLLOW_IDLE_TIMEOUT", "3600"))
+active_log_streams = 0
+
+def log_job_name(job_name: str, container: Optional[str]) -> str:
+    """
+    Maps a job and container choice to the job whose pods run that
+    container: "kaniko" and "executor" select the build or the execution job
+    of the same upload, whichever of the two job_name names.
+    """
+    if container == "kaniko" and "-execution-job-" in job_name:
+        return job_name.replace("-execution-job-", "-kaniko-build-", 1)
+    if container == "executor" and "-kaniko-build-" in job_name:
+        return job_name.replace("-kaniko-build-", "-execution-job-", 1)
+    return job_name
+
+@router.get("/jobs/{job_name}/logs/stream")
+async def stream_job_logs(
+    job_name: str,
+    follow: bool = False,
+    tail_lines: Optional[int] = None,
+    since_seconds: Optional[int] = None,
+    offset: int = 0,
+    container: Optional[str] = None,
+    pod_name: Optional[str] = None
+):
+    """
+    Streams the logs of the job's latest pod (or pod_name) as plain text
+    while they are read from the API server. With follow, the response stays
+    open and new lines are sent as they are written. offset skips that many
+    bytes of the selected log, so a client that lost its connection can
+    resume from the number of bytes it already received.
+    """
+    global active_log_streams
+    namespace = "default"
+    if offset < 0 or (tail_lines is not None and tail_lines < 0) or (since_seconds is not None and since_seconds <= 0):
+        raise HTTPException(status_code=400, detail="offset, tail_lines and since_seconds must be positive.")
+
+    job_name = log_job_name(job_name, container)
+    if await cached_job(job_name) is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_name}' not found.")
+    pods = (await cached_job_pods(job_name)).get(job_name, [])
+    if pod_name is not None:
+        pods = [pod for pod in pods if pod.metadata.name == pod_name]
+    if not pods:
+        raise HTTPException(status_code=404, detail=f"No pods found for job '{job_name}'")
+    pod = max(pods, key=lambda pod: pod.metadata.creation_timestamp)
+
+    if container is not None and container not in [c.name for c in pod.spec.containers]:
+        raise HTTPException(status_code=404, detail=f"Container '{container}' not found in pod '{pod.metadata.name}'.")
+
+    kwargs = {"follow": follow}
+    if tail_lines is not None:
+        kwargs["tail_lines"] = tail_lines
+    if since_seconds is not None:
+        kwargs["since_seconds"] = since_seconds
+    if container is not None:
+        kwargs["container"] = container
+
+    if active_log_streams >= LOG_CONNECTIONS:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many log streams open, please retry shortly.",
+            headers={"Retry-After": "10"}
+        )
+    # The slot is taken before the stream is opened, so concurrent requests
+    # cannot all pass the check, and given back exactly once: if opening
+    # fails, when the body ends, or if the client leaves before it is sent
+    active_log_streams += 1
+    response = None
+    closed = False
+
+    def close():
+        global active_log_streams
+        nonlocal closed
+        if closed:
+            return
+        closed = True
+        active_log_streams -= 1
+        if response is not None:
+            response.close()
+            response.release_conn()
+
+    try:
+        response = await k8s_call(
+            log_core_v1.read_namespaced_pod_log,
+            name=pod.metadata.name,
+            namespace=namespace,
+            _preload_content=False,
+            # A quiet job is not a failure, so following allows long gaps
+            _request_timeout=(K8S_TIMEOUT, LOG_FOLLOW_IDLE_TIMEOUT if follow else K8S_TIMEOUT),
+            **kwargs
+        )
+    except client.exceptions.ApiException as e:
+        if e.status == 400:
+            # The container has not started yet, or no longer exists
+            raise HTTPException(status_code=409, detail=f"Logs of pod '{pod.metadata.name}' are not available yet.")
+        logging.error(f"Exception when streaming logs for job '{job_name}': {e}")
+        raise HTTPException(status_code=500, detail="Error retrieving pod logs.")
+    finally:
+        if response is None:
+            close()
+
+    async def relay():
+        loop = asyncio.get_running_loop()
+        chunks = response.stream(LOG_CHUNK_SIZE, decode_content=True)
+        skip = offset
+        try:
+            while True:
+                chunk = await loop.run_in_executor(log_stream_pool, next, chunks, None)
+                if chunk is None:
+                    break
+                if skip:
+                    dropped = min(skip, len(chunk))
+                    chunk = chunk[dropped:]
+                    skip -= dropped
+                if chunk:
+                    yield chunk
+        except urllib3.exceptions.HTTPError as e:
+            logging.info(f"Log stream for pod '{pod.metadata.name}' ended: {e}")
+        finally:
+            close()
+
+    return StreamingResponse(relay(), media_type="text/plain; charset=utf-8", background=BackgroundTask(close),
+                             headers={
+                                 "X-Job-Name": job_name,
+                                 "X-Pod-Name": pod.metadata.name,
+                                 "X-Log-Offset": str(offset),
+                                 "Cache-Control": "no-cache",
+                                 "X-Accel-Buffering": "no",
+                             })
+
+# Pod logs are copied to LOG_ARCHIVE_DIRECTORY while the pods run, so they
+# can still be read and searched after the pods are garbage-collected. Each
+# pod's log is split into gzip chunks of up to LOG_ARCHIVE_CHUNK_LINES lines
+# or LOG_ARCHIVE_CHUNK_BYTES bytes, listed with their line ranges and
+# timestamps in the pod's index.json. Only build and execution pods are
+# archived; notebooks would hold a stream for their whole lifetime. Logs of
+# jobs that are gone are removed after LOG_ARCHIVE_RETENTION seconds
+# without writes.
+LOG_ARCHIVE_DIRECTORY = os.getenv("LOG_ARCHIVE_DIRECTORY", os.path.join(UPLOAD_DIRECTORY, ".logs"))
+LOG_ARCHIVE_CHUNK_LINES = int(os.getenv("LOG_ARCHIVE_CHUNK_LINES", "10000"))
+LOG_ARCHIVE_CHUNK_BYTES = 4 * 1024 * 1024
+LOG_ARCHIVE_STREAMS = int(os.getenv("LOG_ARCHIVE_STREAMS", "32"))
+LOG_ARCHIVE_RETRY_DELAY = 5
+LOG_ARCHIVE_RETENTION = int(os.getenv("LOG_ARCHIVE_RETENTION", str(14 * 24 * 3600)))
+LOG_ARCHIVE_PRUNE_INTERVAL = 3600
+
+# Every chunk records the words it contains in a bloom filter of this many
+# bits, so a search only decompresses chunks that may match
+LOG_BLOOM_BITS = 1 << 16
+LOG_BLOOM_HASHES = 3
+
+MAX_LOG_RANGE_LINES = 10000
+MAX_LOG_SEARCH_RESULTS = 1000
+
+LOG_TIMESTAMP_RE = re.compile(r"^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d{1,9}))?(?:Z|[+-]00:00) ?")
+LOG_WORD_RE = re.compile(r"\w+")
+
+def normalize_timestamp(value: str) -> Optional[str]:
+    """
+    Returns an RFC 3339 UTC timestamp with nanosecond precision, so archived
+    timestamps compare correctly as strings, or None if value is not one.
+    """
+    match = LOG_TIMESTAMP_RE.match(value + " ")
+    if not match:
+        return None
+    return f"{match.group(1)}.{(match.group(2) or '').ljust(9, '0')}Z"
+
+def split_log_line(line: str) -> tuple:
+    """
+    Splits a line read with timestamps=True into (timestamp, text).
+    """
+    match = LOG_TIMESTAMP_RE.match(line)
+    if not match:
+        return None, line
+    return normalize_timestamp(match.group(0).rstrip()), line[match.end():]
+
+def bloom_positions(word: str) -> list:
+    digest = hashlib.blake2b(word.encode("utf-8"), digest_size=4 * LOG_BLOOM_HASHES).digest()
+    return [int.from_bytes(digest[i * 4:i * 4 + 4], "big") % LOG_BLOOM_BITS for i in range(LOG_BLOOM_HASHES)]
+
+def bloom_add(bloom: bytearray, text: str):
+    for word in set(LOG_WORD_RE.findall(text.lower())):
+        for position in bloom_positions(word):
+            bloom[position >> 3] |= 1 << (position & 7)
+
+def bloom_may_contain(bloom: bytes, word: str) -> bool:
+    return all(bloom[position >> 3] & (1 << (position & 7)) for position in bloom_positions(word))
+
+class PodLogArchive:
+    """
+    The archived log of one pod: finished chunks as NNNNNN.log.gz plus the
+    chunk being written as open.log, one "<timestamp> <text>" line per log
+    line. Only one collector thread writes to an archive at a time.
+    """
+
+    def __init__(self, job_name: str, pod_name: str):
+        self.path = os.path.join(LOG_ARCHIVE_DIRECTORY, job_name, pod_name)
+        self.index_path = os.path.join(self.path, "index.json")
+        self.open_path = os.path.join(self.path, "open.log")
+        self.index = read_json(self.index_path, {
+            "job_name": job_name,
+            "pod_name": pod_name,
+            "chunks": [],
+            "complete": False
+        })
+        self.open_file = None
+        self.open_chunk = None
+
+    @property
+    def chunks(self) -> list:
+        return self.index["chunks"]
+
+    def archived_lines(self) -> int:
+        return self.chunks[-1]["first_line"] + self.chunks[-1]["lines"] if self.chunks else 0
+
+    def last_timestamp(self) -> Optional[str]:
+        if self.open_chunk and self.open_chunk["last_timestamp"]:
+            return self.open_chunk["last_timestamp"]
+        return self.chunks[-1]["last_timestamp"] if self.chunks else None
+
+    def start_chunk(self):
+        self.open_chunk = {
+            "file": f"{len(self.chunks):06d}.log.gz",
+            "first_line": self.archived_lines(),
+            "lines": 0,
+            "bytes": 0,
+            "first_timestamp": None,
+            "last_timestamp": None
+        }
+        self.bloom = bytearray(LOG_BLOOM_BITS // 8)
+
+    def add_line(self, timestamp: Optional[str], text: str):
+        chunk = self.open_chunk
+        chunk["lines"] += 1
+        chunk["bytes"] += len(text) + 32
+        chunk["first_timestamp"] = chunk["first_timestamp"] or timestamp
+        chunk["last_timestamp"] = timestamp or chunk["last_timestamp"]
+        bloom_add(self.bloom, text)
+
+    def recover(self):
+        """
+        Turns an open.log left behind by a restart into a finished chunk.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        if not os.path.exists(self.open_path):
+            return
+        self.start_chunk()
+        for timestamp, text in self.read_file(self.open_path):
+            self.add_line(timestamp, text)
+        self.rotate()
+
+    def append(self, lines: list):
+        """
+        Appends (timestamp, text) lines, starting a new chunk when the open
+        one is full. Lines are flushed to disk as they arrive.
+        """
+        for timestamp, text in lines:
+            if self.open_file is None:
+                self.start_chunk()
+                self.open_file = open(self.open_path, "a", encoding="utf-8")
+            self.open_file.write(f"{timestamp or ''} {text}\n")
+            self.add_line(timestamp, text)
+            if self.open_chunk["lines"] >= LOG_ARCHIVE_CHUNK_LINES or self.open_chunk["bytes"] >= LOG_ARCHIVE_CHUNK_BYTES:
+                self.rotate()
+        if self.open_file is not None:
+            self.open_file.flush()
+
+    def rotate(self):
+        if self.open_file is not None:
+            self.open_file.close()
+            self.open_file = None
+        if self.open_chunk and self.open_chunk["lines"]:
+            chunk_path = os.path.join(self.path, self.open_chunk["file"])
+            with open(self.open_path, "rb") as src, gzip.open(f"{chunk_path}.tmp", "wb") as dst:
+                shutil.copyfileobj(src, dst, UPLOAD_CHUNK_SIZE)
+            os.replace(f"{chunk_path}.tmp", chunk_path)
+            self.open_chunk["bloom"] = base64.b64encode(self.bloom).decode("ascii")
+            self.chunks.append(self.open_chunk)
+            write_json(self.index_path, self.index)
+        self.open_chunk = None
+        if os.path.exists(self.open_path):
+            os.remove(self.open_path)
+
+    def finish(self):
+        self.rotate()
+        self.index["complete"] = True
+        os.makedirs(self.path, exist_ok=True)
+        write_json(self.index_path, self.index)
+
+    @staticmethod
+    def read_file(path: str):
+        opener = gzip.open if path.endswith(".gz") else open
+        try:
+            with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    timestamp, _, text = line.rstrip("\n").partition(" ")
+                    yield timestamp or None, text
+        except FileNotFoundError:
+            return
+
+    def read_chunk(self, chunk: dict):
+        return self.read_file(os.path.join(self.path, chunk["file"]))
+
+    def iter_lines(self, start: int = 0, since: Optional[str] = None, until: Optional[str] = None,
+                   chunk_filter=None):
+        """
+        Yields (line number, timestamp, text) from line start on, reading only
+        the chunks that overlap the line and time range and pass chunk_filter.
+        The open chunk is always read.
+        """
+        for chunk in self.chunks:
+            if chunk["first_line"] + chunk["lines"] <= start:
+                continue
+            if since and chunk["last_timestamp"] and chunk["last_timestamp"] < since:
+                continue
+            if until and chunk["first_timestamp"] and chunk["first_timestamp"] > until:
+                continue
+            if chunk_filter and not chunk_filter(chunk):
+                continue
+            yield from self.filter_lines(self.read_chunk(chunk), chunk["first_line"], start, since, until)
+        yield from self.filter_lines(self.read_file(self.open_path), self.archived_lines(), start, since, until)
+
+    @staticmethod
+    def filter_lines(lines, first_line: int, start: int, since: Optional[str], until: Optional[str]):
+        for number, (timestamp, text) in enumerate(lines, first_line):
+            if number < start or (since and timestamp and timestamp < since):
+                continue
+            if until and timestamp and timestamp > until:
+                return
+            yield number, timestamp, text
+
+    def summary(self) -> dict:
+        lines = self.archived_lines()
+        first_timestamp = self.chunks[0]["first_timestamp"] if self.chunks else None
+        last_timestamp = self.chunks[-1]["last_timestamp"] if self.chunks else None
+        for timestamp, _ in self.read_file(self.open_path):
+            lines += 1
+            first_timestamp = first_timestamp or timestamp
+            last_timestamp = timestamp or last_timestamp
+        return {
+            "pod_name": self.index["pod_name"],
+            "lines": lines,
+            "chunks": len(self.chunks),
+            "first_timestamp": first_timestamp,
+            "last_timestamp": last_timestamp,
+            "complete": self.index["complete"]
+        }
+
+def archived_pods(job_name: str) -> List[PodLogArchive]:
+    job_path = os.path.join(LOG_ARCHIVE_DIRECTORY, job_name)
+    if not K8S_NAME_RE.match(job_name) or not os.path.isdir(job_path):
+        return []
+    archives = [PodLogArchive(job_name, pod_name) for pod_name in sorted(os.listdir(job_path))]
+    # Oldest pod first, so the last one holds the latest run
+    return sorted(archives, key=lambda archive: archive.chunks[0]["first_timestamp"] if archive.chunks else "~")
+
+class LogCollector:
+    """
+    Follows the log of every build and execution pod that has started and
+    appends it to the pod's archive, one thread per pod on a bounded pool. A stream that ends
+    while the pod still runs is resumed from the last archived timestamp;
+    the archive is marked complete once the pod has finished or is gone.
+    """
+
+    def __init__(self, workers: int):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="log-archive")
+        self.active = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def on_pod_event(self, event_type: str, pod):
+        if event_type == "SYNC":
+            for pod in pod_informer.list():
+                self.consider(pod)
+        elif event_type != "DELETED":
+            self.consider(pod)
+
+    def consider(self, pod):
+        started = any(status.state.running or status.state.terminated
+                      for status in pod.status.container_statuses or [])
+        labels = pod.metadata.labels or {}
+        job_name = labels.get("job-name")
+        if not started or not job_name or self.stopped.is_set():
+            return
+        # Notebook pods run for hours and would each hold a stream
+        if "notebook-session" in labels or "pool-state" in labels:
+            return
+        if labels.get("app") != "kaniko-build" and pipelines.get(job_name) is None:
+            return
+        key = (job_name, pod.metadata.name)
+        with self.lock:
+            if key in self.active:
+                return
+            self.active.add(key)
+        self.pool.submit(self.collect, job_name, pod.metadata.name)
+
+    def collect(self, job_name: str, pod_name: str):
+        archive = PodLogArchive(job_name, pod_name)
+        try:
+            if archive.index["complete"]:
+                return
+            archive.recover()
+            while not self.stopped.is_set():
+                try:
+                    self.follow(archive, pod_name)
+                except client.exceptions.ApiException as e:
+                    if e.status == 404:
+                        break
+                    if e.status == 400:
+                        # The container is not running yet; the next pod
+                        # event picks the pod up again
+                        return
+                    logging.error(f"Archiving logs of pod '{pod_name}' failed: {e}")
+                except urllib3.exceptions.HTTPError as e:
+                    logging.info(f"Log stream of pod '{pod_name}' interrupted: {e}")
+                pod = pod_informer.get(pod_name)
+                if pod is None or pod.status.phase in ("Succeeded", "Failed"):
+                    break
+                self.stopped.wait(LOG_ARCHIVE_RETRY_DELAY)
+            if not self.stopped.is_set():
+                archive.finish()
+        except Exception as e:
+            logging.error(f"Archiving logs of pod '{pod_name}' failed: {e}")
+        finally:
+            archive.rotate()
+            with self.lock:
+                self.active.discard((job_name, pod_name))
+
+    def follow(self, archive: PodLogArchive, pod_name: str):
+        kwargs = {}
+        last_timestamp = archive.last_timestamp()
+        if last_timestamp:
+            # The API only takes whole seconds, so ask for a little more and
+            # skip what is already archived
+            then = calendar.timegm(time.strptime(last_timestamp[:19], "%Y-%m-%dT%H:%M:%S"))
+            kwargs["since_seconds"] = max(1, int(time.time() - then) + 2)
+        response = log_core_v1.read_namespaced_pod_log(
+            name=pod_name,
+            namespace="default",
+            follow=True,
+            timestamps=True,
+            _preload_content=False,
+            _request_timeout=(K8S_TIMEOUT, LOG_FOLLOW_IDLE_TIMEOUT),
+            **kwargs
+        )
+        try:
+            partial = b""
+            for data in response.stream(LOG_CHUNK_SIZE, decode_content=True):
+                if self.stopped.is_set():
+                    return
+                *complete_lines, partial = (partial + data).split(b"\n")
+                lines = []
+                for raw in complete_lines:
+                    timestamp, text = split_log_line(raw.decode("utf-8", errors="replace"))
+                    if last_timestamp and timestamp and timestamp <= last_timestamp:
+                        continue
+                    lines.append((timestamp, text))
+                archive.append(lines)
+            if partial:
+                archive.append([split_log_line(partial.decode("utf-8", errors="replace"))])
+        finally:
+            response.close()
+            response.release_conn()
+
+    def prune(self):
+        """
+        Removes the archived logs of jobs that no longer exist and have not
+        been written to for LOG_ARCHIVE_RETENTION seconds.
+        """
+        if not job_informer.synced.is_set():
+            return
+        with self.lock:
+            collecting = {job_name for job_name, _ in self.active}
+        cutoff = time.time() - LOG_ARCHIVE_RETENTION
+        for entry in os.scandir(LOG_ARCHIVE_DIRECTORY):
+            if not entry.is_dir() or entry.name in collecting or job_informer.get(entry.name) is not None:
+                continue
+            last_write = max(
+                (os.path.getmtime(os.path.join(root, name)) for root, _, files in os.walk(entry.path) for name in files),
+                default=entry.stat().st_mtime
+            )
+            if last_write < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                logging.info(f"Removed archived logs of job '{entry.name}'")
+
+    def stop(self):
+        self.stopped.set()
+        self.pool.shutdown(wait=False)
+
+log_collector = LogCollector(LOG_ARCHIVE_STREAMS)
+
+async def prune_log_archive():
+    await run_in_threadpool(log_collector.prune)
+
+def archived_job_logs(job_name: str) -> Optional[dict]:
+    """
+    Returns the last MAX_LOG_RANGE_LINES archived lines of the job's latest
+    pod in the /jobs/{job_name}/logs format, or None if nothing is archived.
+    """
+    archives = archived_pods(job_name)
+    if not archives:
+        return None
+    archive = archives[-1]
+    start = max(0, archive.summary()["lines"] - MAX_LOG_RANGE_LINES)
+    lines = [text for _, _, text in archive.iter_lines(start)]
+    return {
+        "job_name": job_name,
+        "pod_name": archive.index["pod_name"],
+        "logs": "".join(f"{line}\n" for line in lines),
+        "archived": True
+    }
+
+def validate_job_name(job_name: str) -> str:
+    if not K8S_NAME_RE.match(job_name):
+        raise HTTPException(status_code=400, detail="Invalid job name.")
+    return job_name
+
+@router.get("/logs/archive/{job_name}")
+async def get_archived_job(job_name: str):
+    """
+    Lists the archived pod logs of a job, oldest pod first.
+    """
+    archives = await run_in_threadpool(archived_pods, validate_job_name(job_name))
+    if not archives:
+        raise HTTPException(status_code=404, detail=f"No archived logs for job '{job_name}'.")
+    return {"job_name": job_name, "pods": await run_in_threadpool(lambda: [a.summary() for a in archives])}
+
+@router.get("/logs/archive/{job_name}/lines")
+async def read_archived_lines(
+    job_name: str,
+    pod_name: Optional[str] = None,
+    start: int = 0,
+    count: int = 1000,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """
+    Returns up to count archived lines of the job's latest pod (or pod_name)
+    from line start on, optionally limited to timestamps between since and
+    until (RFC 3339). next is the line to continue from.
+    """
+    if start < 0 or not 0 < count <= MAX_LOG_RANGE_LINES:
+        raise HTTPException(status_code=400, detail=f"start must be positive and count at most {MAX_LOG_RANGE_LINES}.")
+    since_timestamp = normalize_timestamp(since) if since else None
+    until_timestamp = normalize_timestamp(until) if until else None
+    if (since and not since_timestamp) or (until and not until_timestamp):
+        raise HTTPException(status_code=400, detail="since and until must be RFC 3339 UTC timestamps.")
+
+    archives = await run_in_threadpool(archived_pods, validate_job_name(job_name))
+    if pod_name is not None:
+        archives = [a for a in archives if a.index["pod_name"] == pod_name]
+    if not archives:
+        raise HTTPException(status_code=404, detail=f"No archived logs for job '{job_name}'.")
+    archive = archives[-1]
+
+    def read():
+        lines = []
+        for number, timestamp, text in archive.iter_lines(start, since_timestamp, until_timestamp):
+            lines.append({"line": number, "timestamp": timestamp, "text": text})
+            if len(lines) >= count:
+                break
+        return lines
+
+    lines = await run_in_threadpool(read)
+    return {
+        "job_name": job_name,
+        "pod_name": archive.index["pod_name"],
+        "lines": lines,
+        "next": lines[-1]["line"] + 1 if lines else None
+    }
+
+@router.get("/logs/search")
+async def search_archived_logs(
+    q: str,
+    job_prefix: Optional[str] = None,
+    regex: bool = False,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = 100
+):
+    """
+    Searches the archived logs of all jobs, or of the jobs whose name starts
+    with job_prefix. By default q is a list of words that must all appear in
+    a line (case-insensitive), and chunks whose bloom filter rules out a
+    word are skipped without being read; with regex, q is a regular
+    expression matched against every line in range.
+    """
+    if not 0 < limit <= MAX_LOG_SEARCH_RESULTS:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_LOG_SEARCH_RESULTS}.")
+    since_timestamp = normalize_timestamp(since) if since else None
+    until_timestamp = normalize_timestamp(until) if until else None
+    if (since and not since_timestamp) or (until and not until_timestamp):
+        raise HTTPException(status_code=400, detail="since and until must be RFC 3339 UTC timestamps.")
+
+    if regex:
+        try:
+            pattern = re.compile(q)
+        except re.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid regular expression: {e}")
+        words = set()
+    else:
+        words = set(LOG_WORD_RE.findall(q.lower()))
+        if not words:
+            raise HTTPException(status_code=400, detail="The query contains no words.")
+
+    def matches(text: str) -> bool:
+        if regex:
+            return pattern.search(text) is not None
+        return words.issubset(LOG_WORD_RE.findall(text.lower()))
+
+    stats = {"chunks": 0, "chunks_read": 0}
+
+    def chunk_may_match(chunk: dict) -> bool:
+        stats["chunks"] += 1
+        bloom = base64.b64decode(chunk["bloom"])
+        if not all(bloom_may_contain(bloom, word) for word in words):
+            return False
+        stats["chunks_read"] += 1
+        return True
+
+    def search():
+        results = []
+        for job_name in sorted(os.listdir(LOG_ARCHIVE_DIRECTORY)):
+            if job_prefix and not job_name.startswith(job_prefix):
+                continue
+            for archive in archived_pods(job_name):
+                for number, timestamp, text in archive.iter_lines(0, since_timestamp, until_timestamp, chunk_may_match):
+                    if matches(text):
+                        results.append({"job_name": job_name, "pod_name": archive.index["pod_name"],
+                                        "line": number, "timestamp": timestamp, "text": text})
+                        if len(results) >= limit:
+                            return results
+        return results
+
+    results = await run_in_threadpool(search)
+    return {"results": results, "truncated": len(results) >= limit, **stats}
+
+def setup():
+    os.makedirs(LOG_ARCHIVE_DIRECTORY, exist_ok=True)
+    pod_informer.listeners.append(log_collector.on_pod_event)
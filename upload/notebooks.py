@@ -0,0 +1,797 @@
+import asyncio
+import calendar
+import hashlib
+import json
+import logging
+import os
+import re
+import secrets
+import string
+import time
+from typing import List, Optional
+
+import urllib3
+from fastapi import APIRouter, Form, HTTPException
+from kubernetes import client
+from kubernetes.utils import parse_quantity
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from kube import (
+    K8S_NAME_RE, batch_v1, core_v1, custom_objects, finished_condition, job_informer, k8s_call,
+    networking_v1, pod_informer
+)
+from storage import CHECKPOINT_GRACE_SECONDS, checkpoint_subpath
+
+router = APIRouter()
+
+# Notebooks run in, and checkpoint, this directory of their container
+NOTEBOOK_WORK_DIRECTORY = "/work"
+
+@router.post("/ephemeral_notebook/")
+async def create_ephemeral_notebook(
+    session_name: str = Form(...),
+    image_name: str = Form(...),
+    token: Optional[str] = Form(None),
+    ttl_seconds: int = Form(300),  # auto-delete job after 5 minutes of completion
+    base_domain: str = Form("notebooks.local")
+):
+    """
+    Creates:
+    1) A K8s Job for an ephemeral Jupyter session (with a TTL).
+    2) A Service (ClusterIP) to target the Pod.
+    3) An Ingress with host-based routing, e.g. <session_name>.<base_domain>.
+    """
+
+    if not session_name:
+        raise HTTPException(status_code=400, detail="session_name is required")
+    if not image_name:
+        raise HTTPException(status_code=400, detail="image_name is required")
+
+    try:
+        session = await open_notebook_session(session_name, image_name, token, ttl_seconds, base_domain)
+    except client.exceptions.ApiException as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {"message": "Ephemeral Jupyter notebook created", **session}
+
+class NotebookBatch(BaseModel):
+    image_name: str
+    count: Optional[int] = None
+    session_prefix: Optional[str] = None
+    session_names: Optional[List[str]] = None
+    ttl_seconds: int = 300
+    base_domain: str = "notebooks.local"
+    # Roll back every session if any of them fails
+    atomic: bool = False
+
+# Sessions of a batch are opened this many at a time
+NOTEBOOK_BATCH_CONCURRENCY = int(os.getenv("NOTEBOOK_BATCH_CONCURRENCY", "10"))
+MAX_NOTEBOOK_BATCH = int(os.getenv("MAX_NOTEBOOK_BATCH", "100"))
+
+@router.post("/ephemeral_notebooks/batch")
+async def create_ephemeral_notebook_batch(batch: NotebookBatch):
+    """
+    Opens several notebook sessions at once, e.g. for a class: either the
+    given session_names or count sessions named <session_prefix>-1..N.
+    Each session gets its own token.
+    """
+    if not batch.image_name:
+        raise HTTPException(status_code=400, detail="image_name is required")
+    if batch.session_names:
+        names = batch.session_names
+    elif batch.count and batch.session_prefix:
+        names = [f"{batch.session_prefix}-{i}" for i in range(1, batch.count + 1)]
+    else:
+        raise HTTPException(status_code=400, detail="Send session_names, or count with session_prefix.")
+    if len(names) > MAX_NOTEBOOK_BATCH:
+        raise HTTPException(status_code=400, detail=f"A batch opens at most {MAX_NOTEBOOK_BATCH} sessions.")
+    if len(set(names)) != len(names):
+        raise HTTPException(status_code=400, detail="Session names must be unique.")
+    invalid = [name for name in names if not K8S_NAME_RE.match(f"{name}-job")]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid session names: {', '.join(invalid)}")
+
+    limit = asyncio.Semaphore(NOTEBOOK_BATCH_CONCURRENCY)
+
+    async def open_one(name: str):
+        async with limit:
+            return await open_notebook_session(name, batch.image_name, None, batch.ttl_seconds, batch.base_domain)
+
+    results = await asyncio.gather(*(open_one(name) for name in names), return_exceptions=True)
+    sessions = [result for result in results if isinstance(result, dict)]
+    failed = [
+        {"session_name": name, "error": result.reason if isinstance(result, client.exceptions.ApiException) else str(result)}
+        for name, result in zip(names, results) if not isinstance(result, dict)
+    ]
+    if failed and batch.atomic:
+        await asyncio.gather(*(close_notebook_session(session) for session in sessions))
+        raise HTTPException(
+            status_code=500,
+            detail={"message": "Batch rolled back.", "failed": failed}
+        )
+    return {
+        "message": f"Opened {len(sessions)} of {len(names)} notebook sessions",
+        "sessions": sessions,
+        "failed": failed
+    }
+
+async def open_notebook_session(session_name: str, image_name: str, token: Optional[str],
+                                ttl_seconds: int, base_domain: str) -> dict:
+    """
+    Opens one notebook session: the Job (or a claimed pool Job) first, then
+    its Service and Ingress concurrently, both owned by the Job so deleting
+    it removes them too. If any step fails, whatever was created is deleted
+    again and the ApiException is raised.
+    """
+    # Namespaced resources
+    namespace = "default"
+
+    # Resource names
+    job_name = f"{session_name}-job"
+    svc_name = f"{session_name}-svc"
+    ingress_name = f"{session_name}-ing"
+    # The Service selects the notebook pod by this label
+    pod_label = job_name
+
+    # The jupyter notebook port
+    notebook_port = NOTEBOOK_PORT
+
+    # The host for this ephemeral notebook, e.g. "my-session.yourdomain.com"
+    notebook_host = f"{session_name}.{base_domain}"
+
+    # A pre-started pod from the warm pool already runs Jupyter with a token
+    # chosen when it was started, so only sessions without their own token
+    # can take one
+    pooled = None if token else await notebook_pool.claim(image_name, session_name, ttl_seconds)
+    if pooled:
+        # The informer may not have reported the claimed Job yet
+        job = job_informer.get(pooled[0])
+        if job is None:
+            try:
+                job = await k8s_call(batch_v1.read_namespaced_job, name=pooled[0], namespace=namespace)
+            except (client.exceptions.ApiException, HTTPException) as e:
+                logging.error(f"Could not read claimed pool notebook '{pooled[0]}', starting a new one: {e}")
+                await close_notebook_session({"job_name": pooled[0]})
+                pooled = None
+    if pooled:
+        job_name, token = pooled
+    else:
+        # Generate random token if none supplied
+        token = token or generate_random_token(16)
+        try:
+            job = await create_jupyter_job(
+                job_name=job_name,
+                namespace=namespace,
+                image_name=image_name,
+                token=token,
+                port=notebook_port,
+                ttl_seconds=ttl_seconds,
+                labels={"notebook-session": session_name}
+            )
+        except client.exceptions.ApiException as e:
+            logging.error(f"Error creating Job: {e}")
+            raise
+    owner = {
+        "apiVersion": "batch/v1",
+        "kind": "Job",
+        "name": job_name,
+        "uid": job.metadata.uid
+    }
+
+    results = await asyncio.gather(
+        create_jupyter_service(
+            svc_name=svc_name,
+            namespace=namespace,
+            job_label=pod_label,  # labels the pod with app=job_name
+            port=notebook_port,
+            owner=owner
+        ),
+        create_jupyter_ingress(
+            ingress_name=ingress_name,
+            namespace=namespace,
+            svc_name=svc_name,
+            port=notebook_port,
+            host=notebook_host,
+            owner=owner
+        ),
+        return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        logging.error(f"Error creating notebook session '{session_name}', rolling back: {errors[0]}")
+        await close_notebook_session({
+            "job_name": job_name,
+            "service_name": None if isinstance(results[0], BaseException) else svc_name,
+            "ingress_name": None if isinstance(results[1], BaseException) else ingress_name
+        })
+        raise errors[0]
+
+    # Return the host-based URL
+    # If you have TLS, it would be https://
+    jupyter_url = f"http://{notebook_host}/?token={token}"
+
+    return {
+        "session_name": session_name,
+        "job_name": job_name,
+        "from_pool": pooled is not None,
+        "service_name": svc_name,
+        "ingress_name": ingress_name,
+        "token": token,
+        "jupyter_url": jupyter_url
+    }
+
+async def close_notebook_session(session: dict):
+    """
+    Deletes a session's resources. The Service and Ingress would also be
+    garbage collected with the Job, but deleting them directly frees the
+    host name straight away.
+    """
+    namespace = "default"
+    deletions = [k8s_call(batch_v1.delete_namespaced_job, name=session["job_name"], namespace=namespace,
+                          propagation_policy="Background")]
+    if session.get("service_name"):
+        deletions.append(k8s_call(core_v1.delete_namespaced_service, name=session["service_name"],
+                                  namespace=namespace))
+    if session.get("ingress_name"):
+        deletions.append(k8s_call(networking_v1.delete_namespaced_ingress, name=session["ingress_name"],
+                                  namespace=namespace))
+    for result in await asyncio.gather(*deletions, return_exceptions=True):
+        if isinstance(result, client.exceptions.ApiException) and result.status != 404:
+            logging.error(f"Error deleting notebook session resources: {result}")
+
+async def create_jupyter_job(job_name: str,
+                             namespace: str,
+                             image_name: str,
+                             token: str,
+                             port: int,
+                             ttl_seconds: int,
+                             labels: Optional[dict] = None):
+    """
+    Creates a K8s Job that runs a Jupyter notebook container and sets a TTL
+    so it auto-deletes after completion. The user can kill the notebook
+    from within or once they close the Pod, it eventually completes.
+    """
+
+    # Command to run Jupyter in ephemeral mode
+    command = [
+        "jupyter",
+        "notebook",
+        f"--port={port}",
+        "--ip=0.0.0.0",
+        "--no-browser",
+        "--allow-root",
+        f"--NotebookApp.token={token}",
+        "--NotebookApp.password=''",
+        "--NotebookApp.default_url=/lab",
+        f"--notebook-dir={NOTEBOOK_WORK_DIRECTORY}"
+    ]
+
+    job_manifest = {
+        "apiVersion": "batch/v1",
+        "kind": "Job",
+        "metadata": {
+            "name": job_name,
+            "labels": labels or {}
+        },
+        "spec": {
+            "ttlSecondsAfterFinished": ttl_seconds,
+            "template": {
+                "metadata": {
+                    # Label used to select the Pod with the Service.
+                    "labels": {
+                        "app": job_name,
+                        **(labels or {})
+                    }
+                },
+                "spec": {
+                    "restartPolicy": "Never",
+                    "terminationGracePeriodSeconds": CHECKPOINT_GRACE_SECONDS,
+                    "containers": [
+                        {
+                            "name": "jupyter",
+                            "image": image_name,
+                            "command": command,
+                            "ports": [{"containerPort": port}],
+                            # The working directory is snapshotted to the
+                            # checkpoint volume whenever the pod stops (on
+                            # suspend) and restored when it starts again
+                            "lifecycle": {
+                                "postStart": {"exec": {"command": [
+                                    "sh", "-c", f"cp -a /checkpoint/. {NOTEBOOK_WORK_DIRECTORY}/ || true"
+                                ]}},
+                                "preStop": {"exec": {"command": [
+                                    "sh", "-c", f"cp -a {NOTEBOOK_WORK_DIRECTORY}/. /checkpoint/"
+                                ]}}
+                            },
+                            "volumeMounts": [
+                                {"name": "work", "mountPath": NOTEBOOK_WORK_DIRECTORY},
+                                {"name": "checkpoint", "mountPath": "/checkpoint",
+                                 "subPath": checkpoint_subpath("notebooks", job_name)}
+                            ],
+                            # Ready once Jupyter accepts connections
+                            "readinessProbe": {
+                                "tcpSocket": {"port": port},
+                                "periodSeconds": 2
+                            },
+                            "resources": {
+                                "requests": {"memory": "512Mi", "cpu": "250m"},
+                                "limits":   {"memory": "1Gi",  "cpu": "500m"}
+                            }
+                        }
+                    ],
+                    "volumes": [
+                        {"name": "work", "emptyDir": {}},
+                        {"name": "checkpoint", "persistentVolumeClaim": {"claimName": "shared-pvc"}}
+                    ]
+                }
+            }
+        }
+    }
+    job = await k8s_call(batch_v1.create_namespaced_job, namespace=namespace, body=job_manifest)
+    logging.info(f"Job '{job_name}' created in '{namespace}'")
+    return job
+
+async def create_jupyter_service(svc_name: str,
+                                 namespace: str,
+                                 job_label: str,
+                                 port: int,
+                                 owner: Optional[dict] = None):
+    """
+    Creates a ClusterIP Service that routes to the Pod labeled app=job_label.
+    """
+    service_manifest = {
+        "apiVersion": "v1",
+        "kind": "Service",
+        "metadata": {
+            "name": svc_name,
+            "ownerReferences": [owner] if owner else []
+        },
+        "spec": {
+            "type": "ClusterIP",
+            "selector": {
+                "app": job_label
+            },
+            "ports": [
+                {
+                    "port": port,
+                    "targetPort": port
+                }
+            ]
+        }
+    }
+
+    await k8s_call(core_v1.create_namespaced_service, namespace=namespace, body=service_manifest)
+    logging.info(f"Service '{svc_name}' created in '{namespace}'")
+
+async def create_jupyter_ingress(ingress_name: str,
+                                 namespace: str,
+                                 svc_name: str,
+                                 port: int,
+                                 host: str,
+                                 owner: Optional[dict] = None):
+    """
+    Creates an Ingress route on host=<host>, forwarding traffic to the Service <svc_name>:<port>.
+    Assumes an Ingress controller (like NGINX) is set up in the cluster.
+    TLS configuration or annotations can be added if you want HTTPS.
+    """
+
+    # Basic host-based routing, HTTP only for now
+    ingress_manifest = {
+        "apiVersion": "networking.k8s.io/v1",
+        "kind": "Ingress",
+        "metadata": {
+            "name": ingress_name,
+            "ownerReferences": [owner] if owner else [],
+            # Add annotations for your specific Ingress controller,
+            # e.g., to enable TLS or set custom behaviors.
+            # "annotations": {
+            #     "kubernetes.io/ingress.class": "nginx",
+            #     "cert-manager.io/cluster-issuer": "letsencrypt-prod",
+            # }
+        },
+        "spec": {
+            "rules": [
+                {
+                    "host": host,
+                    "http": {
+                        "paths": [
+                            {
+                                "path": "/",     # or "/notebook"
+                                "pathType": "Prefix",
+                                "backend": {
+                                    "service": {
+                                        "name": svc_name,
+                                        "port": {
+                                            "number": port
+                                        }
+                                    }
+                                }
+                            }
+                        ]
+                    }
+                }
+            ],
+            # For HTTPS/TLS, add something like:
+            # "tls": [
+            #   {
+            #     "hosts": [host],
+            #     "secretName": "some-tls-secret"
+            #   }
+            # ]
+        }
+    }
+
+    await k8s_call(networking_v1.create_namespaced_ingress, namespace=namespace, body=ingress_manifest)
+    logging.info(f"Ingress '{ingress_name}' created in '{namespace}'")
+
+def generate_random_token(length: int) -> str:
+    """
+    Generate a cryptographically-secure random token for Jupyter.
+    """
+    alphabet = string.ascii_letters + string.digits
+    return "".join(secrets.choice(alphabet) for _ in range(length))
+
+# Warm pool of pre-started notebook pods. NOTEBOOK_POOL maps images to the
+# number of idle pods to keep, e.g. {"jupyter/scipy-notebook:latest": 2}.
+# Pool pods are ordinary notebook Jobs labelled notebook-pool=<image label>
+# and pool-state=idle. Claiming one relabels its pod so the session's
+# Service selects it; the refill then starts a replacement.
+NOTEBOOK_PORT = 8888
+NOTEBOOK_POOL = json.loads(os.getenv("NOTEBOOK_POOL", "{}"))
+NOTEBOOK_POOL_TTL = 300
+NOTEBOOK_POOL_REFILL_INTERVAL = int(os.getenv("NOTEBOOK_POOL_REFILL_INTERVAL", "15"))
+# How long a created or claimed pool Job may take to show up in the informer
+NOTEBOOK_POOL_SETTLE_SECONDS = 60
+
+def notebook_pool_label(image_name: str) -> str:
+    # Label values are limited to 63 alphanumerics, '-', '_' and '.'
+    slug = re.sub(r"[^a-z0-9]+", "-", image_name.lower())[:40].strip("-")
+    return f"{slug}-{hashlib.sha256(image_name.encode('utf-8')).hexdigest()[:8]}"
+
+def jupyter_job_token(job) -> Optional[str]:
+    for arg in job.spec.template.spec.containers[0].command or []:
+        if arg.startswith("--NotebookApp.token="):
+            return arg.split("=", 1)[1]
+    return None
+
+def pod_ready(pod) -> bool:
+    return any(c.type == "Ready" and c.status == "True" for c in pod.status.conditions or [])
+
+class NotebookPool:
+    """
+    Keeps NOTEBOOK_POOL idle notebook Jobs per image running. Jobs that were
+    just created or claimed are tracked until the informer reports the
+    change, so a burst of claims neither hands out one pod twice nor
+    overfills the pool.
+    """
+
+    def __init__(self, sizes: dict):
+        self.sizes = sizes
+        self.labels = {notebook_pool_label(image): image for image in sizes}
+        self.created = {}
+        self.claimed = {}
+        self.claims = 0
+        self.misses = 0
+        self.claiming = None
+        self.refilling = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        self.claiming = asyncio.Lock()
+        self.refilling = asyncio.Lock()
+
+    def forget_seen(self):
+        now = time.time()
+        self.created = {name: (label, at) for name, (label, at) in self.created.items()
+                        if job_informer.get(name) is None and now - at < NOTEBOOK_POOL_SETTLE_SECONDS}
+        self.claimed = {name: at for name, at in self.claimed.items()
+                        if now - at < NOTEBOOK_POOL_SETTLE_SECONDS and job_informer.get(name) is not None
+                        and (job_informer.get(name).metadata.labels or {}).get("pool-state") == "idle"}
+
+    def idle(self, label: Optional[str] = None) -> list:
+        return [
+            job for job in job_informer.list()
+            if (job.metadata.labels or {}).get("pool-state") == "idle"
+            and (label is None or job.metadata.labels.get("notebook-pool") == label)
+            and job.metadata.name not in self.claimed and finished_condition(job) is None
+        ]
+
+    def pod(self, job):
+        pods = [pod for pod in pod_informer.by_index(job.metadata.name)
+                if pod.status.phase in ("Pending", "Running") and pod.metadata.deletion_timestamp is None]
+        return pods[0] if pods else None
+
+    async def claim(self, image_name: str, session_name: str, ttl_seconds: int) -> Optional[tuple]:
+        """
+        Hands an idle pool pod of image_name to a session: its pod is
+        relabelled app=<session_name>-job and its Job takes the session's
+        ttl_seconds. Returns (job name, token), or None if the pool has no
+        pod to give.
+        """
+        if image_name not in self.sizes or self.claiming is None:
+            return None
+        pod_label = f"{session_name}-job"
+        async with self.claiming:
+            self.forget_seen()
+            candidates = []
+            for job in self.idle(notebook_pool_label(image_name)):
+                pod = self.pod(job)
+                if pod is not None:
+                    candidates.append((pod_ready(pod), pod.status.phase == "Running", job, pod))
+            # Ready pods first, then ones whose image is already pulled
+            candidates.sort(key=lambda candidate: candidate[:2], reverse=True)
+            for _, _, job, pod in candidates:
+                try:
+                    await k8s_call(core_v1.patch_namespaced_pod, name=pod.metadata.name, namespace="default",
+                                   body={"metadata": {"labels": {"app": pod_label, "pool-state": "claimed"}}})
+                    await k8s_call(batch_v1.patch_namespaced_job, name=job.metadata.name, namespace="default",
+                                   body={"metadata": {"labels": {"pool-state": "claimed", "notebook-session": session_name}},
+                                         "spec": {"ttlSecondsAfterFinished": ttl_seconds}})
+                except client.exceptions.ApiException as e:
+                    logging.error(f"Could not claim pool notebook '{job.metadata.name}': {e}")
+                    continue
+                self.claimed[job.metadata.name] = time.time()
+                self.claims += 1
+                logging.info(f"Pool notebook '{job.metadata.name}' claimed for '{pod_label}'")
+                asyncio.create_task(self.refill())
+                return job.metadata.name, jupyter_job_token(job)
+            self.misses += 1
+            return None
+
+    async def refill(self):
+        if self.refilling is None or self.refilling.locked() or not job_informer.synced.is_set():
+            return
+        from scheduling import suspensions
+        # While workloads are wound down the pool is emptied, not refilled
+        sizes = {image: 0 for image in self.sizes} if suspensions.active else self.sizes
+        async with self.refilling:
+            self.forget_seen()
+            idle = self.idle()
+            for job in idle:
+                # Pools of images that are no longer configured are drained
+                if job.metadata.labels.get("notebook-pool") not in self.labels:
+                    await self.remove(job.metadata.name)
+            for label, image_name in self.labels.items():
+                members = [job.metadata.name for job in idle if job.metadata.labels.get("notebook-pool") == label]
+                members += [name for name, (created_label, _) in self.created.items() if created_label == label]
+                for name in members[sizes[image_name]:]:
+                    await self.remove(name)
+                for _ in range(sizes[image_name] - len(members)):
+                    job_name = f"notebook-pool-{secrets.token_hex(5)}"
+                    try:
+                        await create_jupyter_job(job_name, "default", image_name, generate_random_token(16),
+                                                 NOTEBOOK_PORT, NOTEBOOK_POOL_TTL,
+                                                 labels={"notebook-pool": label, "pool-state": "idle"})
+                    except (client.exceptions.ApiException, HTTPException) as e:
+                        logging.error(f"Could not start pool notebook for '{image_name}': {e}")
+                        break
+                    self.created[job_name] = (label, time.time())
+
+    async def remove(self, job_name: str):
+        try:
+            await k8s_call(batch_v1.delete_namespaced_job, name=job_name, namespace="default",
+                           propagation_policy="Background")
+        except client.exceptions.ApiException as e:
+            if e.status != 404:
+                logging.error(f"Could not remove pool notebook '{job_name}': {e}")
+
+    def summary(self) -> dict:
+        images = []
+        for label, image_name in self.labels.items():
+            pods = [self.pod(job) for job in self.idle(label)]
+            images.append({
+                "image_name": image_name,
+                "size": self.sizes[image_name],
+                "idle": len(pods),
+                "ready": sum(1 for pod in pods if pod is not None and pod_ready(pod))
+            })
+        total = self.claims + self.misses
+        return {
+            "images": images,
+            "claims": self.claims,
+            "misses": self.misses,
+            "hit_rate": self.claims / total if total else None
+        }
+
+notebook_pool = NotebookPool(NOTEBOOK_POOL)
+
+@router.get("/ephemeral_notebook/pool")
+async def notebook_pool_status():
+    return notebook_pool.summary()
+
+# Notebook sessions only end when Jupyter exits, so abandoned ones are
+# culled: every NOTEBOOK_CULL_INTERVAL seconds each session's Jupyter is
+# asked for its last activity through the session's Service, and sessions
+# idle for NOTEBOOK_IDLE_TIMEOUT seconds are closed. A busy kernel counts as
+# activity, and so does an open browser connection unless
+# NOTEBOOK_CULL_CONNECTED is set. A session Jupyter never answered for is
+# idle since its Job was created.
+NOTEBOOK_IDLE_TIMEOUT = int(os.getenv("NOTEBOOK_IDLE_TIMEOUT", "3600"))
+NOTEBOOK_CULL_INTERVAL = int(os.getenv("NOTEBOOK_CULL_INTERVAL", "60"))
+NOTEBOOK_CULL_CONNECTED = os.getenv("NOTEBOOK_CULL_CONNECTED", "false").lower() == "true"
+NOTEBOOK_SERVICE_URL = os.getenv("NOTEBOOK_SERVICE_URL", "http://{service}.default.svc.cluster.local:{port}")
+NOTEBOOK_STATUS_TIMEOUT = 5
+
+def parse_timestamp(text: str) -> float:
+    # Jupyter reports ISO 8601 UTC times, e.g. 2024-05-01T10:00:00.123456Z
+    text = text.rstrip("Z").split("+")[0]
+    seconds, _, fraction = text.partition(".")
+    return calendar.timegm(time.strptime(seconds, "%Y-%m-%dT%H:%M:%S")) + float(f"0.{fraction or 0}")
+
+class NotebookActivityMonitor:
+    """
+    Polls the Jupyter REST API of every notebook session and culls idle
+    ones. The last poll of each session is kept for the listing.
+    """
+
+    def __init__(self):
+        self.http = urllib3.PoolManager()
+        self.activity = {}
+        self.culled = 0
+
+    def sessions(self, include_suspended: bool = False) -> list:
+        # Suspended sessions hold no resources and are not culled
+        return [
+            job for job in job_informer.list()
+            if (job.metadata.labels or {}).get("notebook-session") and finished_condition(job) is None
+            and (include_suspended or not job.spec.suspend)
+        ]
+
+    def jupyter_status(self, job) -> Optional[dict]:
+        """
+        Returns {last_activity, connections, busy_kernels} from the
+        session's Jupyter, or None if it cannot be reached. Blocking.
+        """
+        session_name = job.metadata.labels["notebook-session"]
+        url = NOTEBOOK_SERVICE_URL.format(service=f"{session_name}-svc", port=NOTEBOOK_PORT)
+        headers = {"Authorization": f"token {jupyter_job_token(job)}"}
+        try:
+            status = self.http.request("GET", f"{url}/api/status", headers=headers,
+                                       timeout=NOTEBOOK_STATUS_TIMEOUT, retries=False)
+            kernels = self.http.request("GET", f"{url}/api/kernels", headers=headers,
+                                        timeout=NOTEBOOK_STATUS_TIMEOUT, retries=False)
+            if status.status != 200 or kernels.status != 200:
+                return None
+            status = json.loads(status.data)
+            kernels = json.loads(kernels.data)
+        except (urllib3.exceptions.HTTPError, ValueError):
+            return None
+        return {
+            "last_activity": parse_timestamp(status["last_activity"]),
+            "connections": status.get("connections", 0),
+            "busy_kernels": sum(1 for kernel in kernels if kernel.get("execution_state") == "busy"),
+            "kernels": len(kernels)
+        }
+
+    def poll(self, job) -> dict:
+        name = job.metadata.name
+        now = time.time()
+        previous = self.activity.get(name, {
+            "last_activity": job.metadata.creation_timestamp.timestamp(),
+            "reachable": False
+        })
+        status = self.jupyter_status(job)
+        if status is None:
+            activity = {**previous, "reachable": False, "checked_at": now}
+        else:
+            last_activity = status["last_activity"]
+            if status["busy_kernels"] or (status["connections"] and not NOTEBOOK_CULL_CONNECTED):
+                last_activity = now
+            activity = {**status, "last_activity": max(last_activity, previous["last_activity"]),
+                        "reachable": True, "checked_at": now}
+        activity["idle_seconds"] = now - activity["last_activity"]
+        self.activity[name] = activity
+        return activity
+
+    def resumed(self, job_name: str):
+        """
+        Restarts a resumed session's idle time, which would otherwise still
+        count from before it was suspended.
+        """
+        self.activity[job_name] = {"last_activity": time.time(), "reachable": False}
+
+    async def cull(self):
+        jobs = self.sessions()
+        # Suspended sessions keep their entry, so a resume the informer has
+        # not reported yet does not lose the reset idle time
+        live = {job.metadata.name for job in self.sessions(include_suspended=True)}
+        self.activity = {name: activity for name, activity in self.activity.items() if name in live}
+        results = await asyncio.gather(*(run_in_threadpool(self.poll, job) for job in jobs))
+        for job, activity in zip(jobs, results):
+            if activity["idle_seconds"] < NOTEBOOK_IDLE_TIMEOUT:
+                continue
+            session_name = job.metadata.labels["notebook-session"]
+            logging.info(f"Culling notebook session '{session_name}', idle for {activity['idle_seconds']:.0f}s")
+            await close_notebook_session({
+                "job_name": job.metadata.name,
+                "service_name": f"{session_name}-svc",
+                "ingress_name": f"{session_name}-ing"
+            })
+            self.activity.pop(job.metadata.name, None)
+            self.culled += 1
+
+notebook_monitor = NotebookActivityMonitor()
+
+def container_resources(pod, kind: str) -> dict:
+    """
+    Sums the CPU (cores) and memory (bytes) requests or limits of a pod.
+    """
+    totals = {"cpu": 0.0, "memory": 0}
+    for container in pod.spec.containers:
+        values = (getattr(container.resources, kind) if container.resources else None) or {}
+        for resource in totals:
+            if resource in values:
+                totals[resource] += type(totals[resource])(parse_quantity(values[resource]))
+    return totals
+
+async def pod_usage() -> dict:
+    """
+    Current CPU and memory use per pod from metrics-server, or {} if it is
+    not installed.
+    """
+    try:
+        metrics = await k8s_call(custom_objects.list_namespaced_custom_object, group="metrics.k8s.io",
+                                 version="v1beta1", namespace="default", plural="pods")
+    except (client.exceptions.ApiException, HTTPException):
+        return {}
+    usage = {}
+    for item in metrics.get("items", []):
+        totals = {"cpu": 0.0, "memory": 0}
+        for container in item.get("containers", []):
+            totals["cpu"] += float(parse_quantity(container["usage"].get("cpu", "0")))
+            totals["memory"] += int(parse_quantity(container["usage"].get("memory", "0")))
+        usage[item["metadata"]["name"]] = totals
+    return usage
+
+@router.get("/ephemeral_notebooks/")
+async def list_notebook_sessions():
+    """
+    Lists notebook sessions with their activity and the resources they
+    hold (requests), may use (limits) and use (metrics-server, if any).
+    """
+    usage = await pod_usage()
+    sessions = []
+    totals = {"cpu": 0.0, "memory": 0}
+    for job in notebook_monitor.sessions(include_suspended=True):
+        pods = [pod for pod in pod_informer.by_index(job.metadata.name) if pod.status.phase in ("Pending", "Running")]
+        pod = pods[0] if pods else None
+        requests = container_resources(pod, "requests") if pod else None
+        if requests:
+            totals = {resource: totals[resource] + requests[resource] for resource in totals}
+        sessions.append({
+            "session_name": job.metadata.labels["notebook-session"],
+            "job_name": job.metadata.name,
+            "image_name": job.spec.template.spec.containers[0].image,
+            "created_at": job.metadata.creation_timestamp.timestamp(),
+            "pod_name": pod.metadata.name if pod else None,
+            "phase": pod.status.phase if pod else None,
+            "node_name": pod.spec.node_name if pod else None,
+            "suspended": bool(job.spec.suspend),
+            "requests": requests,
+            "limits": container_resources(pod, "limits") if pod else None,
+            "usage": usage.get(pod.metadata.name) if pod else None,
+            "activity": notebook_monitor.activity.get(job.metadata.name)
+        })
+    return {
+        "sessions": sorted(sessions, key=lambda session: session["created_at"]),
+        "requested": totals,
+        "idle_timeout": NOTEBOOK_IDLE_TIMEOUT,
+        "culled": notebook_monitor.culled
+    }
+
+@router.delete("/ephemeral_notebooks/{session_name}")
+async def delete_notebook_session(session_name: str):
+    jobs = notebook_session_jobs(session_name)
+    if not jobs:
+        raise HTTPException(status_code=404, detail=f"Notebook session '{session_name}' not found.")
+    await close_notebook_session({
+        "job_name": jobs[0].metadata.name,
+        "service_name": f"{session_name}-svc",
+        "ingress_name": f"{session_name}-ing"
+    })
+    return {"message": f"Notebook session '{session_name}' closed."}
+
+def notebook_session_jobs(session_name: str) -> list:
+    return [job for job in notebook_monitor.sessions(include_suspended=True)
+            if job.metadata.labels["notebook-session"] == session_name]
+
@@ -0,0 +1,333 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from typing import Optional
+
+import urllib3
+from fastapi import APIRouter, HTTPException
+from kubernetes import client
+from starlette.concurrency import run_in_threadpool
+
+from builds import REGISTRY, build_queue, image_cache
+from executions import pipelines
+from kube import (
+    K8S_TIMEOUT, batch_v1, cached_job_pods, control_plane_placement, finished_condition,
+    job_informer, k8s_call, log_core_v1
+)
+from storage import UPLOAD_DIRECTORY, read_json, write_json
+
+router = APIRouter()
+
+# Retention of per-upload images in the registry. Every build pushes its own
+# repository, {job_name}-kaniko-build-{upload_id}. A retention run keeps the
+# newest REGISTRY_KEEP_PER_JOB builds of each job name, builds still in use
+# by a pipeline and images referenced by the image cache (entries unused for
+# IMAGE_CACHE_RETENTION seconds are expired first), and deletes the
+# manifests of the rest. Base images and the Kaniko layer cache are never
+# touched. Deleting manifests only unlinks them; the blobs are freed by a
+# registry garbage-collect job, which runs once no build is running and
+# holds the build queue until it is done, since the registry must not be
+# written to meanwhile. The registry needs REGISTRY_STORAGE_DELETE_ENABLED.
+REGISTRY_URL = os.getenv("REGISTRY_URL", f"https://{REGISTRY}")
+REGISTRY_CA_CERT = os.getenv("REGISTRY_CA_CERT", "/certs/ca.crt")
+REGISTRY_KEEP_PER_JOB = int(os.getenv("REGISTRY_KEEP_PER_JOB", "3"))
+REGISTRY_GC_INTERVAL = int(os.getenv("REGISTRY_GC_INTERVAL", str(24 * 3600)))
+REGISTRY_GC_HISTORY = 20
+REGISTRY_PVC = os.getenv("REGISTRY_PVC", "registry-pvc")
+IMAGE_CACHE_RETENTION = int(os.getenv("IMAGE_CACHE_RETENTION", str(14 * 24 * 3600)))
+REGISTRY_GC_DIRECTORY = os.path.join(UPLOAD_DIRECTORY, ".registry-gc")
+BUILD_REPOSITORY_RE = re.compile(r"^(?P<job_name>.+)-kaniko-build-(?P<upload_id>[0-9a-f-]+)$")
+MANIFEST_TYPES = ", ".join([
+    "application/vnd.docker.distribution.manifest.v2+json",
+    "application/vnd.oci.image.manifest.v1+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.oci.image.index.v1+json",
+])
+
+class RegistryClient:
+    """
+    Minimal Docker Registry HTTP API v2 client: just what retention needs.
+    """
+
+    def __init__(self, url: str, ca_cert: str):
+        self.url = url.rstrip("/")
+        if os.getenv("KANIKO_INSECURE", "false").lower() == "true":
+            self.http = urllib3.PoolManager(cert_reqs="CERT_NONE")
+        else:
+            self.http = urllib3.PoolManager(ca_certs=ca_cert if os.path.exists(ca_cert) else None)
+
+    def request(self, method: str, path: str, headers: Optional[dict] = None):
+        response = self.http.request(method, f"{self.url}{path}", headers=headers, timeout=K8S_TIMEOUT)
+        if response.status >= 400 and response.status != 404:
+            raise RuntimeError(f"Registry {method} {path} failed with status {response.status}")
+        return response
+
+    def repositories(self) -> list:
+        repositories = []
+        path = "/v2/_catalog?n=1000"
+        while path:
+            response = self.request("GET", path)
+            repositories += json.loads(response.data).get("repositories") or []
+            # Pagination follows RFC 5988 Link headers
+            match = re.match(r'<([^>]+)>;\s*rel="next"', response.headers.get("Link", ""))
+            path = match.group(1) if match else None
+        return repositories
+
+    def tags(self, repository: str) -> list:
+        response = self.request("GET", f"/v2/{repository}/tags/list")
+        return (json.loads(response.data).get("tags") or []) if response.status == 200 else []
+
+    def manifest(self, repository: str, reference: str) -> Optional[tuple]:
+        """
+        Returns (digest, {blob digest: size}) for a manifest, or None if it
+        does not exist.
+        """
+        response = self.request("GET", f"/v2/{repository}/manifests/{reference}", {"Accept": MANIFEST_TYPES})
+        if response.status == 404:
+            return None
+        manifest = json.loads(response.data)
+        digest = response.headers.get("Docker-Content-Digest") or f"sha256:{hashlib.sha256(response.data).hexdigest()}"
+        blobs = {layer["digest"]: layer.get("size", 0) for layer in manifest.get("layers", [])}
+        if manifest.get("config"):
+            blobs[manifest["config"]["digest"]] = manifest["config"].get("size", 0)
+        return digest, blobs
+
+    def delete_manifest(self, repository: str, digest: str):
+        self.request("DELETE", f"/v2/{repository}/manifests/{digest}")
+
+class RegistryJanitor:
+    """
+    Plans and runs retention: manifest deletion right away, then the
+    garbage-collect job. Runs are recorded in REGISTRY_GC_DIRECTORY.
+    """
+
+    def __init__(self, directory: str, registry: RegistryClient):
+        self.directory = directory
+        self.registry = registry
+        self.run = None
+        self.loop = None
+        self.collecting = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.collecting = asyncio.Lock()
+        runs = self.runs()
+        # A garbage collection interrupted by a restart is picked up again
+        if runs and runs[0]["gc_state"] in ("pending", "running"):
+            self.run = runs[0]
+            build_queue.hold("registry-gc")
+
+    def save(self, run: dict):
+        write_json(os.path.join(self.directory, f"{run['run_id']}.json"), run)
+
+    def runs(self) -> list:
+        runs = [read_json(entry.path) for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+        return sorted((run for run in runs if run), key=lambda run: run["started_at"], reverse=True)
+
+    def plan(self) -> dict:
+        """
+        Decides which build repositories to keep and which to delete. Blocking;
+        runs on the threadpool.
+        """
+        pipeline_by_build = {p["build_job"]: p for p in pipelines.list() if p["build_job"]}
+        # Pipelines that reuse a cached image point at another build's
+        # repository, which the cache entry alone may no longer protect
+        in_use = {p["image_name"] for p in pipelines.list() if p["state"] in ("building", "queued", "running")}
+        cached = {entry["image_name"] for entry in image_cache.entries() if entry}
+
+        by_job = {}
+        for repository in self.registry.repositories():
+            match = BUILD_REPOSITORY_RE.match(repository)
+            if match:
+                by_job.setdefault(match.group("job_name"), []).append(repository)
+
+        keep, delete = [], []
+        for repositories in by_job.values():
+            repositories.sort(key=lambda r: pipeline_by_build.get(r, {}).get("created_at", 0), reverse=True)
+            for position, repository in enumerate(repositories):
+                if position < REGISTRY_KEEP_PER_JOB or repository in in_use or repository in cached:
+                    keep.append(repository)
+                else:
+                    delete.append(repository)
+        return {"keep": sorted(keep), "delete": sorted(delete)}
+
+    def manifests(self, repositories: list) -> dict:
+        manifests = {}
+        for repository in repositories:
+            for tag in self.registry.tags(repository):
+                manifest = self.registry.manifest(repository, tag)
+                if manifest:
+                    manifests[(repository, manifest[0])] = manifest[1]
+        return manifests
+
+    def delete(self, plan: dict, dry_run: bool) -> tuple:
+        """
+        Deletes the manifests of planned repositories and returns (deleted
+        manifests, bytes of blobs no kept image references).
+        """
+        kept_blobs = set()
+        for blobs in self.manifests(plan["keep"]).values():
+            kept_blobs.update(blobs)
+        deleted = []
+        freed = {}
+        for (repository, digest), blobs in self.manifests(plan["delete"]).items():
+            if not dry_run:
+                self.registry.delete_manifest(repository, digest)
+            deleted.append({"repository": repository, "digest": digest})
+            freed.update({blob: size for blob, size in blobs.items() if blob not in kept_blobs})
+        return deleted, sum(freed.values())
+
+    async def collect(self, dry_run: bool = False) -> dict:
+        """
+        Runs retention; a dry run only reports what it would delete and is
+        not recorded.
+        """
+        if not dry_run and (self.collecting.locked() or self.run is not None):
+            raise HTTPException(status_code=409, detail="A registry retention run is already in progress.")
+        async with self.collecting:
+            expired = [] if dry_run else await run_in_threadpool(image_cache.expire, IMAGE_CACHE_RETENTION)
+            try:
+                plan = await run_in_threadpool(self.plan)
+                deleted, estimated = await run_in_threadpool(self.delete, plan, dry_run)
+            except (urllib3.exceptions.HTTPError, RuntimeError) as e:
+                logging.error(f"Registry retention failed: {e}")
+                raise HTTPException(status_code=502, detail=f"Registry retention failed: {e}")
+            run = {
+                "run_id": uuid.uuid4().hex,
+                "started_at": time.time(),
+                "dry_run": dry_run,
+                "expired_cache_entries": len(expired),
+                "kept": len(plan["keep"]),
+                "deleted": deleted,
+                "estimated_reclaimed_bytes": estimated,
+                "reclaimed_bytes": None,
+                "gc_job": None,
+                "gc_state": "skipped" if dry_run or not deleted else "pending",
+                "finished_at": None
+            }
+            if dry_run:
+                return run
+            if run["gc_state"] == "skipped":
+                run["finished_at"] = time.time()
+            else:
+                self.run = run
+                build_queue.hold("registry-gc")
+            self.save(run)
+            logging.info(f"Registry retention deleted {len(deleted)} manifest(s), ~{estimated} bytes to reclaim")
+        await self.advance()
+        return run
+
+    def on_job_event(self, event_type: str, job):
+        # Called on the informer thread; the run advances on the event loop
+        if self.loop is not None and self.run is not None:
+            asyncio.run_coroutine_threadsafe(self.advance(), self.loop)
+
+    async def advance(self):
+        run = self.run
+        if run is None:
+            return
+        if run["gc_state"] == "pending" and not build_queue.running() and job_informer.synced.is_set():
+            run["gc_job"] = f"registry-gc-{run['run_id'][:12]}"
+            run["gc_state"] = "running"
+            self.save(run)
+            if not await create_registry_gc_job(run["gc_job"]):
+                await self.finish(run, "failed")
+        elif run["gc_state"] == "running":
+            gc_job = job_informer.get(run["gc_job"])
+            condition = finished_condition(gc_job) if gc_job is not None else None
+            if condition == "Complete":
+                run["reclaimed_bytes"] = await registry_gc_reclaimed_bytes(run["gc_job"])
+                await self.finish(run, "succeeded")
+            elif condition == "Failed":
+                await self.finish(run, "failed")
+
+    async def finish(self, run: dict, state: str):
+        run["gc_state"] = state
+        run["finished_at"] = time.time()
+        self.save(run)
+        self.run = None
+        for old in self.runs()[REGISTRY_GC_HISTORY:]:
+            os.remove(os.path.join(self.directory, f"{old['run_id']}.json"))
+        logging.info(f"Registry garbage collection {state}, reclaimed {run['reclaimed_bytes']} bytes")
+        await build_queue.release("registry-gc")
+
+async def create_registry_gc_job(job_name: str) -> bool:
+    # Runs next to the registry on the control-plane node, since the
+    # registry volume is ReadWriteOnce
+    script = (
+        "before=$(du -sk /var/lib/registry | cut -f1) && "
+        "registry garbage-collect --delete-untagged /etc/docker/registry/config.yml && "
+        "after=$(du -sk /var/lib/registry | cut -f1) && "
+        "echo \"reclaimed_kib=$((before - after))\""
+    )
+    job_manifest = {
+        "apiVersion": "batch/v1",
+        "kind": "Job",
+        "metadata": {"name": job_name, "labels": {"app": "registry-gc"}},
+        "spec": {
+            "ttlSecondsAfterFinished": 3600,
+            "backoffLimit": 0,
+            "template": {
+                "metadata": {"labels": {"app": "registry-gc"}},
+                "spec": {
+                    **control_plane_placement(),
+                    "restartPolicy": "Never",
+                    "containers": [{
+                        "name": "registry-gc",
+                        "image": "registry:2",
+                        "command": ["sh", "-c", script],
+                        "volumeMounts": [{"name": "registry-storage", "mountPath": "/var/lib/registry"}]
+                    }],
+                    "volumes": [{"name": "registry-storage", "persistentVolumeClaim": {"claimName": REGISTRY_PVC}}]
+                }
+            }
+        }
+    }
+    try:
+        await k8s_call(batch_v1.create_namespaced_job, namespace="default", body=job_manifest)
+        logging.info(f"Registry garbage-collect job '{job_name}' created successfully.")
+        return True
+    except client.exceptions.ApiException as e:
+        logging.error(f"Exception when creating registry garbage-collect job: {e}")
+        return False
+
+async def registry_gc_reclaimed_bytes(job_name: str) -> Optional[int]:
+    pods = (await cached_job_pods(job_name)).get(job_name, [])
+    if not pods:
+        return None
+    try:
+        log = await k8s_call(log_core_v1.read_namespaced_pod_log, name=pods[0].metadata.name, namespace="default")
+    except client.exceptions.ApiException as e:
+        logging.error(f"Could not read the log of '{job_name}': {e}")
+        return None
+    match = re.search(r"reclaimed_kib=(-?\d+)", log)
+    return int(match.group(1)) * 1024 if match else None
+
+registry_janitor = RegistryJanitor(REGISTRY_GC_DIRECTORY, RegistryClient(REGISTRY_URL, REGISTRY_CA_CERT))
+
+@router.get("/registry/retention")
+async def registry_retention_plan():
+    """
+    Previews what a retention run would delete without deleting anything.
+    """
+    return await registry_janitor.collect(dry_run=True)
+
+@router.post("/registry/gc")
+async def collect_registry_garbage():
+    return await registry_janitor.collect()
+
+@router.get("/registry/gc")
+async def list_registry_gc_runs():
+    return {
+        "policy": {"keep_per_job": REGISTRY_KEEP_PER_JOB, "image_cache_retention": IMAGE_CACHE_RETENTION},
+        "runs": registry_janitor.runs()
+    }
+
+def setup():
+    os.makedirs(REGISTRY_GC_DIRECTORY, exist_ok=True)
+    job_informer.listeners.append(registry_janitor.on_job_event)
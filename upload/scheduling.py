@@ -0,0 +1,630 @@
+import asyncio
+import functools
+import heapq
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from fastapi import APIRouter, HTTPException
+from kubernetes import client
+from starlette.concurrency import run_in_threadpool
+
+from builds import build_queue
+from executions import PIPELINE_GRACE_PERIOD, pipelines
+from kube import batch_v1, core_v1, finished_condition, job_informer, k8s_call
+from notebooks import notebook_monitor, notebook_pool, notebook_session_jobs
+from storage import CHECKPOINT_DIRECTORY, UPLOAD_DIRECTORY, read_json, write_json
+
+router = APIRouter()
+
+# Suspend and resume of execution jobs and notebook sessions through the
+# Job's suspend field: suspending deletes the pods, resuming starts new
+# ones. Workloads checkpoint to the shared volume under .checkpoints:
+# executions get SIGTERM and CHECKPOINT_GRACE_SECONDS to save state to
+# $CHECKPOINT_DIR, notebooks copy their working directory there in a
+# preStop hook and back in a postStart hook. SUSPEND_SCHEDULE and
+# RESUME_SCHEDULE are cron expressions (in SCHEDULE_TIMEZONE) that wind
+# everything down for the day and bring back what the policy suspended;
+# in between no builds start and the notebook pool is emptied.
+CHECKPOINT_RETENTION = 24 * 3600
+SUSPENSION_DIRECTORY = os.path.join(UPLOAD_DIRECTORY, ".suspensions")
+SUSPEND_SCHEDULE = os.getenv("SUSPEND_SCHEDULE")
+RESUME_SCHEDULE = os.getenv("RESUME_SCHEDULE")
+SCHEDULE_TIMEZONE = ZoneInfo(os.getenv("SCHEDULE_TIMEZONE", "UTC"))
+SCHEDULE_CHECK_INTERVAL = 20
+
+CRON_FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+def parse_cron_field(field: str, low: int, high: int) -> frozenset:
+    values = set()
+    for part in field.split(","):
+        part, _, step = part.partition("/")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(x) for x in part.split("-"))
+        else:
+            start = end = int(part)
+            if step:
+                end = high
+        step = int(step or 1)
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f"'{field}' is outside {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+@functools.lru_cache(maxsize=None)
+def parse_cron(expression: str) -> tuple:
+    """
+    Parses a standard five-field cron expression (minute hour day month
+    weekday; lists, ranges and steps, Sunday is 0 or 7) into the sets of
+    values each field allows, plus whether day and weekday are both
+    restricted. Raises ValueError for anything else.
+    """
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError(f"Cron expression '{expression}' does not have five fields")
+    try:
+        minutes, hours, days, months, weekdays = (
+            parse_cron_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELD_RANGES)
+        )
+    except ValueError as e:
+        raise ValueError(f"Invalid cron expression '{expression}': {e}")
+    weekdays = frozenset(weekday % 7 for weekday in weekdays)
+    return minutes, hours, days, months, weekdays, not fields[2].startswith("*") and not fields[4].startswith("*")
+
+def cron_matches(expression: str, moment: datetime) -> bool:
+    """
+    Matches a cron expression against a minute. As in cron, a day that
+    matches either the day of month or the weekday fires when both fields
+    are restricted.
+    """
+    minutes, hours, days, months, weekdays, either_day = parse_cron(expression)
+    day_matches = moment.day in days
+    weekday_matches = moment.isoweekday() % 7 in weekdays
+    return (
+        moment.minute in minutes
+        and moment.hour in hours
+        and moment.month in months
+        and (day_matches or weekday_matches if either_day else day_matches and weekday_matches)
+    )
+
+class SuspensionManager:
+    """
+    Suspends and resumes Jobs and records each suspension (manual or by
+    policy) in SUSPENSION_DIRECTORY, so the resume schedule only brings
+    back what the policy wound down. Whether the policy window is active is
+    kept in state.json and survives restarts.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.state_path = os.path.join(directory, "state.json")
+        self.active = False
+        self.fired = None
+
+    def load(self):
+        self.active = (read_json(self.state_path) or {}).get("active", False)
+
+    def path(self, job_name: str) -> str:
+        return os.path.join(self.directory, f"{job_name}.json")
+
+    def record(self, job_name: str, kind: str, reason: str, session_name: Optional[str] = None):
+        write_json(self.path(job_name), {
+            "job_name": job_name,
+            "kind": kind,
+            "session_name": session_name,
+            "reason": reason,
+            "suspended_at": time.time()
+        })
+
+    def entries(self) -> list:
+        entries = [read_json(entry.path) for entry in os.scandir(self.directory)
+                   if entry.name.endswith(".json") and entry.name != "state.json"]
+        return sorted((entry for entry in entries if entry), key=lambda entry: entry["suspended_at"])
+
+    async def suspend(self, job_name: str, kind: str, reason: str, session_name: Optional[str] = None):
+        await k8s_call(batch_v1.patch_namespaced_job, name=job_name, namespace="default",
+                       body={"spec": {"suspend": True}})
+        self.record(job_name, kind, reason, session_name)
+        logging.info(f"Suspended {kind} '{job_name}' ({reason})")
+
+    async def resume(self, job_name: str):
+        entry = read_json(self.path(job_name)) or {}
+        if entry.get("session_name"):
+            # New pods carry the Job's template labels, which for a claimed
+            # pool pod are not the ones the Service was selecting
+            await k8s_call(core_v1.patch_namespaced_service, name=f"{entry['session_name']}-svc",
+                           namespace="default",
+                           body={"spec": {"selector": {"app": None, "job-name": job_name}}})
+        await k8s_call(batch_v1.patch_namespaced_job, name=job_name, namespace="default",
+                       body={"spec": {"suspend": False}})
+        if entry.get("kind") == "notebook":
+            notebook_monitor.resumed(job_name)
+        try:
+            os.remove(self.path(job_name))
+        except FileNotFoundError:
+            pass
+        logging.info(f"Resumed '{job_name}'")
+
+    def workloads(self) -> list:
+        """
+        (job name, kind, session name) of every running execution and
+        notebook session.
+        """
+        workloads = []
+        for pipeline in pipelines.list():
+            job = job_informer.get(pipeline["name"]) if pipeline["state"] == "running" else None
+            if job is not None and not job.spec.suspend and finished_condition(job) is None:
+                workloads.append((job.metadata.name, "execution", None))
+        for job in notebook_monitor.sessions():
+            workloads.append((job.metadata.name, "notebook", job.metadata.labels["notebook-session"]))
+        return workloads
+
+    async def suspend_all(self):
+        self.set_active(True)
+        build_queue.hold("suspend-policy")
+        results = await asyncio.gather(
+            *(self.suspend(name, kind, "policy", session) for name, kind, session in self.workloads()),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logging.error(f"Could not suspend a workload: {result}")
+        await notebook_pool.refill()
+
+    async def resume_all(self):
+        self.set_active(False)
+        entries = [entry for entry in self.entries() if entry["reason"] == "policy"]
+        results = await asyncio.gather(*(self.resume(entry["job_name"]) for entry in entries),
+                                       return_exceptions=True)
+        for entry, result in zip(entries, results):
+            if isinstance(result, client.exceptions.ApiException) and result.status == 404:
+                os.remove(self.path(entry["job_name"]))
+            elif isinstance(result, Exception):
+                logging.error(f"Could not resume '{entry['job_name']}': {result}")
+        await build_queue.release("suspend-policy")
+        await admission_queue.dispatch()
+        await notebook_pool.refill()
+
+    def set_active(self, active: bool):
+        self.active = active
+        write_json(self.state_path, {"active": active, "changed_at": time.time()})
+
+    async def tick(self):
+        now = datetime.now(SCHEDULE_TIMEZONE).replace(second=0, microsecond=0)
+        if now == self.fired:
+            return
+        if SUSPEND_SCHEDULE and cron_matches(SUSPEND_SCHEDULE, now):
+            self.fired = now
+            logging.info("Suspend schedule reached, winding workloads down")
+            await self.suspend_all()
+        elif RESUME_SCHEDULE and cron_matches(RESUME_SCHEDULE, now):
+            self.fired = now
+            logging.info("Resume schedule reached, resuming workloads")
+            await self.resume_all()
+        await run_in_threadpool(self.remove_stale_checkpoints)
+
+    def remove_stale_checkpoints(self):
+        # Checkpoints of Jobs that are gone are kept for a day
+        if not job_informer.synced.is_set():
+            return
+        for kind in ("executions", "notebooks"):
+            kind_dir = os.path.join(CHECKPOINT_DIRECTORY, kind)
+            if not os.path.isdir(kind_dir):
+                continue
+            for entry in os.scandir(kind_dir):
+                if job_informer.get(entry.name) is None and time.time() - entry.stat().st_mtime > CHECKPOINT_RETENTION:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+
+suspensions = SuspensionManager(SUSPENSION_DIRECTORY)
+
+def suspendable_job(job_name: str) -> tuple:
+    """
+    Returns (kind, session name) of an execution job or notebook Job.
+    """
+    job = job_informer.get(job_name)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_name}' not found.")
+    session_name = (job.metadata.labels or {}).get("notebook-session")
+    if session_name:
+        return "notebook", session_name
+    if pipelines.get(job_name) is not None:
+        return "execution", None
+    raise HTTPException(status_code=400, detail=f"Job '{job_name}' is not an execution job or notebook.")
+
+@router.post("/jobs/{job_name}/suspend")
+async def suspend_job(job_name: str):
+    kind, session_name = suspendable_job(job_name)
+    await suspensions.suspend(job_name, kind, "manual", session_name)
+    return {"message": f"Job '{job_name}' suspended.", "job_name": job_name}
+
+@router.post("/jobs/{job_name}/resume")
+async def resume_job(job_name: str):
+    suspendable_job(job_name)
+    await suspensions.resume(job_name)
+    return {"message": f"Job '{job_name}' resumed.", "job_name": job_name}
+
+@router.post("/ephemeral_notebooks/{session_name}/suspend")
+async def suspend_notebook_session(session_name: str):
+    jobs = notebook_session_jobs(session_name)
+    if not jobs:
+        raise HTTPException(status_code=404, detail=f"Notebook session '{session_name}' not found.")
+    return await suspend_job(jobs[0].metadata.name)
+
+@router.post("/ephemeral_notebooks/{session_name}/resume")
+async def resume_notebook_session(session_name: str):
+    jobs = notebook_session_jobs(session_name)
+    if not jobs:
+        raise HTTPException(status_code=404, detail=f"Notebook session '{session_name}' not found.")
+    return await resume_job(jobs[0].metadata.name)
+
+@router.get("/suspensions/")
+async def list_suspensions():
+    return {
+        "policy": {
+            "suspend_schedule": SUSPEND_SCHEDULE,
+            "resume_schedule": RESUME_SCHEDULE,
+            "timezone": str(SCHEDULE_TIMEZONE),
+            "active": suspensions.active
+        },
+        "suspended": await run_in_threadpool(suspensions.entries)
+    }
+
+@router.post("/suspensions/suspend_all")
+async def suspend_all_workloads():
+    await suspensions.suspend_all()
+    return {"message": "Workloads suspended.", "suspended": len(await run_in_threadpool(suspensions.entries))}
+
+@router.post("/suspensions/resume_all")
+async def resume_all_workloads():
+    await suspensions.resume_all()
+    return {"message": "Workloads resumed."}
+
+# Admission of execution jobs. Executions are created suspended once their
+# image is built and wait in a persistent queue under .admission-queue; the
+# queue starts them (suspend=false) while fewer than
+# MAX_CONCURRENT_EXECUTIONS are running, only in minutes that match the
+# ADMISSION_WINDOW cron expression (in SCHEDULE_TIMEZONE; unset means any
+# time) and never while the suspend policy has workloads wound down. The
+# highest priority goes first; within a priority the user with the fewest
+# running executions, then the one served longest ago, then FIFO.
+# MAX_EXECUTIONS_PER_USER (0 for no limit) caps any one user.
+ADMISSION_QUEUE_DIRECTORY = os.path.join(UPLOAD_DIRECTORY, ".admission-queue")
+MAX_CONCURRENT_EXECUTIONS = max(1, int(os.getenv("MAX_CONCURRENT_EXECUTIONS", "4")))
+MAX_EXECUTIONS_PER_USER = int(os.getenv("MAX_EXECUTIONS_PER_USER", "0"))
+MAX_EXECUTION_PRIORITY = int(os.getenv("MAX_EXECUTION_PRIORITY", "10"))
+ADMISSION_WINDOW = os.getenv("ADMISSION_WINDOW")
+ADMISSION_CHECK_INTERVAL = 30
+# Start estimates assume the median run time of recent executions
+ADMISSION_DURATION_SAMPLES = 50
+ADMISSION_DEFAULT_DURATION = int(os.getenv("ADMISSION_DEFAULT_DURATION", "1800"))
+
+def execution_priority(value) -> int:
+    try:
+        priority = int(value or 0)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="priority must be an integer.")
+    if abs(priority) > MAX_EXECUTION_PRIORITY:
+        raise HTTPException(status_code=400,
+                            detail=f"priority must be between {-MAX_EXECUTION_PRIORITY} and {MAX_EXECUTION_PRIORITY}.")
+    return priority
+
+def next_cron_match(expression: str, after: float) -> Optional[float]:
+    """
+    Returns after if its minute matches expression, otherwise the start of
+    the next matching minute within a week.
+    """
+    moment = datetime.fromtimestamp(after, SCHEDULE_TIMEZONE).replace(second=0, microsecond=0)
+    if cron_matches(expression, moment):
+        return after
+    for _ in range(7 * 24 * 60):
+        moment = datetime.fromtimestamp(moment.timestamp() + 60, SCHEDULE_TIMEZONE)
+        if cron_matches(expression, moment):
+            return moment.timestamp()
+    return None
+
+class AdmissionQueue:
+    """
+    Persistent queue of suspended execution jobs, one JSON file per queued
+    job. Jobs are started by dispatch(), which runs after every submission,
+    whenever a job event may have freed a slot and periodically for the
+    admission window.
+    """
+
+    def __init__(self, directory: str, max_running: int, max_per_user: int):
+        self.directory = directory
+        self.max_running = max_running
+        self.max_per_user = max_per_user
+        self.queued = {}
+        self.admitted = {}
+        self.last_admitted = {}
+        self.sequence = 0
+        self.loop = None
+        self.lock = threading.Lock()
+        self.dispatching = None
+
+    def load(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                entry = read_json(os.path.join(self.directory, name))
+                if entry:
+                    self.queued[entry["job_name"]] = entry
+                    self.sequence = max(self.sequence, entry["sequence"])
+        # Executions created just before a restart may not have been queued
+        for pipeline in pipelines.list():
+            if pipeline["state"] == "queued" and pipeline["name"] not in self.queued:
+                self.enqueue(pipeline["name"], pipeline["user"], pipeline["priority"])
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.dispatching = asyncio.Lock()
+
+    def path(self, job_name: str) -> str:
+        return os.path.join(self.directory, f"{job_name}.json")
+
+    def enqueue(self, job_name: str, user: str, priority: int):
+        with self.lock:
+            self.sequence += 1
+            entry = {
+                "job_name": job_name,
+                "user": user,
+                "priority": priority,
+                "sequence": self.sequence,
+                "enqueued_at": time.time()
+            }
+            write_json(self.path(job_name), entry)
+            self.queued[job_name] = entry
+
+    async def submit(self, job_name: str, user: str, priority: int = 0):
+        self.enqueue(job_name, user, priority)
+        await self.dispatch()
+
+    def is_queued(self, job_name: str) -> bool:
+        with self.lock:
+            return job_name in self.queued
+
+    def entries(self) -> list:
+        with self.lock:
+            return sorted(self.queued.values(), key=lambda entry: (-entry["priority"], entry["sequence"]))
+
+    def running(self) -> dict:
+        """
+        Job name to user of every execution that is running, including ones
+        just admitted that the informer still reports as suspended.
+        """
+        running = {}
+        now = time.time()
+        for pipeline in pipelines.list():
+            if pipeline["state"] not in ("queued", "running"):
+                continue
+            job = job_informer.get(pipeline["name"])
+            if job is not None and not job.spec.suspend and finished_condition(job) is None:
+                running[pipeline["name"]] = pipeline["user"]
+        with self.lock:
+            self.admitted = {
+                name: (user, admitted_at) for name, (user, admitted_at) in self.admitted.items()
+                if name not in running and now - admitted_at < PIPELINE_GRACE_PERIOD
+            }
+            running.update({name: user for name, (user, _) in self.admitted.items()})
+        return running
+
+    def next_entry(self, entries: list, per_user: Counter, last_admitted: dict) -> Optional[dict]:
+        eligible = [
+            entry for entry in entries
+            if not self.max_per_user or per_user[entry["user"]] < self.max_per_user
+        ]
+        if not eligible:
+            return None
+        return min(eligible, key=lambda entry: (
+            -entry["priority"], per_user[entry["user"]], last_admitted.get(entry["user"], 0), entry["sequence"]
+        ))
+
+    def admission_time(self, after: float) -> Optional[float]:
+        """
+        Earliest time from after at which jobs may be admitted, or None if
+        not within a week.
+        """
+        if suspensions.active:
+            if not RESUME_SCHEDULE:
+                return None
+            after = max(after, next_cron_match(RESUME_SCHEDULE, time.time()) or float("inf"))
+        if ADMISSION_WINDOW and after != float("inf"):
+            return next_cron_match(ADMISSION_WINDOW, after)
+        return after if after != float("inf") else None
+
+    def admitting(self) -> bool:
+        if suspensions.active:
+            return False
+        now = datetime.now(SCHEDULE_TIMEZONE).replace(second=0, microsecond=0)
+        return not ADMISSION_WINDOW or cron_matches(ADMISSION_WINDOW, now)
+
+    def on_job_event(self, event_type: str, job):
+        # Called on the informer thread; jobs are admitted on the event loop
+        if self.loop is None:
+            return
+        if event_type in ("SYNC", "DELETED") or finished_condition(job) is not None:
+            asyncio.run_coroutine_threadsafe(self.dispatch(), self.loop)
+
+    async def dispatch(self):
+        if self.dispatching is None or not job_informer.synced.is_set():
+            return
+        async with self.dispatching:
+            self.prune()
+            if not self.admitting():
+                return
+            while True:
+                running = self.running()
+                if len(running) >= self.max_running:
+                    return
+                entry = self.next_entry(self.entries(), Counter(running.values()), self.last_admitted)
+                if entry is None or not await self.admit(entry):
+                    return
+
+    def prune(self):
+        # Jobs that were deleted, or resumed by hand, leave the queue
+        for entry in self.entries():
+            job = job_informer.get(entry["job_name"])
+            if job is not None and job.spec.suspend:
+                continue
+            if job is None and time.time() - entry["enqueued_at"] < PIPELINE_GRACE_PERIOD:
+                continue
+            self.remove(entry["job_name"])
+            pipeline = pipelines.get(entry["job_name"])
+            if job is not None and pipeline is not None and pipeline["state"] == "queued":
+                pipeline["started_at"] = time.time()
+                pipelines.update(pipeline, "running")
+
+    def remove(self, job_name: str):
+        with self.lock:
+            self.queued.pop(job_name, None)
+        try:
+            os.remove(self.path(job_name))
+        except FileNotFoundError:
+            pass
+
+    async def admit(self, entry: dict) -> bool:
+        job_name = entry["job_name"]
+        try:
+            await k8s_call(batch_v1.patch_namespaced_job, name=job_name, namespace="default",
+                           body={"spec": {"suspend": False}})
+        except client.exceptions.ApiException as e:
+            if e.status != 404:
+                logging.error(f"Could not admit execution job '{job_name}': {e}")
+                return False
+            logging.error(f"Queued execution job '{job_name}' no longer exists")
+            self.remove(job_name)
+            return True
+        now = time.time()
+        with self.lock:
+            self.admitted[job_name] = (entry["user"], now)
+            self.last_admitted[entry["user"]] = now
+        self.remove(job_name)
+        pipeline = pipelines.get(job_name)
+        if pipeline is not None and pipeline["state"] == "queued":
+            pipeline["started_at"] = now
+            pipelines.update(pipeline, "running")
+        logging.info(f"Execution '{job_name}' of '{entry['user']}' admitted after waiting {now - entry['enqueued_at']:.1f}s")
+        return True
+
+    def typical_duration(self) -> float:
+        finished = sorted(
+            (p for p in pipelines.list() if p["state"] in ("succeeded", "failed") and p.get("started_at")),
+            key=lambda p: p["updated_at"]
+        )[-ADMISSION_DURATION_SAMPLES:]
+        durations = sorted(p["updated_at"] - p["started_at"] for p in finished)
+        return durations[len(durations) // 2] if durations else ADMISSION_DEFAULT_DURATION
+
+    def estimates(self) -> dict:
+        """
+        Replays the admission order against the running executions, each
+        assumed to take typical_duration(), and returns job name to
+        (position, estimated start time or None).
+        """
+        now = time.time()
+        duration = self.typical_duration()
+        running = self.running()
+        ends = []
+        for name, user in running.items():
+            pipeline = pipelines.get(name) or {}
+            heapq.heappush(ends, (max(now, pipeline.get("started_at", now) + duration), user))
+        per_user = Counter(running.values())
+        with self.lock:
+            last_admitted = dict(self.last_admitted)
+        pending = self.entries()
+        estimates = {}
+        at = now
+        while pending:
+            while len(ends) >= self.max_running:
+                end, user = heapq.heappop(ends)
+                at = max(at, end)
+                per_user[user] -= 1
+            start = self.admission_time(at)
+            entry = self.next_entry(pending, per_user, last_admitted)
+            if entry is None:
+                end, user = heapq.heappop(ends)
+                at = max(at, end)
+                per_user[user] -= 1
+                continue
+            pending.remove(entry)
+            estimates[entry["job_name"]] = (len(estimates) + 1, start)
+            if start is None:
+                continue
+            at = start
+            per_user[entry["user"]] += 1
+            last_admitted[entry["user"]] = start
+            heapq.heappush(ends, (start + duration, entry["user"]))
+        return estimates
+
+    def position(self, job_name: str) -> dict:
+        with self.lock:
+            entry = self.queued.get(job_name)
+        if entry is None:
+            raise HTTPException(status_code=404, detail=f"Execution job '{job_name}' is not queued.")
+        position, start = self.estimates().get(job_name, (None, None))
+        return {
+            "job_name": job_name,
+            "user": entry["user"],
+            "priority": entry["priority"],
+            "position": position,
+            "enqueued_at": entry["enqueued_at"],
+            "estimated_start_at": start,
+            "estimated_wait_seconds": max(0, start - time.time()) if start is not None else None
+        }
+
+    def summary(self) -> dict:
+        running = self.running()
+        estimates = self.estimates()
+        entries = sorted(self.entries(), key=lambda entry: estimates[entry["job_name"]][0])
+        return {
+            "max_concurrent_executions": self.max_running,
+            "max_executions_per_user": self.max_per_user or None,
+            "admission_window": ADMISSION_WINDOW,
+            "timezone": str(SCHEDULE_TIMEZONE),
+            "admitting": self.admitting(),
+            "typical_duration_seconds": self.typical_duration(),
+            "running": [{"job_name": name, "user": user} for name, user in sorted(running.items())],
+            "running_by_user": dict(Counter(running.values())),
+            "depth": len(entries),
+            "queued": [
+                {
+                    "job_name": entry["job_name"],
+                    "user": entry["user"],
+                    "priority": entry["priority"],
+                    "position": estimates[entry["job_name"]][0],
+                    "enqueued_at": entry["enqueued_at"],
+                    "estimated_start_at": estimates[entry["job_name"]][1]
+                }
+                for entry in entries
+            ]
+        }
+
+admission_queue = AdmissionQueue(ADMISSION_QUEUE_DIRECTORY, MAX_CONCURRENT_EXECUTIONS, MAX_EXECUTIONS_PER_USER)
+
+@router.get("/executions/queue")
+async def admission_queue_status():
+    return await run_in_threadpool(admission_queue.summary)
+
+@router.get("/executions/queue/{job_name}")
+async def admission_queue_position(job_name: str):
+    return await run_in_threadpool(admission_queue.position, job_name)
+
+def setup():
+    os.makedirs(CHECKPOINT_DIRECTORY, exist_ok=True)
+    os.makedirs(SUSPENSION_DIRECTORY, exist_ok=True)
+    os.makedirs(ADMISSION_QUEUE_DIRECTORY, exist_ok=True)
+    # Fail at startup rather than on the first tick
+    for expression in (SUSPEND_SCHEDULE, RESUME_SCHEDULE, ADMISSION_WINDOW):
+        if expression:
+            parse_cron(expression)
+    suspensions.load()
+    if suspensions.active:
+        build_queue.hold("suspend-policy")
+    admission_queue.load()
+    job_informer.listeners.append(admission_queue.on_job_event)
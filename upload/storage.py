@@ -0,0 +1,49 @@
+import hashlib
+import json
+import os
+import uuid
+
+# Directory where uploaded files will be saved
+UPLOAD_DIRECTORY = os.getenv("UPLOAD_DIRECTORY", "/data/uploads")
+
+# Uploads are streamed to disk in fixed-size writes, so memory per upload
+# stays at roughly one chunk no matter how large the archive is
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Suspended workloads checkpoint to the shared volume under .checkpoints
+# (see scheduling.py); pods get CHECKPOINT_GRACE_SECONDS to save state
+CHECKPOINT_DIRECTORY = os.path.join(UPLOAD_DIRECTORY, ".checkpoints")
+CHECKPOINT_GRACE_SECONDS = int(os.getenv("CHECKPOINT_GRACE_SECONDS", "60"))
+
+def read_json(path: str, default=None):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+def write_json(path: str, data):
+    """
+    Writes JSON atomically so a crash never leaves a half-written file behind.
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def hash_stream(src) -> str:
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: src.read(UPLOAD_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def checkpoint_subpath(kind: str, job_name: str) -> str:
+    """
+    Creates a Job's checkpoint directory on the shared volume and returns
+    its path relative to the volume, for a subPath mount. Writable by any
+    user, since notebook images rarely run as root.
+    """
+    path = os.path.join(CHECKPOINT_DIRECTORY, kind, job_name)
+    os.makedirs(path, exist_ok=True)
+    os.chmod(path, 0o777)
+    return os.path.relpath(path, UPLOAD_DIRECTORY)
@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# The modules read their settings from the environment at import, so point
+# them at a scratch directory before any test imports them
+os.environ.setdefault("UPLOAD_DIRECTORY", os.path.join(tempfile.mkdtemp(), "uploads"))
@@ -0,0 +1,35 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+import server
+
+def test_import_has_no_side_effects(tmp_path):
+    # Directories are created by the setups in the lifespan, not at import
+    upload_directory = tmp_path / "uploads"
+    subprocess.run([sys.executable, "-c", "import server"], check=True, cwd=os.path.dirname(server.__file__),
+                   env={**os.environ, "UPLOAD_DIRECTORY": str(upload_directory)})
+    assert not upload_directory.exists()
+
+def test_routers_are_included():
+    paths = server.app.openapi()["paths"]
+    for path in ("/", "/upload/", "/jobs/events", "/builds/queue", "/executions/queue",
+                 "/ephemeral_notebook/pool", "/registry/gc", "/logs/search"):
+        assert path in paths
+
+def test_run_periodically_survives_errors():
+    calls = []
+
+    async def run():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        if len(calls) == 3:
+            raise asyncio.CancelledError
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(server.run_periodically("Test loop", 0, run))
+    assert calls == [0, 1, 2]
@@ -0,0 +1,81 @@
+import re
+
+import pytest
+
+import builds
+
+def manifest(**files) -> list:
+    return [{"path": path, "size": 1, "sha256": sha256} for path, sha256 in files.items()]
+
+def write_context(path, dockerfile: str, dockerignore: str = None):
+    (path / "Dockerfile").write_text(dockerfile)
+    if dockerignore is not None:
+        (path / ".dockerignore").write_text(dockerignore)
+
+@pytest.mark.parametrize("pattern, path, matches", [
+    ("*.py", "train.py", True),
+    ("*.py", "src/train.py", False),
+    ("src/?.py", "src/a.py", True),
+    ("src/?.py", "src/ab.py", False),
+    ("**/*.csv", "data.csv", True),
+    ("**/*.csv", "data/raw/data.csv", True),
+    ("data/**", "data/raw/data.csv", True),
+    ("a+b.txt", "a+b.txt", True),
+    ("a+b.txt", "aab.txt", False),
+])
+def test_glob_regex(pattern, path, matches):
+    assert bool(re.match(builds.glob_regex(pattern) + "$", path)) == matches
+
+def test_dockerignore_last_rule_decides(tmp_path):
+    write_context(tmp_path, "FROM python:3.11\n", "data\n*.log\n!data/keep.csv\n")
+    rules = builds.dockerignore_patterns(str(tmp_path))
+    assert builds.is_dockerignored("data/raw.csv", rules)
+    assert builds.is_dockerignored("train.log", rules)
+    assert not builds.is_dockerignored("data/keep.csv", rules)
+    assert not builds.is_dockerignored("train.py", rules)
+
+def test_ignored_files_do_not_change_the_digest(tmp_path):
+    write_context(tmp_path, "FROM python:3.11\nCOPY . /app\n", "*.log\n")
+    files = manifest(Dockerfile="d1", **{"train.py": "t1", "run.log": "l1"})
+    digest = builds.context_digest(str(tmp_path), "Dockerfile", files)
+    assert digest is not None
+    assert builds.context_digest(str(tmp_path), "Dockerfile", manifest(Dockerfile="d1", **{
+        "train.py": "t1", "run.log": "l2"
+    })) == digest
+    assert builds.context_digest(str(tmp_path), "Dockerfile", manifest(Dockerfile="d1", **{
+        "train.py": "t2", "run.log": "l1"
+    })) != digest
+
+def test_exception_reincludes_a_file(tmp_path):
+    write_context(tmp_path, "FROM python:3.11\nCOPY . /app\n", "data\n!data/keep.csv\n")
+    digest = builds.context_digest(str(tmp_path), "Dockerfile", manifest(Dockerfile="d1", **{
+        "data/keep.csv": "k1", "data/raw.csv": "r1"
+    }))
+    assert builds.context_digest(str(tmp_path), "Dockerfile", manifest(Dockerfile="d1", **{
+        "data/keep.csv": "k1", "data/raw.csv": "r2"
+    })) == digest
+    assert builds.context_digest(str(tmp_path), "Dockerfile", manifest(Dockerfile="d1", **{
+        "data/keep.csv": "k2", "data/raw.csv": "r1"
+    })) != digest
+
+def test_only_copied_files_count(tmp_path):
+    write_context(tmp_path, "FROM python:3.11\nCOPY src /app/src\n")
+    digest = builds.context_digest(str(tmp_path), "Dockerfile", manifest(Dockerfile="d1", **{
+        "src/train.py": "t1", "notes.md": "n1"
+    }))
+    assert builds.context_digest(str(tmp_path), "Dockerfile", manifest(Dockerfile="d1", **{
+        "src/train.py": "t1", "notes.md": "n2"
+    })) == digest
+
+@pytest.mark.parametrize("instruction", [
+    "ADD https://example.com/data.csv /data/",
+    "ADD git@github.com:example/repo.git /src",
+    'ADD ["https://example.com/data.csv", "/data/"]',
+])
+def test_remote_sources_are_not_cached(tmp_path, instruction):
+    write_context(tmp_path, f"FROM python:3.11\n{instruction}\n")
+    assert builds.context_digest(str(tmp_path), "Dockerfile", manifest(Dockerfile="d1")) is None
+
+def test_unknown_manifest_is_not_cached(tmp_path):
+    write_context(tmp_path, "FROM python:3.11\n")
+    assert builds.context_digest(str(tmp_path), "Dockerfile", None) is None
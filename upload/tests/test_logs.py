@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from kubernetes import client
+
+import logs
+import server
+
+class FakeLogResponse:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.closed = False
+
+    def stream(self, amt, decode_content=True):
+        yield self.data
+
+    def close(self):
+        self.closed = True
+
+    def release_conn(self):
+        pass
+
+@pytest.fixture
+def stream(monkeypatch):
+    pod = client.V1Pod(
+        metadata=client.V1ObjectMeta(name="demo-pod", creation_timestamp=datetime.now(timezone.utc)),
+        spec=client.V1PodSpec(containers=[client.V1Container(name="main")])
+    )
+
+    async def cached_job(job_name):
+        return object()
+
+    async def cached_job_pods(job_name):
+        return {job_name: [pod]}
+
+    monkeypatch.setattr(logs, "cached_job", cached_job)
+    monkeypatch.setattr(logs, "cached_job_pods", cached_job_pods)
+    return TestClient(server.app)
+
+def test_stream_releases_its_slot(stream, monkeypatch):
+    response = FakeLogResponse(b"line\n")
+
+    async def k8s_call(fn, **kwargs):
+        # The slot is already taken while the stream is opened
+        assert logs.active_log_streams == 1
+        return response
+
+    monkeypatch.setattr(logs, "k8s_call", k8s_call)
+    result = stream.get("/jobs/demo/logs/stream")
+    assert result.status_code == 200
+    assert result.text == "line\n"
+    assert logs.active_log_streams == 0
+    assert response.closed
+
+def test_failed_stream_releases_its_slot(stream, monkeypatch):
+    async def k8s_call(fn, **kwargs):
+        raise client.exceptions.ApiException(status=500)
+
+    monkeypatch.setattr(logs, "k8s_call", k8s_call)
+    assert stream.get("/jobs/demo/logs/stream").status_code == 500
+    assert logs.active_log_streams == 0
+
+def test_stream_is_rejected_when_all_slots_are_taken(stream, monkeypatch):
+    monkeypatch.setattr(logs, "active_log_streams", logs.LOG_CONNECTIONS)
+    result = stream.get("/jobs/demo/logs/stream")
+    assert result.status_code == 503
+    assert result.headers["Retry-After"] == "10"
+
+def test_unsent_stream_releases_its_slot(stream, monkeypatch):
+    response = FakeLogResponse(b"line\n")
+
+    async def k8s_call(fn, **kwargs):
+        return response
+
+    async def disconnect_before_body():
+        streaming = await logs.stream_job_logs("demo")
+        assert logs.active_log_streams == 1
+        # What Starlette runs after the response when the client is gone
+        await streaming.background()
+
+    monkeypatch.setattr(logs, "k8s_call", k8s_call)
+    asyncio.run(disconnect_before_body())
+    assert logs.active_log_streams == 0
+    assert response.closed
@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from kubernetes import client
+
+import kube
+import notebooks
+
+def notebook_job(name: str, suspend: bool) -> client.V1Job:
+    return client.V1Job(
+        metadata=client.V1ObjectMeta(name=name, labels={"notebook-session": name},
+                                     creation_timestamp=datetime(2020, 1, 1, tzinfo=timezone.utc)),
+        spec=client.V1JobSpec(template=client.V1PodTemplateSpec(), suspend=suspend),
+        status=client.V1JobStatus()
+    )
+
+def pool_job(name: str, image_name: str) -> client.V1Job:
+    container = client.V1Container(name="jupyter", command=["jupyter", "--NotebookApp.token=secret"])
+    return client.V1Job(
+        metadata=client.V1ObjectMeta(name=name, uid=f"uid-{name}", labels={
+            "notebook-pool": notebooks.notebook_pool_label(image_name), "pool-state": "idle"
+        }),
+        spec=client.V1JobSpec(template=client.V1PodTemplateSpec(spec=client.V1PodSpec(containers=[container]))),
+        status=client.V1JobStatus()
+    )
+
+def pool_pod(job_name: str) -> client.V1Pod:
+    return client.V1Pod(
+        metadata=client.V1ObjectMeta(name=f"{job_name}-pod", labels={"job-name": job_name}),
+        status=client.V1PodStatus(phase="Running", conditions=[client.V1PodCondition(type="Ready", status="True")])
+    )
+
+@pytest.fixture(autouse=True)
+def informers():
+    kube.job_informer.items.clear()
+    kube.pod_informer.items.clear()
+    kube.pod_informer.index.clear()
+    yield
+    kube.job_informer.items.clear()
+    kube.pod_informer.items.clear()
+    kube.pod_informer.index.clear()
+
+@pytest.fixture
+def k8s(monkeypatch):
+    calls = []
+
+    async def k8s_call(fn, **kwargs):
+        calls.append((fn.__name__, kwargs))
+        if fn.__name__ == "read_namespaced_job":
+            raise client.exceptions.ApiException(status=404)
+
+    monkeypatch.setattr(notebooks, "k8s_call", k8s_call)
+    return calls
+
+@pytest.fixture
+def monitor(monkeypatch):
+    monitor = notebooks.NotebookActivityMonitor()
+    closed = []
+
+    async def close_notebook_session(session):
+        closed.append(session["job_name"])
+
+    monkeypatch.setattr(monitor, "jupyter_status", lambda job: None)
+    monkeypatch.setattr(notebooks, "close_notebook_session", close_notebook_session)
+    monitor.closed = closed
+    return monitor
+
+def test_idle_session_is_culled(monitor):
+    kube.job_informer.store(notebook_job("nb", suspend=False))
+    asyncio.run(monitor.cull())
+    assert monitor.closed == ["nb"]
+
+def test_resumed_session_is_not_culled(monitor):
+    # The informer may still report the Job as suspended at the first cull
+    kube.job_informer.store(notebook_job("nb", suspend=True))
+    monitor.resumed("nb")
+    asyncio.run(monitor.cull())
+    kube.job_informer.store(notebook_job("nb", suspend=False))
+    asyncio.run(monitor.cull())
+    assert monitor.closed == []
+    assert monitor.activity["nb"]["idle_seconds"] < notebooks.NOTEBOOK_IDLE_TIMEOUT
+
+def test_claim_gives_the_job_the_session_ttl(k8s, monkeypatch):
+    pool = notebooks.NotebookPool({"jupyter/base": 1})
+    monkeypatch.setattr(pool, "refill", lambda: asyncio.sleep(0))
+    kube.job_informer.store(pool_job("notebook-pool-1", "jupyter/base"))
+    kube.pod_informer.store(pool_pod("notebook-pool-1"))
+
+    async def claim():
+        pool.attach(asyncio.get_running_loop())
+        return await pool.claim("jupyter/base", "demo", 120)
+
+    assert asyncio.run(claim()) == ("notebook-pool-1", "secret")
+    [(_, patch)] = [call for call in k8s if call[0] == "patch_namespaced_job"]
+    assert patch["body"]["spec"] == {"ttlSecondsAfterFinished": 120}
+
+def test_unreadable_claimed_job_is_rolled_back(k8s, monkeypatch):
+    closed = []
+    created = []
+
+    async def claim(image_name, session_name, ttl_seconds):
+        return "notebook-pool-1", "secret"
+
+    async def close_notebook_session(session):
+        closed.append(session["job_name"])
+
+    async def create_jupyter_job(**kwargs):
+        created.append(kwargs["job_name"])
+        return pool_job(kwargs["job_name"], "jupyter/base")
+
+    async def create_resource(**kwargs):
+        return None
+
+    monkeypatch.setattr(notebooks.notebook_pool, "claim", claim)
+    monkeypatch.setattr(notebooks, "close_notebook_session", close_notebook_session)
+    monkeypatch.setattr(notebooks, "create_jupyter_job", create_jupyter_job)
+    monkeypatch.setattr(notebooks, "create_jupyter_service", create_resource)
+    monkeypatch.setattr(notebooks, "create_jupyter_ingress", create_resource)
+
+    session = asyncio.run(notebooks.open_notebook_session("demo", "jupyter/base", None, 300, "example.com"))
+    assert closed == ["notebook-pool-1"]
+    assert created == ["demo-job"]
+    assert session["job_name"] == "demo-job" and not session["from_pool"]
+    assert session["token"] != "secret"
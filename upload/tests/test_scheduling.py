@@ -0,0 +1,152 @@
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import kube
+import scheduling
+
+# 2026-06-01 is a Monday
+MONDAY = datetime(2026, 6, 1, 9, 0)
+
+def test_weekday_steps():
+    weekdays = scheduling.parse_cron("0 9 * * */2")[4]
+    assert weekdays == {0, 2, 4, 6}
+    assert scheduling.cron_matches("0 9 * * */2", MONDAY.replace(day=2))  # Tuesday
+    assert not scheduling.cron_matches("0 9 * * */2", MONDAY)
+
+def test_sunday_is_0_or_7():
+    assert scheduling.parse_cron("0 9 * * 7")[4] == {0}
+    assert scheduling.parse_cron("0 9 * * 5-7")[4] == {5, 6, 0}
+    assert scheduling.cron_matches("0 9 * * 7", MONDAY.replace(day=7))
+
+def test_day_or_weekday_when_both_are_restricted():
+    # Fires on the 15th and on every Monday, as cron does
+    assert scheduling.cron_matches("0 9 15 * 1", MONDAY)
+    assert scheduling.cron_matches("0 9 15 * 1", MONDAY.replace(day=15))
+    assert not scheduling.cron_matches("0 9 15 * 1", MONDAY.replace(day=2))
+    # With one of them unrestricted, the other decides alone
+    assert not scheduling.cron_matches("0 9 15 * *", MONDAY)
+    assert scheduling.cron_matches("0 9 * * 1", MONDAY)
+
+@pytest.mark.parametrize("expression", [
+    "60 * * * *",    # minute out of range
+    "0 24 * * *",    # hour out of range
+    "0 0 0 * *",     # days start at 1
+    "0 0 * 13 *",    # month out of range
+    "0 0 * * 8",     # weekday out of range
+    "0 22-2 * * *",  # wrapped range
+    "*/0 * * * *",   # zero step
+    "0 9 * *",       # four fields
+    "0 9 * * mon",   # names are not supported
+])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        scheduling.parse_cron(expression)
+
+def test_schedule_timezone(monkeypatch):
+    monkeypatch.setattr(scheduling, "SCHEDULE_TIMEZONE", ZoneInfo("Europe/Berlin"))
+    # Friday 23:30 UTC is already Saturday in Berlin, so the next weekday
+    # 09:00 there is Monday 09:00 CEST, 07:00 UTC
+    friday = datetime(2026, 6, 5, 23, 30, tzinfo=timezone.utc).timestamp()
+    after = scheduling.next_cron_match("0 9 * * 1-5", friday)
+    assert datetime.fromtimestamp(after, timezone.utc) == datetime(2026, 6, 8, 7, 0, tzinfo=timezone.utc)
+    # A matching minute is returned as is
+    monday = datetime(2026, 6, 8, 7, 0, 30, tzinfo=timezone.utc).timestamp()
+    assert scheduling.next_cron_match("0 9 * * 1-5", monday) == monday
+
+class FakePipelines:
+    def __init__(self, pipelines=()):
+        self.pipelines = {pipeline["name"]: pipeline for pipeline in pipelines}
+
+    def list(self):
+        return list(self.pipelines.values())
+
+    def get(self, name):
+        return self.pipelines.get(name)
+
+    def update(self, pipeline, state, message=None):
+        pipeline["state"] = state
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    admitted = []
+
+    async def k8s_call(fn, **kwargs):
+        admitted.append(kwargs["name"])
+
+    monkeypatch.setattr(scheduling, "pipelines", FakePipelines())
+    monkeypatch.setattr(scheduling, "k8s_call", k8s_call)
+    monkeypatch.setattr(scheduling, "ADMISSION_WINDOW", None)
+    monkeypatch.setattr(scheduling.suspensions, "active", False)
+    kube.job_informer.items.clear()
+    kube.job_informer.synced.set()
+    queue = scheduling.AdmissionQueue(str(tmp_path), 2, 0)
+    queue.admitted_jobs = admitted
+    yield queue
+    kube.job_informer.synced.clear()
+
+def entry(job_name: str, user: str, priority: int, sequence: int) -> dict:
+    return {"job_name": job_name, "user": user, "priority": priority, "sequence": sequence}
+
+def test_admission_order(queue):
+    entries = [entry("a", "alice", 0, 1), entry("b", "bob", 0, 2), entry("c", "carol", 5, 3)]
+    # Highest priority first
+    assert queue.next_entry(entries, Counter(), {})["job_name"] == "c"
+    entries = entries[:2]
+    # FIFO between otherwise equal users
+    assert queue.next_entry(entries, Counter(), {})["job_name"] == "a"
+    # Then the user served longest ago
+    assert queue.next_entry(entries, Counter(), {"alice": 200, "bob": 100})["job_name"] == "b"
+    # Before that, the user with the fewest running executions
+    assert queue.next_entry(entries, Counter({"alice": 1}), {"bob": 200})["job_name"] == "b"
+
+def test_dispatch_admits_up_to_max_running(queue):
+    for name, user in (("a", "alice"), ("b", "bob"), ("c", "carol")):
+        queue.enqueue(name, user, 0)
+
+    async def dispatch():
+        queue.attach(asyncio.get_running_loop())
+        await queue.dispatch()
+
+    asyncio.run(dispatch())
+    assert queue.admitted_jobs == ["a", "b"]
+    assert [entry["job_name"] for entry in queue.entries()] == ["c"]
+
+def test_per_user_cap(queue):
+    queue.max_per_user = 1
+    for name in ("a", "b"):
+        queue.enqueue(name, "alice", 0)
+    queue.enqueue("c", "bob", 0)
+
+    async def dispatch():
+        queue.attach(asyncio.get_running_loop())
+        await queue.dispatch()
+
+    asyncio.run(dispatch())
+    assert queue.admitted_jobs == ["a", "c"]
+    assert queue.next_entry(queue.entries(), Counter({"alice": 1}), {}) is None
+
+def test_estimates(queue):
+    queue.max_running = 1
+    for name, user in (("a", "alice"), ("b", "bob")):
+        queue.enqueue(name, user, 0)
+    duration = queue.typical_duration()
+    assert duration == scheduling.ADMISSION_DEFAULT_DURATION
+    estimates = queue.estimates()
+    assert [estimates[name][0] for name in ("a", "b")] == [1, 2]
+    assert estimates["b"][1] == pytest.approx(estimates["a"][1] + duration)
+    assert estimates["a"][1] == pytest.approx(time.time(), abs=5)
+
+def test_estimates_respect_the_per_user_cap(queue):
+    queue.max_per_user = 1
+    for name in ("a", "b"):
+        queue.enqueue(name, "alice", 0)
+    queue.enqueue("c", "bob", 0)
+    estimates = queue.estimates()
+    # bob's job starts alongside alice's first, alice's second waits for it
+    assert estimates["c"][1] == pytest.approx(estimates["a"][1], abs=1)
+    assert estimates["b"][1] == pytest.approx(estimates["a"][1] + queue.typical_duration())
@@ -0,0 +1,128 @@
+import hashlib
+import io
+import os
+import zipfile
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import server
+import uploads
+
+@pytest.fixture
+def client():
+    uploads.setup()
+    return TestClient(server.app)
+
+def test_blob_upload_takes_an_upload_slot(client, monkeypatch):
+    monkeypatch.setattr(uploads, "active_uploads", uploads.MAX_CONCURRENT_UPLOADS)
+    data = b"print('hello')\n"
+    response = client.put(f"/blobs/{hashlib.sha256(data).hexdigest()}", content=data)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+
+def test_failed_context_commit_is_cleaned_up(client, monkeypatch):
+    data = b"FROM python:3.11\n"
+    sha256 = hashlib.sha256(data).hexdigest()
+    assert client.put(f"/blobs/{sha256}", content=data).status_code == 200
+    committed = []
+
+    async def trigger_build(job_name, upload_id, upload_path, **kwargs):
+        committed.append((upload_id, upload_path))
+        raise HTTPException(status_code=504, detail="Kubernetes API request timed out.")
+
+    monkeypatch.setattr(uploads, "trigger_build", trigger_build)
+    response = client.post("/contexts/", json={
+        "job_name": "demo",
+        "files": [{"path": "Dockerfile", "size": len(data), "sha256": sha256}]
+    })
+    assert response.status_code == 504
+    [(upload_id, upload_path)] = committed
+    assert not os.path.exists(upload_path)
+    assert not os.path.exists(os.path.join(uploads.MANIFEST_DIRECTORY, f"{upload_id}.json"))
+
+def store_blob(data: bytes, crc: int) -> str:
+    sha256 = hashlib.sha256(data).hexdigest()
+    os.makedirs(os.path.dirname(uploads.blob_path(sha256)), exist_ok=True)
+    with open(uploads.blob_path(sha256), "wb") as f:
+        f.write(data)
+    with open(uploads.crc_index_path(crc, len(data)), "w") as f:
+        f.write(sha256)
+    return sha256
+
+def test_sweep_removes_unreferenced_blobs(tmp_path, monkeypatch):
+    uploads.setup()
+    unused = store_blob(b"unused\n", 1)
+    used = store_blob(b"used\n", 2)
+    uploads.link_blob(used, str(tmp_path / "context" / "data.csv"))
+
+    uploads.sweep_blobs()
+    assert os.path.exists(uploads.blob_path(unused))  # Still within UPLOAD_SESSION_TTL
+    monkeypatch.setattr(uploads, "UPLOAD_SESSION_TTL", -60)
+    assert uploads.sweep_blobs() >= 1
+    assert not os.path.exists(uploads.blob_path(unused))
+    assert not os.path.exists(uploads.crc_index_path(1, len(b"unused\n")))
+    assert os.path.exists(uploads.blob_path(used))
+    assert os.path.exists(uploads.crc_index_path(2, len(b"used\n")))
+
+def make_zip(files: dict, compression=zipfile.ZIP_STORED) -> zipfile.ZipFile:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return zipfile.ZipFile(buffer)
+
+@pytest.mark.parametrize("name, parts", [
+    ("src/train.py", ["src", "train.py"]),
+    ("./src//train.py", ["src", "train.py"]),
+    ("src\\train.py", ["src", "train.py"]),
+])
+def test_member_destination(tmp_path, name, parts):
+    assert uploads.member_destination(str(tmp_path), name) == os.path.join(str(tmp_path), *parts)
+
+def test_member_without_path_is_skipped(tmp_path):
+    assert uploads.member_destination(str(tmp_path), "./") is None
+
+@pytest.mark.parametrize("name", [
+    "../evil.py",
+    "src/../../evil.py",
+    "..\\evil.py",
+    "/etc/passwd",
+    "C:/Windows/evil.py",
+    "C:evil.py",
+])
+def test_escaping_member_is_rejected(tmp_path, name):
+    with pytest.raises(HTTPException) as e:
+        uploads.member_destination(str(tmp_path), name)
+    assert e.value.status_code == 400
+
+def test_traversal_rejects_the_whole_archive(tmp_path):
+    archive = make_zip({"Dockerfile": "FROM python:3.11\n", "../evil.py": "print('evil')\n"})
+    with pytest.raises(HTTPException) as e:
+        uploads.plan_zip_extraction(archive, str(tmp_path))
+    assert e.value.status_code == 400
+
+def test_member_count_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "MAX_ARCHIVE_MEMBERS", 2)
+    assert len(uploads.plan_zip_extraction(make_zip({"a": "1", "b": "2"}), str(tmp_path))) == 2
+    with pytest.raises(HTTPException) as e:
+        uploads.plan_zip_extraction(make_zip({"a": "1", "b": "2", "c": "3"}), str(tmp_path))
+    assert e.value.status_code == 400
+
+def test_extracted_size_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "MAX_EXTRACTED_SIZE", 10)
+    with pytest.raises(HTTPException) as e:
+        uploads.plan_zip_extraction(make_zip({"a": "x" * 6, "b": "x" * 6}), str(tmp_path))
+    assert e.value.status_code == 400
+
+def test_compression_ratio_limit(tmp_path):
+    # Small members may compress as well as they like
+    small = b"\0" * uploads.MIN_RATIO_CHECK_SIZE
+    assert uploads.plan_zip_extraction(make_zip({"small": small}, zipfile.ZIP_DEFLATED), str(tmp_path))
+    bomb = b"\0" * (uploads.MIN_RATIO_CHECK_SIZE * 4)
+    with pytest.raises(HTTPException) as e:
+        uploads.plan_zip_extraction(make_zip({"bomb": bomb}, zipfile.ZIP_DEFLATED), str(tmp_path))
+    assert e.value.status_code == 400
+    # Stored members are no risk however large
+    assert uploads.plan_zip_extraction(make_zip({"stored": bomb}), str(tmp_path))
@@ -0,0 +1,864 @@
+import hashlib
+import logging
+import os
+import shutil
+import string
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Form, HTTPException, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from detect import detect_archive_file_libs
+from executions import trigger_build
+from scheduling import execution_priority
+from storage import UPLOAD_CHUNK_SIZE, UPLOAD_DIRECTORY, hash_stream, read_json, write_json
+
+router = APIRouter()
+
+# Largest accepted upload, and how many request bodies are received at once
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(10 * 1024 ** 3)))
+MAX_CONCURRENT_UPLOADS = int(os.getenv("MAX_CONCURRENT_UPLOADS", "4"))
+
+# Plain form fields (job_name, ...) are kept in memory, so cap them
+MAX_FORM_FIELD_SIZE = 64 * 1024
+
+# Number of uploads (or parts of resumable uploads) currently being received
+active_uploads = 0
+
+@contextmanager
+def upload_slot(retry_after: int = 30):
+    """
+    Holds one of the MAX_CONCURRENT_UPLOADS slots while a request body is
+    received, or rejects the request with 503 if none is free.
+    """
+    global active_uploads
+    if active_uploads >= MAX_CONCURRENT_UPLOADS:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many uploads in progress, please retry shortly.",
+            headers={"Retry-After": str(retry_after)}
+        )
+    active_uploads += 1
+    try:
+        yield
+    finally:
+        active_uploads -= 1
+
+# Resumable uploads: clients PUT numbered parts of UPLOAD_PART_SIZE bytes and
+# commit once all parts are in. Sessions not committed within
+# UPLOAD_SESSION_TTL seconds are removed.
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE", str(8 * 1024 * 1024)))
+MAX_UPLOAD_PART_SIZE = 64 * 1024 * 1024
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))
+
+# Upload sessions currently being assembled
+committing_uploads = set()
+
+# Extracted files are stored once per content hash under BLOB_DIRECTORY and
+# hardlinked into each upload's tree; MANIFEST_DIRECTORY records which blobs
+# make up every upload. Both must live on the same volume as the uploads.
+# Every BLOB_SWEEP_INTERVAL seconds, blobs no upload links to any more are
+# removed once they have been unreferenced for UPLOAD_SESSION_TTL seconds,
+# which also gives blobs PUT ahead of a context commit time to be used.
+BLOB_DIRECTORY = os.path.join(UPLOAD_DIRECTORY, ".blobs")
+MANIFEST_DIRECTORY = os.path.join(UPLOAD_DIRECTORY, ".manifests")
+BLOB_SWEEP_INTERVAL = 3600
+
+# Archives are checked against these limits before extraction starts. The
+# compression ratio is only enforced for members larger than
+# MIN_RATIO_CHECK_SIZE, since tiny files routinely compress very well.
+MAX_EXTRACTED_SIZE = int(os.getenv("MAX_EXTRACTED_SIZE", str(20 * 1024 ** 3)))
+MAX_ARCHIVE_MEMBERS = int(os.getenv("MAX_ARCHIVE_MEMBERS", "100000"))
+MAX_COMPRESSION_RATIO = int(os.getenv("MAX_COMPRESSION_RATIO", "200"))
+MIN_RATIO_CHECK_SIZE = 1024 * 1024
+
+# Threads shared by all extractions, so concurrent uploads cannot
+# oversubscribe the node
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "4"))
+extract_pool = ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix="extract")
+class MultipartUploadReceiver:
+    """
+    Incrementally parses a multipart/form-data body. The file part is written
+    to dest_dir in UPLOAD_CHUNK_SIZE writes on the threadpool; plain fields
+    are collected into self.fields.
+    """
+
+    def __init__(self, boundary: bytes, dest_dir: str, max_size: int):
+        self.dest_dir = dest_dir
+        self.max_size = max_size
+        self.fields: Dict[str, str] = {}
+        self.filename: Optional[str] = None
+        self.file_path: Optional[str] = None
+        self.size = 0
+
+        self._out = None
+        self._buffer = bytearray()
+        self._headers: Dict[str, str] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._part_name: Optional[str] = None
+        self._part_is_file = False
+        self._part_value = bytearray()
+
+        self._parser = MultipartParser(boundary, callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+
+    def _on_part_begin(self):
+        self._headers = {}
+        self._part_name = None
+        self._part_is_file = False
+        self._part_value = bytearray()
+
+    def _on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.decode("latin-1").lower()] = self._header_value.decode("latin-1")
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get("content-disposition", ""))
+        self._part_name = options.get(b"name", b"").decode("utf-8")
+        if b"filename" in options:
+            if self.file_path is not None:
+                raise HTTPException(status_code=400, detail="Only one file may be uploaded per request.")
+            self._part_is_file = True
+            # Never trust client-supplied paths
+            self.filename = os.path.basename(options[b"filename"].decode("utf-8")) or "upload.zip"
+            self.file_path = os.path.join(self.dest_dir, self.filename)
+
+    def _on_part_data(self, data, start, end):
+        if self._part_is_file:
+            self.size += end - start
+            if self.size > self.max_size:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Uploaded file exceeds the maximum size of {self.max_size} bytes."
+                )
+            self._buffer += data[start:end]
+        else:
+            self._part_value += data[start:end]
+            if len(self._part_value) > MAX_FORM_FIELD_SIZE:
+                raise HTTPException(status_code=413, detail=f"Form field '{self._part_name}' is too large.")
+
+    def _on_part_end(self):
+        if not self._part_is_file and self._part_name:
+            self.fields[self._part_name] = self._part_value.decode("utf-8")
+
+    async def _flush(self):
+        if self.file_path is None:
+            return
+        if self._out is None:
+            self._out = await run_in_threadpool(open, self.file_path, "wb")
+        if self._buffer:
+            await run_in_threadpool(self._out.write, self._buffer)
+            self._buffer = bytearray()
+
+    async def receive(self, request: Request):
+        try:
+            async for chunk in request.stream():
+                self._parser.write(chunk)
+                if len(self._buffer) >= UPLOAD_CHUNK_SIZE:
+                    await self._flush()
+            self._parser.finalize()
+            await self._flush()
+        finally:
+            if self._out is not None:
+                await run_in_threadpool(self._out.close)
+
+async def receive_upload(request: Request, dest_dir: str, max_size: Optional[int] = None) -> MultipartUploadReceiver:
+    """
+    Streams a multipart/form-data upload into dest_dir without buffering the
+    whole body in memory. Rejects bodies larger than max_size (default
+    MAX_UPLOAD_SIZE) with a 413.
+    """
+    if max_size is None:
+        max_size = MAX_UPLOAD_SIZE
+
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=400, detail="Request must be multipart/form-data.")
+
+    # Fail fast on declared sizes before reading anything
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_size + MAX_FORM_FIELD_SIZE:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the maximum size of {max_size} bytes.")
+
+    receiver = MultipartUploadReceiver(options[b"boundary"], dest_dir, max_size)
+    await receiver.receive(request)
+    return receiver
+
+@router.post("/upload/")
+async def upload_file(request: Request):
+    """
+    Accepts a multipart form with a zip archive in `file` and a `job_name`
+    field (optionally `user` and `priority` for the admission queue), streams
+    it to the shared PVC and triggers the build and execution jobs.
+    """
+    with upload_slot():
+        # Generate a unique identifier for each upload
+        upload_id = str(uuid.uuid4())
+        upload_path = os.path.join(UPLOAD_DIRECTORY, upload_id)
+
+        # Create a directory for this upload
+        os.makedirs(upload_path, exist_ok=True)
+
+        # Save the uploaded zip file
+        try:
+            upload = await receive_upload(request, upload_path)
+        except HTTPException:
+            shutil.rmtree(upload_path, ignore_errors=True)
+            raise
+        except Exception as e:
+            logging.error(f"Error saving uploaded file: {e}")
+            shutil.rmtree(upload_path, ignore_errors=True)
+            raise HTTPException(status_code=500, detail="Failed to save uploaded file.")
+
+    # Validate job name
+    job_name = upload.fields.get("job_name")
+    if not job_name:
+        shutil.rmtree(upload_path, ignore_errors=True)
+        raise HTTPException(status_code=400, detail="Job name is required")
+
+    if upload.file_path is None or upload.size == 0:
+        logging.error("Uploaded file is empty.")
+        shutil.rmtree(upload_path, ignore_errors=True)
+        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+
+    try:
+        priority = execution_priority(upload.fields.get("priority"))
+    except HTTPException:
+        shutil.rmtree(upload_path, ignore_errors=True)
+        raise
+
+    logging.info(f"File saved at {upload.file_path} ({upload.size} bytes)")
+
+    return JSONResponse(
+        await submit_uploaded_archive(job_name, upload_id, upload_path, upload.file_path, upload.filename,
+                                      upload.fields.get("base_image"), upload.fields.get("user"), priority)
+    )
+
+async def submit_uploaded_archive(job_name: str, upload_id: str, upload_path: str,
+                                  file_location: str, filename: str, base_image: Optional[str] = None,
+                                  user: Optional[str] = None, priority: int = 0) -> dict:
+    """
+    Extracts an uploaded zip archive in place under upload_path, locates the
+    Dockerfile and triggers the Kaniko build and execution jobs.
+    """
+    # Check if the uploaded file is a zip archive
+    if zipfile.is_zipfile(file_location):
+        try:
+            # Usually a cache hit, since the dialog ran /detect_libs/ on the
+            # same archive just before uploading it
+            analysis = await run_in_threadpool(detect_archive_file_libs, file_location)
+            manifest = await run_in_threadpool(extract_into_blob_store, file_location, upload_path)
+            write_json(os.path.join(MANIFEST_DIRECTORY, f"{upload_id}.json"), {
+                "upload_id": upload_id,
+                "job_name": job_name,
+                "created_at": time.time(),
+                "files": manifest,
+                "analysis": analysis
+            })
+            logging.info(f"Zip file extracted to {upload_path}")
+            # Remove the zip file after extraction
+            os.remove(file_location)
+        except HTTPException as e:
+            logging.error(f"Rejected zip file: {e.detail}")
+            shutil.rmtree(upload_path, ignore_errors=True)
+            raise
+        except zipfile.BadZipFile:
+            shutil.rmtree(upload_path, ignore_errors=True)
+            raise HTTPException(status_code=400, detail="Invalid ZIP file.")
+        except Exception as e:
+            logging.error(f"Error extracting zip file: {e}")
+            shutil.rmtree(upload_path, ignore_errors=True)
+            raise HTTPException(status_code=500, detail="Failed to extract zip file.")
+    else:
+        logging.error("Uploaded file is not a valid zip archive.")
+        shutil.rmtree(upload_path, ignore_errors=True)
+        raise HTTPException(status_code=400, detail="Uploaded file must be a zip archive.")
+
+    execution_job_name = await trigger_build(job_name, upload_id, upload_path, analysis, manifest, base_image,
+                                             user, priority)
+
+    return {
+        "message": f"File '{filename}' uploaded and execution job '{execution_job_name}' triggered.",
+        "upload_id": upload_id,
+        "job_name": job_name
+    }
+
+def upload_parts_dir(upload_id: str) -> str:
+    return os.path.join(UPLOAD_DIRECTORY, upload_id, ".parts")
+
+def load_upload_session(upload_id: str) -> dict:
+    try:
+        uuid.UUID(upload_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail=f"Upload '{upload_id}' not found.")
+    session = read_json(os.path.join(upload_parts_dir(upload_id), "session.json"))
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Upload '{upload_id}' not found.")
+    return session
+
+def received_parts(upload_id: str) -> Dict[int, int]:
+    """
+    Returns {part index: size} for every fully received part.
+    """
+    parts = {}
+    for entry in os.scandir(upload_parts_dir(upload_id)):
+        if entry.name.endswith(".part"):
+            parts[int(entry.name[:-len(".part")])] = entry.stat().st_size
+    return parts
+
+def remove_expired_upload_sessions():
+    cutoff = time.time() - UPLOAD_SESSION_TTL
+    for entry in os.scandir(UPLOAD_DIRECTORY):
+        if not entry.is_dir():
+            continue
+        session = read_json(os.path.join(entry.path, ".parts", "session.json"))
+        if session and session["created_at"] < cutoff:
+            logging.info(f"Removing expired upload session '{entry.name}'")
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+async def receive_body(request: Request, path: str, max_size: int,
+                       expected_size: Optional[int] = None, expected_sha256: Optional[str] = None):
+    """
+    Streams a raw request body to path in UPLOAD_CHUNK_SIZE writes and returns
+    (size, sha256). The body is checked against max_size and, if given, the
+    expected size and digest (or an X-Content-SHA256 header); the file only
+    appears at path once it has been received completely and verified.
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    digest = hashlib.sha256()
+    size = 0
+    buffer = bytearray()
+
+    try:
+        with open(tmp_path, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(status_code=413, detail=f"Body exceeds {max_size} bytes.")
+                digest.update(chunk)
+                buffer += chunk
+                if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                    await run_in_threadpool(f.write, buffer)
+                    buffer = bytearray()
+            await run_in_threadpool(f.write, buffer)
+
+        if expected_size is not None and size != expected_size:
+            raise HTTPException(status_code=400, detail=f"Expected {expected_size} bytes, got {size}.")
+
+        expected_sha256 = expected_sha256 or request.headers.get("x-content-sha256")
+        if expected_sha256 and expected_sha256.lower() != digest.hexdigest():
+            raise HTTPException(status_code=400, detail="Checksum mismatch.")
+
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return size, digest.hexdigest()
+
+@router.post("/uploads/")
+async def create_upload_session(
+    job_name: str = Form(...),
+    filename: str = Form(...),
+    total_size: int = Form(...),
+    part_size: Optional[int] = Form(None),
+    base_image: Optional[str] = Form(None),
+    user: Optional[str] = Form(None),
+    priority: Optional[int] = Form(None),
+    sha256: Optional[str] = Form(None)
+):
+    """
+    Starts a resumable upload. The client then PUTs parts 0..part_count-1 to
+    /uploads/{upload_id}/parts/{index} (in any order, retrying as needed) and
+    finally POSTs /uploads/{upload_id}/commit. An optional sha256 of the
+    whole archive is checked on commit and lets a resuming client make sure
+    it is sending parts of the same archive.
+    """
+    if not job_name:
+        raise HTTPException(status_code=400, detail="Job name is required")
+    if total_size <= 0:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+    if total_size > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the maximum size of {MAX_UPLOAD_SIZE} bytes.")
+
+    part_size = part_size or UPLOAD_PART_SIZE
+    if not 0 < part_size <= MAX_UPLOAD_PART_SIZE:
+        raise HTTPException(status_code=400, detail=f"part_size must be between 1 and {MAX_UPLOAD_PART_SIZE} bytes.")
+
+    await run_in_threadpool(remove_expired_upload_sessions)
+
+    upload_id = str(uuid.uuid4())
+    session = {
+        "upload_id": upload_id,
+        "job_name": job_name,
+        "filename": os.path.basename(filename) or "upload.zip",
+        "total_size": total_size,
+        "part_size": part_size,
+        "base_image": base_image,
+        "user": user,
+        "priority": execution_priority(priority),
+        "sha256": validate_sha256(sha256) if sha256 else None,
+        "part_count": -(-total_size // part_size),
+        "created_at": time.time()
+    }
+    os.makedirs(upload_parts_dir(upload_id), exist_ok=True)
+    write_json(os.path.join(upload_parts_dir(upload_id), "session.json"), session)
+    logging.info(f"Upload session '{upload_id}' created for job '{job_name}' ({total_size} bytes)")
+
+    return session
+
+@router.get("/uploads/{upload_id}")
+async def get_upload_session(upload_id: str):
+    """
+    Reports which parts have been received so an interrupted client can
+    resume by sending only the missing ones.
+    """
+    session = load_upload_session(upload_id)
+    parts = received_parts(upload_id)
+    session["received_parts"] = sorted(parts)
+    session["missing_parts"] = [i for i in range(session["part_count"]) if i not in parts]
+    return session
+
+@router.put("/uploads/{upload_id}/parts/{index}")
+async def upload_part(upload_id: str, index: int, request: Request):
+    """
+    Stores one part of a resumable upload. Re-sending a part replaces it, so
+    failed requests can simply be retried. An optional X-Content-SHA256
+    header is verified against the received bytes.
+    """
+    session = load_upload_session(upload_id)
+    if upload_id in committing_uploads:
+        raise HTTPException(status_code=409, detail=f"Upload '{upload_id}' is already being committed.")
+    if not 0 <= index < session["part_count"]:
+        raise HTTPException(status_code=400, detail=f"Part index must be between 0 and {session['part_count'] - 1}.")
+
+    # Every part is full-sized except possibly the last one
+    expected_size = min(session["part_size"], session["total_size"] - index * session["part_size"])
+
+    part_path = os.path.join(upload_parts_dir(upload_id), f"{index:06d}.part")
+    # Parts count against the same limit as single-request uploads, but are
+    # small enough to retry sooner
+    with upload_slot(retry_after=5):
+        size, sha256 = await receive_body(request, part_path, expected_size, expected_size=expected_size)
+
+    return {"upload_id": upload_id, "index": index, "size": size, "sha256": sha256}
+
+def assemble_upload_parts(session: dict) -> str:
+    """
+    Concatenates the parts of an upload session into a single archive under
+    UPLOAD_DIRECTORY/<upload_id> and removes the parts. If the session has a
+    sha256, an archive that does not match it is discarded with the parts.
+    """
+    upload_id = session["upload_id"]
+    parts_dir = upload_parts_dir(upload_id)
+    file_location = os.path.join(UPLOAD_DIRECTORY, upload_id, session["filename"])
+
+    digest = hashlib.sha256()
+    with open(file_location, "wb") as out:
+        for index in range(session["part_count"]):
+            with open(os.path.join(parts_dir, f"{index:06d}.part"), "rb") as part:
+                for chunk in iter(lambda: part.read(UPLOAD_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    out.write(chunk)
+
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    if session.get("sha256") and digest.hexdigest() != session["sha256"]:
+        shutil.rmtree(os.path.join(UPLOAD_DIRECTORY, upload_id), ignore_errors=True)
+        raise HTTPException(status_code=409, detail="Assembled archive does not match the upload's sha256.")
+    return file_location
+
+@router.post("/uploads/{upload_id}/commit")
+async def commit_upload_session(upload_id: str):
+    """
+    Assembles a completed resumable upload and triggers the build and
+    execution jobs, exactly like a single-request /upload/.
+    """
+    session = load_upload_session(upload_id)
+    if upload_id in committing_uploads:
+        raise HTTPException(status_code=409, detail=f"Upload '{upload_id}' is already being committed.")
+
+    parts = received_parts(upload_id)
+    missing = [i for i in range(session["part_count"]) if i not in parts]
+    if missing:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Upload is missing parts.", "missing_parts": missing}
+        )
+
+    committing_uploads.add(upload_id)
+    try:
+        file_location = await run_in_threadpool(assemble_upload_parts, session)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error assembling upload '{upload_id}': {e}")
+        raise HTTPException(status_code=500, detail="Failed to assemble uploaded file.")
+    finally:
+        committing_uploads.discard(upload_id)
+
+    logging.info(f"Upload '{upload_id}' assembled at {file_location} ({session['total_size']} bytes)")
+
+    upload_path = os.path.join(UPLOAD_DIRECTORY, upload_id)
+    return JSONResponse(
+        await submit_uploaded_archive(session["job_name"], upload_id, upload_path, file_location, session["filename"],
+                                      session.get("base_image"), session.get("user"), session.get("priority", 0))
+    )
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(BLOB_DIRECTORY, sha256[:2], sha256)
+
+def crc_index_path(crc: int, size: int) -> str:
+    """
+    Zip entries carry a CRC-32 and size in the central directory. Indexing
+    blobs by them lets an already-stored member be recognised (and verified
+    by hash) without writing it to disk again.
+    """
+    return os.path.join(BLOB_DIRECTORY, "crc", f"{crc:08x}-{size}")
+
+def link_blob(sha256: str, dest: str):
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    if os.path.lexists(dest):
+        os.remove(dest)
+    try:
+        os.link(blob_path(sha256), dest)
+    except OSError as e:
+        # e.g. the filesystem's hardlink limit for a very popular blob
+        logging.warning(f"Could not hardlink blob {sha256}, copying instead: {e}")
+        shutil.copyfile(blob_path(sha256), dest)
+
+def sweep_blobs() -> int:
+    """
+    Removes blobs whose only link is the blob store's own, along with the
+    CRC-32 index entries that point at them. Returns the number removed.
+    """
+    cutoff = time.time() - UPLOAD_SESSION_TTL
+    removed = 0
+    for prefix in os.scandir(BLOB_DIRECTORY):
+        if len(prefix.name) != 2 or not prefix.is_dir():
+            continue
+        for entry in os.scandir(prefix.path):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            # ctime changes with the link count, so it is when the last
+            # upload linking the blob was removed
+            if stat.st_nlink == 1 and stat.st_ctime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+    if removed:
+        for entry in os.scandir(os.path.join(BLOB_DIRECTORY, "crc")):
+            with open(entry.path, "r") as f:
+                sha256 = f.read().strip()
+            if not os.path.exists(blob_path(sha256)):
+                os.remove(entry.path)
+        logging.info(f"Removed {removed} unreferenced blobs")
+    return removed
+
+async def sweep_blob_store():
+    await run_in_threadpool(sweep_blobs)
+
+def store_zip_member(zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, dest: str):
+    """
+    Places a zip member at dest as a hardlink into the blob store. Returns
+    (sha256, written) where written is False if the content was already
+    stored and no data had to be written.
+    """
+    index_path = crc_index_path(info.CRC, info.file_size)
+    try:
+        with open(index_path, "r") as f:
+            known_sha256 = f.read().strip()
+    except FileNotFoundError:
+        known_sha256 = None
+
+    if known_sha256 and os.path.exists(blob_path(known_sha256)):
+        with zip_ref.open(info) as src:
+            sha256 = hash_stream(src)
+        if sha256 == known_sha256:
+            link_blob(sha256, dest)
+            return sha256, False
+
+    tmp_path = os.path.join(BLOB_DIRECTORY, "tmp", uuid.uuid4().hex)
+    digest = hashlib.sha256()
+    with zip_ref.open(info) as src, open(tmp_path, "wb") as out:
+        for chunk in iter(lambda: src.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            out.write(chunk)
+    sha256 = digest.hexdigest()
+
+    written = not os.path.exists(blob_path(sha256))
+    if written:
+        os.makedirs(os.path.dirname(blob_path(sha256)), exist_ok=True)
+        os.replace(tmp_path, blob_path(sha256))
+    else:
+        os.remove(tmp_path)
+
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    with open(index_path, "w") as f:
+        f.write(sha256)
+
+    link_blob(sha256, dest)
+    return sha256, written
+
+def member_destination(upload_path: str, name: str) -> Optional[str]:
+    """
+    Maps an archive member name to a path under upload_path. Returns None
+    for names with no path components (e.g. "./") and rejects absolute
+    paths, drive letters and '..' components outright rather than
+    extracting a hostile archive in a sanitised form.
+    """
+    name = name.replace("\\", "/")
+    parts = [p for p in name.split("/") if p not in ("", ".")]
+    if name.startswith("/") or ".." in parts or (parts and ":" in parts[0]):
+        raise HTTPException(status_code=400, detail=f"Archive member '{name}' escapes the upload directory.")
+    if not parts:
+        return None
+    return os.path.join(upload_path, *parts)
+
+def plan_zip_extraction(zip_ref: zipfile.ZipFile, dest_dir: str) -> list:
+    """
+    Checks an archive's central directory against the extraction limits
+    before anything is decompressed, and returns [(info, dest)] for every
+    file member. Directory members are created up front.
+    """
+    infos = zip_ref.infolist()
+    if len(infos) > MAX_ARCHIVE_MEMBERS:
+        raise HTTPException(status_code=400, detail=f"Archive has more than {MAX_ARCHIVE_MEMBERS} members.")
+
+    # ZipExtFile never yields more than the declared file_size, so the
+    # declared sizes bound what extraction can actually write
+    total_size = sum(info.file_size for info in infos)
+    if total_size > MAX_EXTRACTED_SIZE:
+        raise HTTPException(status_code=400, detail=f"Archive expands to more than {MAX_EXTRACTED_SIZE} bytes.")
+
+    members = []
+    for info in infos:
+        if (info.file_size > MIN_RATIO_CHECK_SIZE
+                and info.file_size > info.compress_size * MAX_COMPRESSION_RATIO):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Archive member '{info.filename}' exceeds the maximum compression ratio of {MAX_COMPRESSION_RATIO}."
+            )
+        dest = member_destination(dest_dir, info.filename)
+        if dest is None:
+            continue
+        if info.is_dir():
+            os.makedirs(dest, exist_ok=True)
+        else:
+            members.append((info, dest))
+    return members
+
+def extract_zip(file_location: str, dest_dir: str, store_member) -> list:
+    """
+    Extracts an archive into dest_dir on the shared extraction pool. Members
+    are split into EXTRACT_WORKERS batches of similar total size, each read
+    through its own ZipFile handle so decompression runs in parallel.
+    store_member(zip_ref, info, dest) writes one member; returns
+    [(info, dest, result)] in archive order.
+    """
+    with zipfile.ZipFile(file_location, 'r') as zip_ref:
+        members = plan_zip_extraction(zip_ref, dest_dir)
+
+    # Largest members first, each onto the currently lightest batch
+    batches = [[] for _ in range(max(1, min(EXTRACT_WORKERS, len(members))))]
+    batch_sizes = [0] * len(batches)
+    for position, (info, dest) in sorted(enumerate(members), key=lambda m: -m[1][0].file_size):
+        lightest = batch_sizes.index(min(batch_sizes))
+        batches[lightest].append((position, info, dest))
+        batch_sizes[lightest] += info.file_size
+
+    def run_batch(batch):
+        with zipfile.ZipFile(file_location, 'r') as zip_ref:
+            results = []
+            for position, info, dest in batch:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                results.append((position, info, dest, store_member(zip_ref, info, dest)))
+            return results
+
+    extracted = [r for batch_results in extract_pool.map(run_batch, batches) for r in batch_results]
+    return [(info, dest, result) for _, info, dest, result in sorted(extracted, key=lambda r: r[0])]
+
+def write_zip_member(zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, dest: str):
+    with zip_ref.open(info) as src, open(dest, "wb") as out:
+        shutil.copyfileobj(src, out, UPLOAD_CHUNK_SIZE)
+
+def extract_into_blob_store(file_location: str, upload_path: str) -> list:
+    """
+    Extracts a zip archive into upload_path, storing each file once in the
+    content-addressed blob store and hardlinking it into place. Returns the
+    upload manifest as a list of {path, size, sha256}.
+    """
+    manifest = []
+    stored_bytes = 0
+    total_bytes = 0
+
+    for info, dest, (sha256, written) in extract_zip(file_location, upload_path, store_zip_member):
+        manifest.append({
+            "path": os.path.relpath(dest, upload_path),
+            "size": info.file_size,
+            "sha256": sha256
+        })
+        total_bytes += info.file_size
+        if written:
+            stored_bytes += info.file_size
+
+    logging.info(
+        f"Stored {stored_bytes} new bytes for {total_bytes} bytes across {len(manifest)} files "
+        f"({total_bytes - stored_bytes} bytes deduplicated)"
+    )
+    return manifest
+
+class ManifestEntry(BaseModel):
+    path: str
+    size: int
+    sha256: str
+
+class BuildContextManifest(BaseModel):
+    job_name: str
+    files: List[ManifestEntry]
+    base_image: Optional[str] = None
+    user: Optional[str] = None
+    priority: int = 0
+
+def validate_sha256(sha256: str) -> str:
+    sha256 = sha256.lower()
+    if len(sha256) != 64 or any(c not in string.hexdigits for c in sha256):
+        raise HTTPException(status_code=400, detail=f"'{sha256}' is not a SHA-256 hex digest.")
+    return sha256
+
+def has_blob(sha256: str, size: int) -> bool:
+    try:
+        return os.stat(blob_path(sha256)).st_size == size
+    except FileNotFoundError:
+        return False
+
+@router.post("/blobs/missing")
+async def find_missing_blobs(manifest: BuildContextManifest):
+    """
+    Given the files of a build context, returns the hashes the blob store
+    does not have yet. Clients upload only those to PUT /blobs/{sha256}
+    before committing the context with POST /contexts/.
+    """
+    missing = set()
+    for entry in manifest.files:
+        sha256 = validate_sha256(entry.sha256)
+        if not has_blob(sha256, entry.size):
+            missing.add(sha256)
+    return {"missing": sorted(missing)}
+
+@router.put("/blobs/{sha256}")
+async def upload_blob(sha256: str, request: Request):
+    """
+    Stores one file in the blob store. The body must hash to sha256.
+    """
+    sha256 = validate_sha256(sha256)
+    target = blob_path(sha256)
+    if os.path.exists(target):
+        return {"sha256": sha256, "size": os.path.getsize(target), "stored": False}
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with upload_slot(retry_after=5):
+        size, _ = await receive_body(request, target, MAX_UPLOAD_SIZE, expected_sha256=sha256)
+    return {"sha256": sha256, "size": size, "stored": True}
+
+@router.post("/contexts/")
+async def commit_build_context(manifest: BuildContextManifest):
+    """
+    Assembles a build context from blobs that are already stored, without
+    any file data in the request, and triggers the build and execution jobs.
+    """
+    if not manifest.job_name:
+        raise HTTPException(status_code=400, detail="Job name is required")
+    if not manifest.files:
+        raise HTTPException(status_code=400, detail="Build context is empty.")
+    priority = execution_priority(manifest.priority)
+
+    upload_id = str(uuid.uuid4())
+    upload_path = os.path.join(UPLOAD_DIRECTORY, upload_id)
+    files = []
+    for entry in manifest.files:
+        dest = member_destination(upload_path, entry.path)
+        if dest is None:
+            raise HTTPException(status_code=400, detail=f"Invalid path '{entry.path}'.")
+        files.append((dest, validate_sha256(entry.sha256), entry.size))
+
+    missing = sorted({sha256 for _, sha256, size in files if not has_blob(sha256, size)})
+    if missing:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Build context references blobs that are not stored.", "missing": missing}
+        )
+
+    def link_context():
+        for dest, sha256, _ in files:
+            link_blob(sha256, dest)
+
+    manifest_path = os.path.join(MANIFEST_DIRECTORY, f"{upload_id}.json")
+    try:
+        os.makedirs(upload_path, exist_ok=True)
+        await run_in_threadpool(link_context)
+        context_files = [
+            {"path": os.path.relpath(dest, upload_path), "size": size, "sha256": sha256}
+            for dest, sha256, size in files
+        ]
+        write_json(manifest_path, {
+            "upload_id": upload_id,
+            "job_name": manifest.job_name,
+            "created_at": time.time(),
+            "files": context_files
+        })
+        logging.info(f"Build context '{upload_id}' assembled from {len(files)} stored blobs")
+
+        execution_job_name = await trigger_build(manifest.job_name, upload_id, upload_path, manifest=context_files,
+                                                 base_image=manifest.base_image, user=manifest.user,
+                                                 priority=priority)
+    except Exception as e:
+        # A context that was never built would keep its blobs linked forever
+        shutil.rmtree(upload_path, ignore_errors=True)
+        try:
+            os.remove(manifest_path)
+        except FileNotFoundError:
+            pass
+        if isinstance(e, HTTPException):
+            raise
+        logging.error(f"Error committing build context '{upload_id}': {e}")
+        raise HTTPException(status_code=500, detail="Failed to commit build context.")
+
+    return {
+        "message": f"Build context with {len(files)} files committed and execution job '{execution_job_name}' triggered.",
+        "upload_id": upload_id,
+        "job_name": manifest.job_name
+    }
+
+def setup():
+    os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
+    os.makedirs(os.path.join(BLOB_DIRECTORY, "tmp"), exist_ok=True)
+    os.makedirs(os.path.join(BLOB_DIRECTORY, "crc"), exist_ok=True)
+    os.makedirs(MANIFEST_DIRECTORY, exist_ok=True)